@@ -0,0 +1,285 @@
+"""
+In-process stand-in for the OpenAI endpoints the agent uses, for load tests without API costs.
+
+- POST /v1/responses: a Responses API answer (also streamed with `stream: true`). With a
+  json_schema text format the output is generated from the schema, without one (the supervisor)
+  it is a goal-coach feedback JSON.
+- POST /v1/audio/transcriptions: a fixed transcription.
+
+Latency is drawn per request from a lognormal distribution (median and sigma per endpoint),
+`failure_rate` of the requests fail with a 500 / 429 error. The app is served by uvicorn on a free
+local port from a background thread of the same process, so the SDK goes through its real HTTP
+stack (connection pool, retries, SSE parsing):
+
+    with FakeOpenAI(FakeOpenAIConfig(responses=LatencyProfile(median_ms=800), failure_rate=0.02)) as fake:
+        agent.llm.client = fake.client()
+"""
+
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+
+import fastapi
+import openai
+import uvicorn
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class LatencyProfile:
+    median_ms: float = 600.0
+    sigma: float = 0.5
+    # streamed answers: time between two output_text.delta events
+    delta_ms: float = 15.0
+
+    def sample(self, rng: random.Random) -> float:
+        return self.median_ms * math.exp(self.sigma * rng.gauss(0.0, 1.0)) / 1000
+
+
+@dataclass
+class FakeOpenAIConfig:
+    responses: LatencyProfile = field(default_factory=LatencyProfile)
+    transcriptions: LatencyProfile = field(default_factory=lambda: LatencyProfile(median_ms=400.0, sigma=0.3))
+    failure_rate: float = 0.0
+    # share of the failures answered with 429 (rate limit) instead of 500
+    rate_limit_share: float = 0.5
+    # cached prompt tokens reported in usage, share of the input tokens
+    cached_share: float = 0.5
+    transcript: str = "can i open instagram for ten minutes to answer a message from my sister"
+    seed: int | None = None
+
+
+FAKE_FEEDBACK = {
+    "on_track": True,
+    "verdict": "Working on the task",
+    "score": 80,
+    "feedback": "You are focused on what you planned.",
+    "next_step": "Keep going for another 20 minutes.",
+}
+
+
+def fake_value(schema: dict, name: str, rng: random.Random, defs: dict):
+    if "$ref" in schema:
+        schema = defs[schema["$ref"].split("/")[-1]]
+    if "anyOf" in schema:
+        schema = next((option for option in schema["anyOf"] if option.get("type") != "null"), schema["anyOf"][0])
+
+    match schema.get("type"):
+        case "object":
+            return {key: fake_value(value, key, rng, defs) for key, value in schema.get("properties", {}).items()}
+        case "array":
+            return [fake_value(schema.get("items", {}), name, rng, defs)]
+        case "boolean":
+            return rng.random() < 0.6
+        case "integer":
+            return rng.choice([5, 10, 15, 20])
+        case "number":
+            return round(rng.uniform(0.6, 1.0), 2)
+        case "string":
+            if "enum" in schema:
+                return rng.choice(schema["enum"])
+            return f"Fake {name}: sure, but keep it short and come back to what you planned for today."
+        case _:
+            return None
+
+
+def output_text(body: dict, rng: random.Random) -> str:
+    text_format = (body.get("text") or {}).get("format") or {}
+    if text_format.get("type") == "json_schema":
+        schema = text_format["schema"]
+        return json.dumps(fake_value(schema, text_format.get("name", ""), rng, schema.get("$defs", {})))
+    return json.dumps(FAKE_FEEDBACK)
+
+
+def input_chars(body: dict) -> int:
+    return len(json.dumps(body.get("input", ""))) + len(body.get("instructions") or "")
+
+
+class FakeOpenAI:
+    def __init__(self, config: FakeOpenAIConfig | None = None):
+        self.config = config or FakeOpenAIConfig()
+        self.rng = random.Random(self.config.seed)
+        self.counters = {"responses": 0, "streams": 0, "transcriptions": 0, "failures": 0}
+        self.app = self._build_app()
+
+        self.base_url: str | None = None
+        self._server: uvicorn.Server | None = None
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "FakeOpenAI":
+        config = uvicorn.Config(self.app, host="127.0.0.1", port=0, log_level="warning", lifespan="off")
+        server = self._server = uvicorn.Server(config)
+        thread = self._thread = threading.Thread(target=server.run, name="fake-openai", daemon=True)
+        thread.start()
+
+        while not server.started:
+            if not thread.is_alive():
+                raise RuntimeError("fake OpenAI server did not start")
+            time.sleep(0.01)
+        port = server.servers[0].sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}/v1"
+        return self
+
+    def stop(self):
+        if self._server is not None and self._thread is not None:
+            self._server.should_exit = True
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self) -> "FakeOpenAI":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def client(self, max_retries: int = 0, timeout: float = 60.0) -> openai.AsyncOpenAI:
+        return openai.AsyncOpenAI(api_key="fake", base_url=self.base_url, max_retries=max_retries, timeout=timeout)
+
+    def stats(self) -> dict:
+        return {**self.counters, "config": asdict(self.config)}
+
+    async def _delay_or_fail(self, profile: LatencyProfile):
+        await asyncio.sleep(profile.sample(self.rng))
+        if self.rng.random() < self.config.failure_rate:
+            self.counters["failures"] += 1
+            if self.rng.random() < self.config.rate_limit_share:
+                return JSONResponse(
+                    status_code=429, content=self._error("Rate limit reached (fake)", "rate_limit_exceeded")
+                )
+            return JSONResponse(status_code=500, content=self._error("The server had an error (fake)", "server_error"))
+        return None
+
+    @staticmethod
+    def _error(message: str, code: str) -> dict:
+        return {"error": {"message": message, "type": code, "param": None, "code": code}}
+
+    def _response(self, body: dict, text: str, status: str = "completed") -> dict:
+        input_tokens = input_chars(body) // 4
+        output_tokens = len(text) // 4
+        return {
+            "id": f"resp_{uuid.uuid4().hex}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "status": status,
+            "model": body.get("model", "gpt-5.1"),
+            "output": [] if status != "completed" else [self._message(text)],
+            "parallel_tool_calls": True,
+            "tool_choice": "auto",
+            "tools": [],
+            "text": body.get("text") or {"format": {"type": "text"}},
+            "usage": {
+                "input_tokens": input_tokens,
+                "input_tokens_details": {"cached_tokens": int(input_tokens * self.config.cached_share)},
+                "output_tokens": output_tokens,
+                "output_tokens_details": {"reasoning_tokens": 0},
+                "total_tokens": input_tokens + output_tokens,
+            },
+        }
+
+    @staticmethod
+    def _message(text: str | None, item_id: str = "msg_fake", status: str = "completed") -> dict:
+        return {
+            "id": item_id,
+            "type": "message",
+            "role": "assistant",
+            "status": status,
+            "content": [{"type": "output_text", "text": text, "annotations": []}] if text is not None else [],
+        }
+
+    async def _stream(self, body: dict, text: str):
+        profile = self.config.responses
+        created = self._response(body, text, status="in_progress")
+        item_id = f"msg_{uuid.uuid4().hex}"
+        sequence = iter(range(1_000_000))
+
+        def event(data: dict) -> str:
+            data["sequence_number"] = next(sequence)
+            return f"event: {data['type']}\ndata: {json.dumps(data)}\n\n"
+
+        yield event({"type": "response.created", "response": created})
+        yield event(
+            {
+                "type": "response.output_item.added",
+                "output_index": 0,
+                "item": self._message(None, item_id, status="in_progress"),
+            }
+        )
+        yield event(
+            {
+                "type": "response.content_part.added",
+                "item_id": item_id,
+                "output_index": 0,
+                "content_index": 0,
+                "part": {"type": "output_text", "text": "", "annotations": []},
+            }
+        )
+
+        for start in range(0, len(text), 8):
+            await asyncio.sleep(profile.delta_ms / 1000)
+            yield event(
+                {
+                    "type": "response.output_text.delta",
+                    "item_id": item_id,
+                    "output_index": 0,
+                    "content_index": 0,
+                    "delta": text[start : start + 8],
+                    "logprobs": [],
+                }
+            )
+
+        yield event(
+            {
+                "type": "response.output_text.done",
+                "item_id": item_id,
+                "output_index": 0,
+                "content_index": 0,
+                "text": text,
+                "logprobs": [],
+            }
+        )
+        yield event(
+            {
+                "type": "response.content_part.done",
+                "item_id": item_id,
+                "output_index": 0,
+                "content_index": 0,
+                "part": {"type": "output_text", "text": text, "annotations": []},
+            }
+        )
+        yield event({"type": "response.output_item.done", "output_index": 0, "item": self._message(text, item_id)})
+
+        completed = {**created, "status": "completed", "output": [self._message(text, item_id)]}
+        yield event({"type": "response.completed", "response": completed})
+
+    def _build_app(self) -> fastapi.FastAPI:
+        app = fastapi.FastAPI()
+
+        @app.post("/v1/responses")
+        async def responses(request: fastapi.Request):
+            body = await request.json()
+            if failed := await self._delay_or_fail(self.config.responses):
+                return failed
+
+            text = output_text(body, self.rng)
+            if body.get("stream"):
+                self.counters["streams"] += 1
+                return StreamingResponse(self._stream(body, text), media_type="text/event-stream")
+
+            self.counters["responses"] += 1
+            return self._response(body, text)
+
+        @app.post("/v1/audio/transcriptions")
+        async def transcriptions(request: fastapi.Request):
+            await request.body()
+            if failed := await self._delay_or_fail(self.config.transcriptions):
+                return failed
+
+            self.counters["transcriptions"] += 1
+            return {"text": self.config.transcript}
+
+        return app
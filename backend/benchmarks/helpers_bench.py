@@ -0,0 +1,391 @@
+"""
+Microbenchmarks of the helpers.py data path (users, preferences, request log) at 10k / 100k / 1M
+log rows.
+
+For every size a synthetic data set is generated (users.pkl, user_preferences.pkl, log.pkl in the
+format of the real pickles, about 100 log rows per user spread over the last 30 days) and every
+backend times the same operations on its own copy of it:
+
+    get_user_preferences, get_user_log, get_last_user_log, get_request_number, load_user_context,
+    update_log, add_user, delete_user_logs
+
+Per operation: mean / p50 / p95 / max latency over --iterations calls (random users) and the peak
+Python memory (tracemalloc) of one extra call. `setup` is the time a backend needs to open the
+data set (e.g. indexing the log) and how much it grew the peak RSS of the process (tracemalloc
+would slow a 1M row import down several times).
+
+Backends:
+
+- legacy: the original helpers, every call reads (and writes) the whole pickle, as reference
+- pickle: src/agent/helpers.py with AGENT_STORAGE_BACKEND=pickle (append-only log store + caches)
+- postgres: src/agent/helpers.py with AGENT_STORAGE_BACKEND=postgres, the data set is imported
+  with db.import_pickles first. Needs the database from .env, use a scratch database.
+
+A new storage backend is added as a `Backend` subclass in BACKENDS. Run from the backend folder:
+
+    python -m benchmarks.helpers_bench --rows 10000 100000 1000000 --output helpers_bench.json
+"""
+
+import argparse
+import asyncio
+import importlib
+import inspect
+import json
+import os
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+QUERIES = [
+    "i need to answer a message from my sister",
+    "just 5 more minutes please",
+    "i want to check the uni group chat",
+    "im bored, can i watch some reels",
+    "post a story for my friends birthday",
+    "look up the bus times on twitter",
+]
+
+APPS = ["instagram", "tiktok", "youtube", "twitter"]
+
+ROWS_PER_USER = 100
+
+ONBOARDING_CONFIG = {
+    "name": "Bench",
+    "surname": "Mark",
+    "apps": ["instagram", "tiktok"],
+    "morning_factor": 2,
+    "worktime_factor": 7,
+    "evening_factor": 5,
+    "before_bed_factor": 9,
+}
+
+
+# %% synthetic data
+def generate_dataset(rows: int, directory: Path, seed: int) -> list[str]:
+    """Writes the three pickles to `directory`, returns the user ids."""
+    rng = np.random.default_rng(seed)
+    now = datetime.now().replace(microsecond=0)
+    n_users = max(rows // ROWS_PER_USER, 10)
+
+    user_ids = [str(uuid.UUID(bytes=rng.bytes(16), version=4)) for _ in range(n_users)]
+    joined = [now - timedelta(days=int(days)) for days in rng.integers(30, 90, n_users)]
+    pd.DataFrame(
+        {
+            "id": user_ids,
+            "name": [f"User{i}" for i in range(n_users)],
+            "surname": "Synthetic",
+            "joined": joined,
+        }
+    ).to_pickle(directory / "users.pkl")
+
+    # one preference row per user, every tenth user changed it once
+    preference_users = user_ids + user_ids[::10]
+    pd.DataFrame(
+        {
+            "date_time": [now - timedelta(days=int(days)) for days in rng.integers(0, 30, len(preference_users))],
+            "user_id": preference_users,
+            "preference": "The user want to restrict his usage on the following app: 'instagram', 'tiktok'",
+            "preferred_personality": "chill",
+            "selected_apps": [list(rng.choice(APPS, size=2, replace=False)) for _ in preference_users],
+            "time_factors": [list(map(int, rng.integers(0, 11, 4))) for _ in preference_users],
+            "target_minutes": 120,
+        }
+    ).to_pickle(directory / "user_preferences.pkl")
+
+    allows = rng.random(rows) < 0.6
+    minutes = rng.choice([5, 10, 15, 20], size=rows)
+    seconds_ago = rng.integers(0, 30 * 24 * 3600, rows)
+    pd.DataFrame(
+        {
+            "user_id": np.array(user_ids, dtype=object)[rng.integers(0, n_users, rows)],
+            "query": np.array(QUERIES, dtype=object)[rng.integers(0, len(QUERIES), rows)],
+            "answer": [
+                {"allow": bool(allow), "time": int(minute) if allow else 0, "reply": "Okay, but keep it short."}
+                for allow, minute in zip(allows, minutes)
+            ],
+            "date_time": pd.Timestamp(now) - pd.to_timedelta(seconds_ago, unit="s"),
+        }
+    ).to_pickle(directory / "log.pkl")
+
+    return user_ids
+
+
+# %% backends
+class Backend:
+    name = ""
+
+    def prepare(self, directory: Path):
+        """Open the data set in `directory` (once per size, sync or async, timed as `setup`)."""
+        raise NotImplementedError
+
+    def operations(self) -> dict:
+        """Operation name -> callable(user_id), sync or async."""
+        raise NotImplementedError
+
+
+class LegacyPickleBackend(Backend):
+    """The helpers as they were before the log store: read-modify-write of whole pickles."""
+
+    name = "legacy"
+
+    def prepare(self, directory: Path):
+        self.users_path = directory / "users.pkl"
+        self.preferences_path = directory / "user_preferences.pkl"
+        self.log_path = directory / "log.pkl"
+
+    def get_user_preferences(self, user_id):
+        preferences_df = pd.read_pickle(self.preferences_path)
+        user_entries = preferences_df[preferences_df["user_id"] == user_id]
+        if user_entries.empty:
+            return None
+        latest = user_entries.sort_values("date_time", ascending=False).iloc[0]
+        return latest["preference"], latest["preferred_personality"], latest["selected_apps"]
+
+    def get_user_log(self, user_id, time_delay=24):
+        log_df = pd.read_pickle(self.log_path)
+        cutoff = datetime.now() - timedelta(hours=time_delay)
+        filtered_df = log_df[(log_df["user_id"] == user_id) & (log_df["date_time"] >= cutoff)].sort_values(
+            by="date_time"
+        )
+        return filtered_df.to_csv(index=False)
+
+    def get_last_user_log(self, user_id):
+        log_df = pd.read_pickle(self.log_path)
+        filtered_df = log_df[log_df["user_id"] == user_id].sort_values(by="date_time", ascending=False)
+        return None if filtered_df.empty else str(filtered_df.iloc[0].to_json())
+
+    def get_request_number(self, user_id):
+        log_df = pd.read_pickle(self.log_path)
+        log_df["date_time"] = pd.to_datetime(log_df["date_time"])
+        today = datetime.today().date()
+        return log_df[(log_df["user_id"] == user_id) & (log_df["date_time"].dt.date == today)].shape[0]
+
+    def update_log(self, user_id, query, answer):
+        log_df = pd.read_pickle(self.log_path)
+        new_entry = pd.DataFrame(
+            [
+                {
+                    "user_id": user_id,
+                    "query": query,
+                    "answer": answer,
+                    "date_time": datetime.now().replace(microsecond=0),
+                }
+            ]
+        )
+        pd.concat([log_df, new_entry], ignore_index=True).to_pickle(self.log_path)
+
+    def add_user(self, config):
+        preferences_df = pd.read_pickle(self.preferences_path)
+        users_df = pd.read_pickle(self.users_path)
+        id = str(uuid.uuid4())
+        date_time = datetime.now().replace(microsecond=0)
+
+        new_user = pd.DataFrame(
+            [{"id": id, "name": config["name"], "surname": config["surname"], "joined": date_time}]
+        )
+        pd.concat([users_df, new_user], ignore_index=True).to_pickle(self.users_path)
+
+        new_preference = pd.DataFrame(
+            [
+                {
+                    "date_time": date_time,
+                    "user_id": id,
+                    "preference": "",
+                    "preferred_personality": "chill",
+                    "selected_apps": config["apps"],
+                }
+            ]
+        )
+        pd.concat([preferences_df, new_preference], ignore_index=True).to_pickle(self.preferences_path)
+        return id
+
+    def delete_user_logs(self, user_id):
+        log_df = pd.read_pickle(self.log_path)
+        log_df[log_df["user_id"] != user_id].to_pickle(self.log_path)
+
+    def operations(self) -> dict:
+        return {
+            "get_user_preferences": self.get_user_preferences,
+            "get_user_log": self.get_user_log,
+            "get_last_user_log": self.get_last_user_log,
+            "get_request_number": self.get_request_number,
+            "update_log": lambda user_id: self.update_log(
+                user_id, "benchmark query", {"allow": False, "time": 0, "reply": ""}
+            ),
+            "add_user": lambda user_id: self.add_user(ONBOARDING_CONFIG),
+            "delete_user_logs": self.delete_user_logs,
+        }
+
+
+class HelpersBackend(Backend):
+    """src/agent/helpers.py itself, re-imported with the data set as AGENT_DATA_DIR."""
+
+    name = "pickle"
+
+    def prepare(self, directory: Path):
+        os.environ["AGENT_DATA_DIR"] = str(directory)
+        os.environ["AGENT_STORAGE_BACKEND"] = self.name
+        # the module builds an OpenAI client on import, no call is made
+        os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+        import src.agent.helpers as helpers
+
+        # module level state (log store, caches, aggregates) is set up again for the new data set
+        self.helpers = importlib.reload(helpers)
+
+    def operations(self) -> dict:
+        helpers = self.helpers
+        return {
+            "get_user_preferences": helpers.get_user_preferences,
+            "get_user_log": lambda user_id: helpers.get_user_log(user_id, 24),
+            "get_last_user_log": helpers.get_last_user_log,
+            "get_request_number": helpers.get_request_number,
+            "load_user_context": helpers.load_user_context,
+            "update_log": lambda user_id: helpers.update_log(
+                user_id, "benchmark query", {"allow": False, "time": 0, "reply": ""}
+            ),
+            "add_user": lambda user_id: helpers.add_user(ONBOARDING_CONFIG),
+            "delete_user_logs": helpers.delete_user_logs,
+        }
+
+
+class PostgresBackend(HelpersBackend):
+    name = "postgres"
+
+    async def prepare(self, directory: Path):
+        from src.agent.db import import_pickles
+
+        await import_pickles(directory / "users.pkl", directory / "user_preferences.pkl", directory / "log.pkl")
+        super().prepare(directory)
+
+
+BACKENDS = {backend.name: backend for backend in (LegacyPickleBackend, HelpersBackend, PostgresBackend)}
+
+
+# %% runner
+async def call(function, *args):
+    result = function(*args)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+async def peak_memory(function, *args) -> int:
+    tracemalloc.start()
+    try:
+        await call(function, *args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+async def time_operation(operation, user_ids: list[str], iterations: int, rng: np.random.Generator) -> dict:
+    seconds = []
+    for user_id in rng.choice(user_ids, size=iterations):
+        started_at = time.perf_counter()
+        await call(operation, str(user_id))
+        seconds.append(time.perf_counter() - started_at)
+
+    # separate call, tracemalloc slows the timed ones down
+    peak = await peak_memory(operation, str(rng.choice(user_ids)))
+
+    latencies = np.array(seconds) * 1000
+    return {
+        "mean_ms": float(latencies.mean()),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "max_ms": float(latencies.max()),
+        "peak_kib": peak / 1024,
+    }
+
+
+async def run_backend(backend: Backend, directory: Path, user_ids: list[str], iterations: int, seed: int) -> dict:
+    # ru_maxrss only grows, a backend that stays below an earlier peak reports 0
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started_at = time.perf_counter()
+    await call(backend.prepare, directory)
+    setup = {
+        "seconds": time.perf_counter() - started_at,
+        "peak_rss_growth_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - max_rss,
+    }
+
+    # destructive operations last, delete_user_logs removes the logs of the sampled users
+    rng = np.random.default_rng(seed)
+    operations = {
+        name: await time_operation(operation, user_ids, iterations, rng)
+        for name, operation in backend.operations().items()
+    }
+    return {"setup": setup, "operations": operations}
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(rows: list[int], backends: list[str], iterations: int, seed: int) -> dict:
+    work_dir = Path(tempfile.mkdtemp(prefix="tumuch_helpers_bench_"))
+    results: dict[int, dict] = {}
+    try:
+        for size in rows:
+            dataset_dir = work_dir / f"dataset-{size}"
+            dataset_dir.mkdir()
+            started_at = time.perf_counter()
+            user_ids = generate_dataset(size, dataset_dir, seed)
+            print(f"{size} rows: generated {len(user_ids)} users in {time.perf_counter() - started_at:.1f}s")
+
+            results[size] = {}
+            for name in backends:
+                # every backend writes, so each one gets its own copy
+                directory = work_dir / f"{name}-{size}"
+                shutil.copytree(dataset_dir, directory)
+                results[size][name] = asyncio.run(run_backend(BACKENDS[name](), directory, user_ids, iterations, seed))
+                shutil.rmtree(directory, ignore_errors=True)
+                print(
+                    f"{size} rows / {name}: "
+                    + ", ".join(
+                        f"{op} {result['mean_ms']:.2f}ms" for op, result in results[size][name]["operations"].items()
+                    )
+                )
+            shutil.rmtree(dataset_dir, ignore_errors=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "benchmark": "helpers",
+        "commit": git_commit(),
+        "iterations": iterations,
+        "rows_per_user": ROWS_PER_USER,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--backends", type=str, nargs="+", default=["legacy", "pickle"], choices=sorted(BACKENDS))
+    parser.add_argument("--iterations", type=int, default=10, help="timed calls per operation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    report = run(args.rows, args.backends, args.iterations, args.seed)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
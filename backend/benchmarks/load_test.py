@@ -0,0 +1,334 @@
+"""
+Load test of the agent endpoints (/echo, /voice, /supervise, /onboard) against a fake OpenAI.
+
+The FastAPI app is driven in process through `httpx.ASGITransport` (as the `async_client` fixture
+in tests/conftest.py does), every LLM call goes to benchmarks/fake_openai.py with configurable
+latency and failure rate. Each endpoint is loaded in its own phase with `--concurrency` requests in
+flight; --mixed adds a phase with all endpoints interleaved (priority scheduling under load).
+
+Reported per endpoint: p50/p95/p99/mean latency, throughput and error rate (non-200 answers and
+exceptions). The agent's /metrics (fallbacks, hedges, breaker, scheduler waits) is added to the
+report. The pickles are copied to a temporary AGENT_DATA_DIR first, the real data stays untouched.
+
+Without --agent-only the full app is started with its lifespan (needs the settings in .env and
+the database), --agent-only mounts only the agent routes. Run from the backend folder:
+
+    python -m benchmarks.load_test --requests 200 --concurrency 20 --agent-only --output load.json
+    python -m benchmarks.load_test --agent-only --baseline load.json
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import shutil
+import struct
+import subprocess
+import tempfile
+import time
+import zlib
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+import numpy as np
+import pandas as pd
+from benchmarks.fake_openai import FakeOpenAI, FakeOpenAIConfig, LatencyProfile
+
+AGENT_DIR = Path(__file__).resolve().parent.parent / "src" / "agent"
+DATA_FILES = ["users.pkl", "user_preferences.pkl", "log.pkl"]
+
+ENDPOINTS = ["echo", "voice", "supervise", "onboard"]
+
+QUERIES = [
+    "i need to answer a message from my sister",
+    "just 5 more minutes please",
+    "i want to check the uni group chat",
+    "im bored, can i watch some reels",
+    "post a story for my friends birthday",
+    "look up the bus times on twitter",
+    "i have a break between two lectures",
+    "i need to send the homework to my study group",
+]
+
+APPS = ["com.instagram.android", "com.zhiliaoapp.musically", "com.google.android.youtube", "com.twitter.android"]
+
+
+def solid_png(width: int = 64, height: int = 128) -> bytes:
+    """A small valid PNG (grey), stands in for the screenshot of the app."""
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    rows = b"".join(b"\x00" + b"\x80\x80\x80" * width for _ in range(height))
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+def usage_items(rng: random.Random) -> list[dict]:
+    # shaped like the list the app sends (icons stripped, see reason_page.dart)
+    items = []
+    for package_name in rng.sample(APPS, k=rng.randint(1, len(APPS))):
+        minutes = rng.randint(0, 90)
+        items.append(
+            {
+                "packageName": package_name,
+                "totalTimeForeground": minutes * 60_000,
+                "totalMinutes": minutes,
+                "lastTimeUsed": int(time.time() * 1000) - rng.randint(0, 3_600_000),
+            }
+        )
+    return items
+
+
+class RequestFactory:
+    def __init__(self, user_ids: list[str], seed: int | None):
+        self.user_ids = user_ids
+        self.rng = random.Random(seed)
+        self.image = base64.b64encode(solid_png()).decode("ascii")
+        self.audio = bytes(self.rng.getrandbits(8) for _ in range(16_000))
+
+    def build(self, endpoint: str) -> dict:
+        """Keyword arguments of `client.request` for one request to `endpoint`."""
+        rng = self.rng
+        match endpoint:
+            case "echo":
+                return {
+                    "method": "POST",
+                    "url": "/echo",
+                    "json": {
+                        "text": rng.choice(QUERIES),
+                        "usage": usage_items(rng),
+                        "user_id": rng.choice(self.user_ids),
+                    },
+                }
+            case "voice":
+                return {
+                    "method": "POST",
+                    "url": "/voice",
+                    "files": {"file": ("voice.m4a", self.audio, "audio/mp4")},
+                    "data": {"user_id": rng.choice(self.user_ids), "usage": json.dumps(usage_items(rng))},
+                }
+            case "supervise":
+                return {"method": "POST", "url": "/supervise", "json": {"text": "", "image": self.image}}
+            case "onboard":
+                return {
+                    "method": "POST",
+                    "url": "/onboard",
+                    "json": {
+                        "config": {
+                            "name": "Load",
+                            "surname": f"Test{rng.randint(0, 10**6)}",
+                            "apps": rng.sample(APPS, k=2),
+                            "morning_factor": rng.randint(0, 10),
+                            "worktime_factor": rng.randint(0, 10),
+                            "evening_factor": rng.randint(0, 10),
+                            "before_bed_factor": rng.randint(0, 10),
+                        }
+                    },
+                }
+        raise ValueError(f"unknown endpoint {endpoint}")
+
+
+def summarize(samples: list[dict], seconds: float) -> dict:
+    latencies = np.array([sample["latency"] for sample in samples]) * 1000
+    errors = [sample for sample in samples if sample["error"]]
+    return {
+        "requests": len(samples),
+        "errors": len(errors),
+        "error_rate": len(errors) / len(samples) if samples else None,
+        "error_kinds": dict(Counter(sample["error"] for sample in errors)),
+        "throughput_rps": len(samples) / seconds if seconds else None,
+        "p50_ms": float(np.percentile(latencies, 50)) if samples else None,
+        "p95_ms": float(np.percentile(latencies, 95)) if samples else None,
+        "p99_ms": float(np.percentile(latencies, 99)) if samples else None,
+        "mean_ms": float(latencies.mean()) if samples else None,
+        "max_ms": float(latencies.max()) if samples else None,
+    }
+
+
+async def run_phase(
+    client: httpx.AsyncClient, factory: RequestFactory, endpoints: list[str], requests: int, concurrency: int
+) -> dict:
+    # round robin over the endpoints of the phase, `concurrency` workers pull from the same queue
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(requests):
+        endpoint = endpoints[i % len(endpoints)]
+        queue.put_nowait((endpoint, factory.build(endpoint)))
+
+    samples: dict[str, list[dict]] = {endpoint: [] for endpoint in endpoints}
+
+    async def worker():
+        while not queue.empty():
+            endpoint, request = queue.get_nowait()
+            started_at = time.perf_counter()
+            try:
+                response = await client.request(**request)
+                error = None if response.status_code == 200 else f"http_{response.status_code}"
+            except Exception as e:
+                error = type(e).__name__
+            samples[endpoint].append({"latency": time.perf_counter() - started_at, "error": error})
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    seconds = time.perf_counter() - started_at
+
+    return {
+        "seconds": seconds,
+        "total": summarize([sample for rows in samples.values() for sample in rows], seconds),
+        "endpoints": {endpoint: summarize(rows, seconds) for endpoint, rows in samples.items()},
+    }
+
+
+def prepare_data_dir() -> Path:
+    data_dir = Path(tempfile.mkdtemp(prefix="tumuch_load_"))
+    for name in DATA_FILES:
+        if (AGENT_DIR / name).exists():
+            shutil.copy(AGENT_DIR / name, data_dir / name)
+    return data_dir
+
+
+def build_app(agent_only: bool):
+    if agent_only:
+        import fastapi
+
+        from src.api.routes.test import router
+
+        app = fastapi.FastAPI()
+        app.include_router(router)
+        return app
+
+    from src.main import initialize_backend_application
+
+    return initialize_backend_application()
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, cwd=AGENT_DIR).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def load_test(args, fake: FakeOpenAI) -> dict:
+    # imported here, AGENT_DATA_DIR has to be set before the agent loads its data
+    import src.agent.agent as agent
+
+    # the test client does not run the startup handlers
+    agent.import_legacy_log()
+    app = build_app(args.agent_only)
+    agent.llm.client = fake.client(max_retries=args.max_retries)
+
+    user_ids = pd.read_pickle(agent.users_path)["id"].tolist()
+    factory = RequestFactory(user_ids, args.seed)
+
+    phases = [[endpoint] for endpoint in args.endpoints]
+    if args.mixed:
+        phases.append(list(args.endpoints))
+
+    async def run(client):
+        results = {}
+        for endpoints in phases:
+            name = endpoints[0] if len(endpoints) == 1 else "mixed"
+            results[name] = await run_phase(client, factory, endpoints, args.requests, args.concurrency)
+            print(f"{name}: {json.dumps(results[name]['total'])}")
+        metrics = (await client.get("/metrics")).json()
+        return results, metrics
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver", timeout=None) as client:
+        if args.agent_only:
+            results, metrics = await run(client)
+        else:
+            import asgi_lifespan
+
+            async with asgi_lifespan.LifespanManager(app):
+                results, metrics = await run(client)
+
+    return {
+        "benchmark": "load_test",
+        "commit": git_commit(),
+        "date_time": datetime.now().isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "phases": results,
+        "fake_openai": fake.stats(),
+        "metrics": metrics,
+    }
+
+
+def compare(report: dict, baseline: dict) -> dict:
+    """Relative change (new / old - 1) of latency and throughput per phase and endpoint."""
+    changes = {}
+    for phase, result in report["phases"].items():
+        old_phase = baseline.get("phases", {}).get(phase)
+        if not old_phase:
+            continue
+        for endpoint, new in result["endpoints"].items():
+            old = old_phase["endpoints"].get(endpoint)
+            if not old:
+                continue
+            changes[f"{phase}/{endpoint}"] = {
+                key: (new[key] / old[key] - 1) if old[key] else None
+                for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps")
+            } | {"error_rate": (new["error_rate"], old["error_rate"])}
+    return {"baseline_commit": baseline.get("commit"), "changes": changes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--endpoints",
+        type=lambda value: value.split(","),
+        default=["echo", "voice", "supervise"],
+        help=f"comma separated, out of {','.join(ENDPOINTS)}",
+    )
+    parser.add_argument("--requests", type=int, default=200, help="requests per phase")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--mixed", action="store_true", help="add a phase with all endpoints interleaved")
+    parser.add_argument("--median-ms", type=float, default=600.0, help="median latency of the fake responses API")
+    parser.add_argument("--sigma", type=float, default=0.5, help="lognormal sigma of the fake latency")
+    parser.add_argument("--transcription-median-ms", type=float, default=400.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of fake OpenAI calls that fail")
+    parser.add_argument("--max-retries", type=int, default=0, help="SDK retries of failed calls")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--agent-only", action="store_true", help="only the agent routes, no settings / database")
+    parser.add_argument("--keep-data", action="store_true", help="keep the temporary data folder")
+    parser.add_argument("--baseline", type=str, default=None, help="report of an earlier run to compare against")
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    data_dir = prepare_data_dir()
+    os.environ["AGENT_DATA_DIR"] = str(data_dir)
+
+    config = FakeOpenAIConfig(
+        responses=LatencyProfile(median_ms=args.median_ms, sigma=args.sigma),
+        transcriptions=LatencyProfile(median_ms=args.transcription_median_ms, sigma=args.sigma),
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+    )
+    try:
+        with FakeOpenAI(config) as fake:
+            report = asyncio.run(load_test(args, fake))
+    finally:
+        if not args.keep_data:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["comparison"] = compare(report, json.load(f))
+        print(json.dumps(report["comparison"], indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
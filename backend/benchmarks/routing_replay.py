@@ -0,0 +1,165 @@
+"""
+Offline evaluation of the model routing tiers (src/agent/routing.py).
+
+Replays the gatekeeper requests stored in log.pkl against the small model and compares its
+decisions with the logged ones (made by the large model). With --ask-large the large model is
+asked again with the same replay context, so both tiers see exactly the same prompt.
+
+App usage and calendar events are not in the log, the replay context only has the time of day
+and the user's earlier requests of that day. Needs OPENAI_API_KEY. Run from the backend folder:
+
+    python -m benchmarks.routing_replay --limit 200 --output routing_replay.json
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import pandas as pd
+
+from src.agent.context_builder import ContextBuilder
+from src.agent.formats import BouncerAnswerFormat, TieredBouncerAnswerFormat
+from src.agent.helpers import log_path, preferences_path, send_simple_query
+from src.agent.prompt_layout import assemble_messages
+from src.agent.prompt_templates import compile_user_prompt, UserPreferences
+from src.agent.routing import ModelRouter, RoutingInput
+
+
+def load_requests(limit: int) -> list[dict]:
+    log_df = pd.read_pickle(log_path).sort_values("date_time")
+    rows = [row for row in log_df.to_dict("records") if isinstance(row["answer"], dict) and "allow" in row["answer"]]
+    return rows[-limit:] if limit else rows
+
+
+def latest_preferences() -> dict[str, UserPreferences]:
+    preferences_df = pd.read_pickle(preferences_path).sort_values("date_time")
+    return {row["user_id"]: UserPreferences.from_row(row) for row in preferences_df.to_dict("records")}
+
+
+def replay_messages(row: dict, history: list[dict], preferences: UserPreferences, builder: ContextBuilder) -> list:
+    compiled = compile_user_prompt("the user", preferences)
+    date_time = pd.Timestamp(row["date_time"]).to_pydatetime()
+    context = compiled.context(
+        time=date_time.strftime("%H:%M"),
+        history=builder.history(row["user_id"], history).text,
+        today="",
+        insight="",
+        usage="No usage found for tracked apps.",
+        usage_trend="",
+        events="",
+        similar_decision="",
+    )
+    return assemble_messages(
+        flow="gatekeeper",
+        variant=compiled.personality,
+        static=list(compiled.static),
+        user=[compiled.user_info],
+        dynamic=[context],
+        user_input=row["query"],
+        cache_key=compiled.cache_key,
+    ).messages
+
+
+async def replay(limit: int, ask_large: bool) -> dict:
+    router = ModelRouter()
+    builder = ContextBuilder()
+    preferences = latest_preferences()
+    rows = load_requests(limit)
+
+    # earlier requests of the same user on the same day, as the gatekeeper saw them
+    jobs = []
+    for i, row in enumerate(rows):
+        date_time = pd.Timestamp(row["date_time"]).to_pydatetime()
+        history = [
+            {**earlier, "date_time": pd.Timestamp(earlier["date_time"]).to_pydatetime()}
+            for earlier in rows[:i]
+            if earlier["user_id"] == row["user_id"] and pd.Timestamp(earlier["date_time"]).date() == date_time.date()
+        ]
+        user_preferences = preferences.get(row["user_id"]) or UserPreferences.from_row(None)
+        route = router.route(
+            RoutingInput(
+                query=row["query"], usage_minutes=0, target_minutes=user_preferences.target_minutes, now=date_time
+            )
+        )
+        jobs.append((row, route, replay_messages(row, history, user_preferences, builder)))
+
+    async def ask(model, schema, messages):
+        started_at = time.perf_counter()
+        answer = await send_simple_query(messages, response_schema=schema, model=model)
+        return answer, time.perf_counter() - started_at
+
+    small = await asyncio.gather(
+        *[ask(router.small_model, TieredBouncerAnswerFormat, messages) for _, _, messages in jobs]
+    )
+    large = None
+    if ask_large:
+        large = await asyncio.gather(
+            *[ask(router.large_model, BouncerAnswerFormat, messages) for _, _, messages in jobs]
+        )
+
+    results = []
+    for i, (row, route, _) in enumerate(jobs):
+        small_answer, small_latency = small[i]
+        reference = large[i][0].dict() if large else row["answer"]
+        results.append(
+            {
+                "query": row["query"],
+                "route": route.reason,
+                "confident": router.confident(small_answer),
+                "agree": small_answer.allow == reference["allow"],
+                "time_diff": (
+                    abs(small_answer.time - int(reference.get("time") or 0))
+                    if small_answer.allow and reference["allow"]
+                    else None
+                ),
+                "small_latency": small_latency,
+                "large_latency": large[i][1] if large else None,
+            }
+        )
+
+    return {
+        "benchmark": "routing_replay",
+        "reference": "large model" if ask_large else "log",
+        **summarize(results),
+        "requests": results,
+    }
+
+
+def summarize(results: list[dict]) -> dict:
+    def rate(rows, key):
+        return sum(row[key] for row in rows) / len(rows) if rows else None
+
+    # what the router would have kept on the small tier
+    kept = [row for row in results if row["route"] == "default" and row["confident"]]
+    time_diffs = [row["time_diff"] for row in results if row["time_diff"] is not None]
+    large_latencies = [row["large_latency"] for row in results if row["large_latency"] is not None]
+
+    return {
+        "replayed": len(results),
+        "agreement": rate(results, "agree"),
+        "small_tier_share": len(kept) / len(results) if results else None,
+        "agreement_on_small_tier": rate(kept, "agree"),
+        "mean_time_diff_minutes": sum(time_diffs) / len(time_diffs) if time_diffs else None,
+        "avg_small_latency_seconds": sum(row["small_latency"] for row in results) / len(results) if results else None,
+        "avg_large_latency_seconds": sum(large_latencies) / len(large_latencies) if large_latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=200, help="replay the newest N requests (0 = all)")
+    parser.add_argument("--ask-large", action="store_true", help="compare against the large model instead of the log")
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    report = asyncio.run(replay(args.limit, args.ask_large))
+    print(json.dumps({key: value for key, value in report.items() if key != "requests"}, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
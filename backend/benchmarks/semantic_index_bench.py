@@ -0,0 +1,118 @@
+"""
+Recall / latency benchmark of the semantic decision index (src/agent/semantic_index.py).
+
+Run from the backend folder:
+
+    python -m benchmarks.semantic_index_bench --output semantic_index.json
+"""
+
+import argparse
+import json
+import random
+import time
+
+from src.agent.semantic_index import SemanticDecisionIndex
+
+# (earlier request, paraphrase the index should find)
+PARAPHRASES = [
+    ("answer a friend on insta", "reply to my friend on instagram"),
+    ("watch reels because i am bored", "im bored wanna watch some reels"),
+    ("check the uni group chat", "quick look at the group chat from uni"),
+    ("post a story for my birthday", "upload a birthday story"),
+    ("look up the bus schedule on twitter", "check twitter for the bus times"),
+    ("reply to my mum on whatsapp", "my mum texted me, need to answer"),
+    ("just 5 more minutes", "5 more minutes please"),
+    ("find a recipe on youtube for dinner", "youtube recipe for dinner tonight"),
+    ("check if the lecture is cancelled", "is the lecture cancelled today"),
+    ("scroll tiktok before bed", "tiktok scrolling before sleeping"),
+    ("follow a colleague on linkedin", "i want to follow my colleague on linkedin"),
+    ("send the homework to my study group", "share homework with the study group"),
+]
+
+FILLER_WORDS = [
+    "open",
+    "check",
+    "watch",
+    "scroll",
+    "reply",
+    "post",
+    "look",
+    "video",
+    "friend",
+    "news",
+    "music",
+    "game",
+    "photo",
+    "message",
+    "quick",
+    "later",
+    "today",
+    "work",
+    "lecture",
+    "bored",
+    "story",
+    "feed",
+    "app",
+    "minutes",
+]
+
+
+def filler_queries(n: int, rng: random.Random) -> list[str]:
+    return [" ".join(rng.choice(FILLER_WORDS) for _ in range(rng.randint(3, 7))) for _ in range(n)]
+
+
+def run(sizes: list[int], repeats: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    results = []
+
+    for size in sizes:
+        index = SemanticDecisionIndex(max_entries_per_user=size + len(PARAPHRASES))
+        for query in filler_queries(size, rng):
+            index.add("bench", query, {"allow": False, "time": 0, "reply": ""})
+        for original, _ in PARAPHRASES:
+            index.add("bench", original, {"allow": True, "time": 5, "reply": ""})
+
+        hits = 0
+        similarities = []
+        latencies = []
+        for _ in range(repeats):
+            for original, paraphrase in PARAPHRASES:
+                started_at = time.perf_counter()
+                match = index.nearest("bench", paraphrase)
+                latencies.append(time.perf_counter() - started_at)
+                assert match is not None
+                hits += match.entry.query == original
+                similarities.append(match.similarity)
+
+        latencies.sort()
+        results.append(
+            {
+                "index_size": size + len(PARAPHRASES),
+                "recall_at_1": hits / (repeats * len(PARAPHRASES)),
+                "mean_similarity": sum(similarities) / len(similarities),
+                "p50_lookup_us": latencies[len(latencies) // 2] * 1e6,
+                "p99_lookup_us": latencies[int(len(latencies) * 0.99)] * 1e6,
+            }
+        )
+
+    return {"benchmark": "semantic_index", "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 32, 116, 500])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.repeats, args.seed)
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,117 @@
 #%%  
 import os
 import asyncio
+from time import perf_counter
+import decouple
+import loguru
+import openai
 
 from .helpers import *
 from .prompts import *
-
-def parse_usage(usage_list, tracked_apps):
+from .batch import LocalBatchRunner
+from .behaviour import ask_llm, run_behaviour_analysis
+from .call_policy import CallPolicy, CircuitBreaker, CircuitOpenError
+from .context_builder import ContextBuilder, PromptTokenStats, count_tokens
+from .decision_cache import DecisionCache, DecisionKey, normalize_query
+from .llm_client import LLMTimeoutError
+from .policy import PolicyEngine, PolicyInput
+from .prompt_layout import assemble_messages
+from .prompt_templates import PromptCompiler
+from .routing import LARGE, SMALL, ModelRouter, RouteDecision, RoutingInput, parse_model_prices
+from .scheduler import JobShedError
+from .single_flight import SingleFlight
+from .streaming import IncrementalJSONObjectParser, sse_event
+from .usage_matcher import AppMatcher, UsageMatcherCache
+from .usage_series import UsageSeriesStore, features_to_prompt
+from .usage_snapshots import UsageSnapshotStore
+
+policy_engine = PolicyEngine(
+    max_requests_per_day=decouple.config("POLICY_MAX_REQUESTS_PER_DAY", default=20, cast=int),
+    over_target_factor=decouple.config("POLICY_OVER_TARGET_FACTOR", default=1.5, cast=float),
+)
+
+# repeated requests in the same context reuse the last decision (with some randomness, see decision_cache.py)
+decision_cache = DecisionCache(
+    ttl_seconds=decouple.config("DECISION_CACHE_TTL_SECONDS", default=600, cast=float),
+    max_entries=decouple.config("DECISION_CACHE_MAX_ENTRIES", default=4096, cast=int),
+    reuse_probability=decouple.config("DECISION_CACHE_REUSE_PROBABILITY", default=0.8, cast=float),
+)
+
+# paraphrases of earlier requests reuse (very similar, same context, same numbers) or seed (similar) a decision,
+# the index itself lives in helpers so delete_user_logs can drop a user's entries
+SEMANTIC_REUSE_THRESHOLD = decouple.config("SEMANTIC_REUSE_THRESHOLD", default=0.85, cast=float)
+SEMANTIC_SEED_THRESHOLD = decouple.config("SEMANTIC_SEED_THRESHOLD", default=0.45, cast=float)
+
+# the request history in the prompt stays below CONTEXT_MAX_TOKENS however often a user asks
+context_builder = ContextBuilder(
+    max_tokens=decouple.config("CONTEXT_MAX_TOKENS", default=600, cast=int),
+    recent_entries=decouple.config("CONTEXT_RECENT_ENTRIES", default=8, cast=int),
+)
+prompt_tokens = PromptTokenStats()
+prompt_compiler = PromptCompiler()
+
+# small model first, large model for long / ambiguous / borderline requests and low confidence answers
+model_router = ModelRouter(
+    small_model=decouple.config("ROUTING_SMALL_MODEL", default="gpt-5-mini"),
+    large_model=decouple.config("ROUTING_LARGE_MODEL", default="gpt-5.1"),
+    enabled=decouple.config("ROUTING_ENABLED", default=True, cast=bool),
+    max_query_words=decouple.config("ROUTING_MAX_QUERY_WORDS", default=25, cast=int),
+    near_limit_margin=decouple.config("ROUTING_NEAR_LIMIT_MARGIN", default=0.15, cast=float),
+    min_confidence=decouple.config("ROUTING_MIN_CONFIDENCE", default=0.7, cast=float),
+    prices=parse_model_prices(decouple.config("ROUTING_MODEL_PRICES", default="gpt-5-mini=0.25/2.0,gpt-5.1=1.25/10.0")),
+)
+
+# deadline, hedged duplicate after the p95 latency and circuit breaker for the gatekeeper LLM call
+gatekeeper_calls = CallPolicy(
+    name="gatekeeper",
+    deadline_seconds=decouple.config("CALL_DEADLINE_ECHO_SECONDS", default=8, cast=float),
+    hedge=decouple.config("CALL_HEDGING", default=True, cast=bool),
+    breaker=CircuitBreaker(
+        failure_threshold=decouple.config("CALL_BREAKER_FAILURES", default=5, cast=int),
+        reset_seconds=decouple.config("CALL_BREAKER_RESET_SECONDS", default=30, cast=float),
+    ),
+)
+
+# package name -> tracked app, learned per user while the tracked apps stay the same
+usage_matchers = UsageMatcherCache(
+    max_users=decouple.config("USAGE_MATCHER_MAX_USERS", default=1024, cast=int),
+)
+
+# latest usage list of every user, requests only send the changed packages
+usage_snapshots = UsageSnapshotStore(
+    max_users=decouple.config("USAGE_SNAPSHOT_MAX_USERS", default=4096, cast=int),
+)
+
+# hourly / daily / weekly usage of the tracked apps, summarized in the prompt
+usage_series = UsageSeriesStore(
+    max_users=decouple.config("USAGE_SERIES_MAX_USERS", default=4096, cast=int),
+)
+
+# concurrent duplicates (retries, double taps) share one decision and one log entry
+permission_flights = SingleFlight()
+
+async def record_decision(user_id, query, answer):
+    # cached decisions of this user stay: the usage and request buckets of their keys keep them apart
+    await update_log(user_id, query, answer.dict())
+
+def match_usage(usage_list, tracked_apps, matcher=None):
     """
     usage_list: list of dicts from Android (packageName, totalTimeForeground, lastTimeUsed)
-    tracked_apps: list of lowercase app names you care about,
+    tracked_apps: list of app names you care about,
                   e.g. ["instagram", "tiktok", "youtube"]
-    """
-
-    tracked_apps = [a.lower() for a in tracked_apps]
-
+    matcher: cached AppMatcher of the user (usage_matchers.get), built here if not given
 
+    Returns one entry per tracked app with usage, the minutes of all its packages summed up.
+    """
+    if matcher is None:
+        matcher = AppMatcher(tracked_apps)
 
-    # STEP 1 — Filter packages
-    filtered = []
-    for item in usage_list:
-        pkg = item.packageName.lower()
+    totals = matcher.totals(usage_list)
+    return [{"app": app, "minutes": minutes} for app, minutes in totals.items()]
 
-        # keep package if one of your app names appears in the packageName
-        for app in tracked_apps:
-            if app in pkg:
-                filtered.append(
-                    {"app": app, "minutes": item.totalMinutes}
-                )
+def parse_usage(usage_list, tracked_apps, filtered=None):
+    if filtered is None:
+        filtered = match_usage(usage_list, tracked_apps)
 
     lines = []
     for item in filtered:
@@ -37,9 +122,6 @@ def parse_usage(usage_list, tracked_apps):
             f"App: {app} - used time: {minutes} min"
         )
 
-    print("lines: ", lines)
-    print("filtered", filtered)
-
     # STEP 3 — Final output
     if not lines:
         return "No usage found for tracked apps."
@@ -53,22 +135,50 @@ def parse_usage(usage_list, tracked_apps):
 
 # %%
 async def analyzer_user_behaviour(user_id: str, past_day: int):
-    pass
-
-async def ask_for_app_permission(user_id: str, query: str, app_usage):
+    # one user right away, the daily batch run (behaviour.py) analyses everybody
+    insights = await run_behaviour_analysis(
+        LocalBatchRunner(ask_llm), days=past_day, checkpoint_file=None, user_ids=[user_id]
+    )
+    return insights.get(user_id)
+
+@dataclass
+class PermissionRequest:
+    """Everything needed to ask the LLM and to store its decision afterwards."""
+    user_id: str
+    query: str
+    messages: list
+    # provider prompt cache key of the static prefix
+    prompt_cache_key: str
+    cache_key: DecisionKey
+    decision_context: tuple
+    # what the model router looks at (query length, usage vs. target, running events)
+    routing: RoutingInput
+    # for the deterministic fallback answer when the LLM is not available in time
+    policy_input: PolicyInput
+
+
+async def prepare_app_permission(user_id: str, query: str, app_usage):
+    """
+    Returns a final BouncerAnswerFormat when the request is decided without the LLM (fast path,
+    cache, semantic reuse; already logged), otherwise the PermissionRequest for the LLM call.
+    """
 
     # for testing
     #user_preferences = "The user asking is Tim. He is very ambitionate and in his exam period and want you to be very strict with him"
-    user_name = get_name(user_id)
-    user_pref, user_fav_personality, apps = get_user_preferences(user_id)
-
-    PERSONALITY_PROMPT = PERSONALITY_MAP[user_fav_personality]
-
-    parsed_usage = parse_usage(app_usage, apps)
+    # one pass over users, preferences and the log
+    user_context = await load_user_context(user_id, window=24)
+    user_name = user_context.name
+    preferences = user_context.preferences
+    apps = list(preferences.apps)
+
+    # prompt fragments of this user, only compiled again when the preferences change
+    compiled_prompt = prompt_compiler.get(user_id, user_name, preferences)
+
+    matched_usage = match_usage(app_usage, apps, matcher=usage_matchers.get(user_id, apps))
+    parsed_usage = parse_usage(app_usage, apps, filtered=matched_usage)
+    usage_series.ingest(user_id, {item["app"]: item["minutes"] for item in matched_usage})
     # TODO add a database for this
 
-    user_log = get_user_log(user_id, time_delay=24)
-
     time = datetime.now().strftime("%H:%M")
 
     # =========== Hardcode part ==================
@@ -88,58 +198,326 @@ async def ask_for_app_permission(user_id: str, query: str, app_usage):
     todays_events_strings = [f"{ev['date']} | {ev['start']}-{ev['end']} | Name: {ev['lecture']}" for ev in todays_events]
     events_str = "\n\n".join(todays_events_strings)
 
-    # TODO add here user app usage statistics
-    context = f"""
-    CONTEXT:
+    usage_minutes = sum(item["minutes"] for item in matched_usage)
+
+    # clear-cut cases are decided without the LLM
+    policy_input = PolicyInput(
+        name=user_name,
+        query=query,
+        personality=preferences.personality,
+        time_factors=preferences.time_factors,
+        today=user_context.today,
+        usage_minutes=usage_minutes,
+        target_minutes=preferences.target_minutes,
+    )
+    decision = policy_engine.evaluate(policy_input)
+
+    if decision is not None:
+        loguru.logger.info(f"Gatekeeper --- fast path `{decision.rule}` for user {user_id}")
+        await record_decision(user_id, query, decision.answer)
+        return decision.answer
+
+    cache_key = decision_cache.key(
+        user_id=user_id,
+        query=query,
+        personality=preferences.personality,
+        usage_minutes=usage_minutes,
+        requests_today=user_context.request_count,
+        now=datetime.now(),
+    )
+    cached_answer = decision_cache.get(cache_key)
+
+    if cached_answer is not None:
+        loguru.logger.info(f"Gatekeeper --- decision cache hit for user {user_id}")
+        # the repeated request is still logged
+        await record_decision(user_id, query, cached_answer)
+        return cached_answer
+
+    if not semantic_index.has_user(user_id):
+        semantic_index.seed(user_id, await get_recent_user_log_entries(user_id, semantic_index.max_entries_per_user))
+
+    decision_context = (cache_key.usage_bucket, cache_key.time_slot)
+    similar = semantic_index.nearest(user_id, query)
+
+    if similar is not None and similar.reusable(query, decision_context, SEMANTIC_REUSE_THRESHOLD):
+        loguru.logger.info(f"Gatekeeper --- semantic reuse ({similar.similarity:.2f}) for user {user_id}")
+        reused_answer = BouncerAnswerFormat(**similar.entry.answer)
+        await update_log(user_id, query, reused_answer.dict())
+        return reused_answer
+
+    similar_decision = ""
+    if similar is not None and similar.similarity >= SEMANTIC_SEED_THRESHOLD:
+        similar_decision = f"""
+    A similar earlier request of the user was "{similar.entry.query}" and you answered: {similar.entry.answer}
+    """
+
+    loguru.logger.info(f"Gatekeeper --- LLM path for user {user_id}")
+
+    # last requests verbatim + summary of the older ones, capped at CONTEXT_MAX_TOKENS
+    history = context_builder.history(user_id, user_context.log_entries, user_context.time_delay)
+
+    context = compiled_prompt.context(
+        time=time,
+        history=history.text,
+        today=user_context.today.to_prompt(),
+        insight=user_context.insight_text,
+        usage=parsed_usage,
+        usage_trend=features_to_prompt(usage_series.features(user_id)),
+        events=events_str,
+        similar_decision=similar_decision,
+    )
+
+    loguru.logger.debug(f"Gatekeeper --- prompt for user {user_id}:\n{compiled_prompt.user_info}\n{context}")
+
+    prompt_tokens.record({
+        "system": count_tokens(compiled_prompt.static[0]),
+        "personality": count_tokens(compiled_prompt.static[1]),
+        "user": count_tokens(compiled_prompt.user_info),
+        "context": count_tokens(context),
+        "history_summary": history.tokens["summary"],
+        "history_recent": history.tokens["recent"],
+        "query": count_tokens(query),
+    })
+
+    # most static first (shared per personality) -> most dynamic last, see prompt_layout.py
+    prompt = assemble_messages(
+        flow="gatekeeper",
+        variant=compiled_prompt.personality,
+        static=list(compiled_prompt.static),
+        user=[compiled_prompt.user_info],
+        dynamic=[context],
+        user_input=query,
+        cache_key=compiled_prompt.cache_key,
+    )
+
+    return PermissionRequest(
+        user_id=user_id,
+        query=query,
+        messages=prompt.messages,
+        prompt_cache_key=prompt.cache_key,
+        cache_key=cache_key,
+        decision_context=decision_context,
+        routing=RoutingInput(
+            query=query,
+            usage_minutes=usage_minutes,
+            target_minutes=preferences.target_minutes,
+            events=todays_events,
+        ),
+        policy_input=policy_input,
+    )
+
+
+async def finish_app_permission(request: PermissionRequest, answer):
+    await record_decision(request.user_id, request.query, answer)
+    decision_cache.put(request.cache_key, answer)
+    semantic_index.add(request.user_id, request.query, answer.dict(), context=request.decision_context)
+
+
+def usage_fingerprint(app_usage) -> tuple:
+    return tuple(sorted((item.packageName, item.totalMinutes) for item in app_usage))
 
-    current time: {time} in european stadat
 
-    The users name is: {user_name}
+async def ask_for_app_permission(user_id: str, query: str, app_usage):
+    key = (user_id, normalize_query(query), usage_fingerprint(app_usage))
+    return await permission_flights.run(key, lambda: _ask_for_app_permission(user_id, query, app_usage))
+
+
+async def _ask_for_app_permission(user_id: str, query: str, app_usage):
+    request = await prepare_app_permission(user_id, query, app_usage)
+    if isinstance(request, BouncerAnswerFormat):
+        return request
+
+    # routed once per decision, hedged attempts share the route
+    route = model_router.route(request.routing)
+    try:
+        answer, final_route = await gatekeeper_calls.run(lambda: _routed_decision(request, route))
+    except (LLMTimeoutError, CircuitOpenError, JobShedError, openai.OpenAIError) as error:
+        answer, reason = None, repr(error)
+    else:
+        reason = "refusal or empty answer"
+        if final_route is not route:
+            model_router.count_escalation(final_route.reason)
+
+    if answer is None:
+        loguru.logger.warning(f"Gatekeeper --- fallback answer for user {user_id}: {reason}")
+        answer = policy_engine.fallback(request.policy_input)
+        # logged, but not cached: it is not a model decision
+        await record_decision(user_id, query, answer)
+        return answer
+
+    loguru.logger.info(f"Gatekeeper --- answered by {final_route.model} ({final_route.reason}) for user {user_id}")
+    await finish_app_permission(request, answer)
+    return answer
 
-    The user has the following history of asking for allowance for the day:     
-    {user_log} 
 
-    The user has the following app usage times for today for the apps in his preferences
-    {parsed_usage}
+async def _routed_decision(request: PermissionRequest, route: RouteDecision):
+    """(answer, final route), answer is None when the large model refused or returned nothing."""
+    if route.tier == SMALL:
+        started_at = perf_counter()
+        tiered_answer = await send_simple_query(
+            request.messages,
+            response_schema=TieredBouncerAnswerFormat,
+            prompt_cache_key=request.prompt_cache_key,
+            model=route.model,
+        )
+        model_router.record(SMALL, perf_counter() - started_at)
 
-    The user has for today the following events planned:
-    {events_str}
+        if model_router.confident(tiered_answer):
+            return tiered_answer.to_answer(), route
+        route = model_router.escalate("low_confidence" if tiered_answer is not None else "no_answer")
 
+    started_at = perf_counter()
+    answer = await send_simple_query(
+        request.messages,
+        response_schema=BouncerAnswerFormat,
+        prompt_cache_key=request.prompt_cache_key,
+        model=route.model,
+    )
+    model_router.record(LARGE, perf_counter() - started_at)
+    return answer, route
+
+
+async def stream_app_permission(user_id: str, query: str, app_usage):
     """
+    Same decision as `ask_for_app_permission`, as Server-Sent Events:
 
-    print(user_pref)
-    print(context)
-
-    messages = [
-        {
-            "role": "system",
-            "content": GATEKEEPER_SYSTEM_PROMPT
-        },
-        {
-            "role": "system",
-            "content": PERSONALITY_PROMPT
-        },
-        {
-            "role": "system",
-            "content": user_pref
-        },
-        {
-            "role": "system",
-            "content": context
-        },
-        {
-            "role": "user",
-            "content": query
-        }
-    ]
-
-    answer = send_simple_query(messages, response_schema=BouncerAnswerFormat)
-
-    update_log(user_id, query, answer.dict())
+        event: verdict   {"allow": ..., "time": ...}   as soon as both fields are decoded
+        event: reply     {"delta": "..."}              reply text while it is generated
+        event: done      full answer                   after the decision was logged (once)
 
+    The decision runs in its own task (shared with concurrent duplicates, see single_flight.py)
+    and is logged even when the client disconnects, this generator only relays its events.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    key = (user_id, normalize_query(query), usage_fingerprint(app_usage))
+    decision = asyncio.ensure_future(
+        permission_flights.run(key, lambda: _stream_app_permission(user_id, query, app_usage, events.put_nowait))
+    )
+
+    next_event = None
+    relayed = False
+    try:
+        while not decision.done():
+            next_event = asyncio.ensure_future(events.get())
+            await asyncio.wait({next_event, decision}, return_when=asyncio.FIRST_COMPLETED)
+            if next_event.done():
+                relayed = True
+                yield next_event.result()
+            else:
+                next_event.cancel()
+        while not events.empty():
+            relayed = True
+            yield events.get_nowait()
+        answer = decision.result()
+    finally:
+        # a closed generator only stops the relay, the decision task finishes on its own
+        if next_event is not None:
+            next_event.cancel()
+        decision.cancel()
+
+    if relayed:
+        yield sse_event("done", answer.dict())
+    else:
+        # decided without streaming, or a duplicate of a request that is already running
+        for event in _answer_events(answer):
+            yield event
+
+
+async def _stream_app_permission(user_id: str, query: str, app_usage, emit) -> BouncerAnswerFormat:
+    """The streamed decision: verdict and reply events go to `emit`, returns the logged answer."""
+    request = await prepare_app_permission(user_id, query, app_usage)
+    if isinstance(request, BouncerAnswerFormat):
+        return request
+
+    if not gatekeeper_calls.breaker.allow():
+        gatekeeper_calls.counters["short_circuited"] += 1
+        fallback = policy_engine.fallback(request.policy_input)
+        await record_decision(user_id, query, fallback)
+        return fallback
+
+    # the streamed verdict can not be taken back, so there is no low confidence escalation (and no hedging) here
+    route = model_router.route(request.routing)
+    response_schema = TieredBouncerAnswerFormat if route.tier == SMALL else BouncerAnswerFormat
+
+    parser = IncrementalJSONObjectParser()
+    verdict_sent = False
+    streamed_reply = ""
+    answer: BouncerAnswerFormat | None = None
+    error = None
+    gatekeeper_calls.counters["calls"] += 1
+    started_at = perf_counter()
+
+    try:
+        # `timeout` bounds the gap between two chunks, the deadline the whole stream
+        async with asyncio.timeout(gatekeeper_calls.deadline_seconds):
+            async for kind, payload in stream_simple_query(
+                request.messages,
+                response_schema=response_schema,
+                prompt_cache_key=request.prompt_cache_key,
+                model=route.model,
+                timeout=gatekeeper_calls.deadline_seconds,
+            ):
+                if kind == "final":
+                    # None on a refusal or an unparsable answer -> fallback below
+                    if payload is not None:
+                        answer = payload.to_answer() if route.tier == SMALL else payload
+                    break
+
+                for event, key, value in parser.feed(payload):
+                    if event == "string_delta" and key == "reply":
+                        streamed_reply += value
+                        if verdict_sent:
+                            emit(sse_event("reply", {"delta": value}))
+                    elif event == "field" and not verdict_sent and {"allow", "time"} <= parser.values.keys():
+                        verdict_sent = True
+                        emit(sse_event("verdict", {"allow": parser.values["allow"], "time": parser.values["time"]}))
+                        # reply decoded before the verdict (unusual field order) is sent in one piece
+                        if streamed_reply:
+                            emit(sse_event("reply", {"delta": streamed_reply}))
+    except (LLMTimeoutError, JobShedError, openai.OpenAIError) as stream_error:
+        error = stream_error
+    except TimeoutError:
+        gatekeeper_calls.counters["deadline_exceeded"] += 1
+        deadline = gatekeeper_calls.deadline_seconds
+        error = LLMTimeoutError(f"gatekeeper: stream not finished within the {deadline}s deadline")
+
+    if answer is None:
+        # failed call, stall, deadline or a stream without a final answer
+        gatekeeper_calls.counters["failures"] += 1
+        gatekeeper_calls.breaker.failure()
+        reason = repr(error) if error is not None else "stream ended without a final answer"
+        loguru.logger.warning(f"Gatekeeper --- fallback answer for user {user_id}: {reason}")
+        if not verdict_sent:
+            answer = policy_engine.fallback(request.policy_input)
+            await record_decision(user_id, query, answer)
+            return answer
+
+        # a verdict that was already sent can not be replaced anymore: finish with it
+        allow, minutes = bool(parser.values["allow"]), int(parser.values["time"])
+        answer = policy_engine.fallback(request.policy_input, minutes=minutes, allow=allow)
+        if streamed_reply:
+            answer.reply = streamed_reply
+        else:
+            emit(sse_event("reply", {"delta": answer.reply}))
+        # logged, but not cached: it is not a complete model decision
+        await record_decision(user_id, query, answer)
+        return answer
+
+    gatekeeper_calls.breaker.success()
+    model_router.record(route.tier, perf_counter() - started_at)
+
+    # without a streamed verdict the relay sends the complete answer
+    await finish_app_permission(request, answer)
     return answer
 
 
+def _answer_events(answer):
+    # a complete answer as the same event sequence the streamed one produces
+    yield sse_event("verdict", {"allow": answer.allow, "time": answer.time})
+    yield sse_event("reply", {"delta": answer.reply})
+    yield sse_event("done", answer.dict())
+
+
 # %%
 def main():
     mikey = "682596a5-7863-4419-9138-5f52c2779e61" 
@@ -0,0 +1,95 @@
+# %% per-user daily aggregates
+"""
+Running per-user counters for the current day, updated on every log write.
+
+Answers "how many requests today / how many allowed / how many minutes granted" in O(1)
+instead of scanning the log. A row belongs to one calendar day, the first write (or read)
+after midnight starts a fresh row.
+"""
+import threading
+from dataclasses import asdict, dataclass
+from datetime import date, datetime
+
+
+@dataclass
+class DailyAggregate:
+    day: date
+    requests: int = 0
+    allows: int = 0
+    denies: int = 0
+    minutes_granted: int = 0
+    last_decision_time: datetime | None = None
+
+    def add(self, answer, date_time: datetime):
+        self.requests += 1
+
+        if isinstance(answer, dict) and "allow" in answer:
+            if answer["allow"]:
+                self.allows += 1
+                self.minutes_granted += int(answer.get("time") or 0)
+            else:
+                self.denies += 1
+
+        if self.last_decision_time is None or date_time > self.last_decision_time:
+            self.last_decision_time = date_time
+
+    def to_dict(self) -> dict:
+        row = asdict(self)
+        row["day"] = self.day.isoformat()
+        row["last_decision_time"] = self.last_decision_time.isoformat() if self.last_decision_time else None
+        return row
+
+    def to_prompt(self) -> str:
+        if not self.requests or self.last_decision_time is None:
+            return "The user has not asked for anything yet today."
+        return (
+            f"Today so far: {self.requests} requests, {self.allows} allowed "
+            f"({self.minutes_granted} minutes granted in total), {self.denies} denied. "
+            f"Last decision at {self.last_decision_time.strftime('%H:%M')}."
+        )
+
+
+class DailyAggregates:
+    def __init__(self):
+        self._rows: dict[str, DailyAggregate] = {}
+        self._lock = threading.Lock()
+
+    def record(self, user_id: str, answer, date_time: datetime):
+        """Count one logged request. Entries of past days are ignored."""
+        day = date_time.date()
+        if day != date.today():
+            return
+
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is None or row.day != day:
+                # midnight rollover
+                row = self._rows[user_id] = DailyAggregate(day=day)
+            row.add(answer, date_time)
+
+    def reset(self, user_id: str):
+        with self._lock:
+            self._rows.pop(user_id, None)
+
+    def has(self, user_id: str) -> bool:
+        row = self._rows.get(user_id)
+        return row is not None and row.day == date.today()
+
+    def get(self, user_id: str) -> DailyAggregate:
+        """Today's row of a user (an empty one if nothing was logged today)."""
+        today = date.today()
+        row = self._rows.get(user_id)
+        if row is None or row.day != today:
+            return DailyAggregate(day=today)
+        return row
+
+    def seed(self, user_id: str, entries: list[dict]):
+        """Rebuild today's row of a user from log entries (used when the log lives elsewhere)."""
+        today = date.today()
+        row = DailyAggregate(day=today)
+        for entry in entries:
+            if entry["date_time"].date() == today:
+                row.add(entry["answer"], entry["date_time"])
+
+        with self._lock:
+            self._rows[user_id] = row
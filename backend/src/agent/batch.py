@@ -0,0 +1,172 @@
+# %% batch / bulk LLM jobs
+"""
+Runners for offline LLM jobs (e.g. the daily behaviour analysis) with the same two steps:
+
+    batch_id = await runner.submit(jobs)      # BatchJob(custom_id, messages, prompt_cache_key)
+    results = await runner.results(batch_id)  # custom_id -> answer dict, or error message (str)
+
+`OpenAIBatchRunner` uses the OpenAI Batch API, `LocalBatchRunner` runs the jobs right away through
+an answer coroutine (normal API calls, or a stand-in in tests). `Checkpoint` records which batches
+were submitted and which jobs are done, so an interrupted run can continue where it stopped.
+"""
+import asyncio
+import json
+import os
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import loguru
+from pydantic import BaseModel
+
+
+@dataclass
+class BatchJob:
+    custom_id: str
+    messages: list
+    prompt_cache_key: str
+
+
+class LocalBatchRunner:
+    """
+    Runs a "batch" right away through `answer(job) -> dict`, a coroutine doing normal API calls or
+    a stand-in for tests. Batches only live in memory: after a restart `results` returns None and
+    the caller has to submit the jobs again.
+    """
+
+    def __init__(self, answer, concurrency: int = 4):
+        self.answer = answer
+        self.concurrency = concurrency
+        self._batches: dict[str, list[BatchJob]] = {}
+
+    async def submit(self, jobs: list[BatchJob]) -> str:
+        batch_id = f"local-{uuid.uuid4().hex[:12]}"
+        self._batches[batch_id] = list(jobs)
+        return batch_id
+
+    async def results(self, batch_id: str) -> dict | None:
+        """custom_id -> answer dict, or the error message of a failed job (str)."""
+        jobs = self._batches.pop(batch_id, None)
+        if jobs is None:
+            return None
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(job):
+            async with semaphore:
+                try:
+                    return job.custom_id, await self.answer(job)
+                except Exception as error:
+                    return job.custom_id, f"{type(error).__name__}: {error}"
+
+        return dict(await asyncio.gather(*[run(job) for job in jobs]))
+
+
+class OpenAIBatchRunner:
+    """
+    OpenAI Batch API (half the price, results within 24h): one JSONL file of /v1/responses
+    requests with `response_format` as structured output per batch, polled until it is done.
+    """
+
+    FINAL_STATES = ("completed", "failed", "expired", "cancelled")
+
+    def __init__(self, client, model: str, response_format: type[BaseModel], poll_seconds: float = 60.0):
+        self.client = client
+        self.model = model
+        self.response_format = response_format
+        self.poll_seconds = poll_seconds
+
+    def _request(self, job: BatchJob) -> dict:
+        schema = {**self.response_format.schema(), "additionalProperties": False}
+        name = self.response_format.__name__
+        return {
+            "custom_id": job.custom_id,
+            "method": "POST",
+            "url": "/v1/responses",
+            "body": {
+                "model": self.model,
+                "input": job.messages,
+                "prompt_cache_key": job.prompt_cache_key,
+                "text": {"format": {"type": "json_schema", "name": name, "schema": schema, "strict": True}},
+            },
+        }
+
+    async def submit(self, jobs: list[BatchJob]) -> str:
+        lines = "".join(json.dumps(self._request(job)) + "\n" for job in jobs)
+        batch_file = await self.client.files.create(file=("batch.jsonl", lines.encode("utf-8")), purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=batch_file.id, endpoint="/v1/responses", completion_window="24h"
+        )
+        return batch.id
+
+    async def results(self, batch_id: str) -> dict | None:
+        batch = await self.client.batches.retrieve(batch_id)
+        while batch.status not in self.FINAL_STATES:
+            await asyncio.sleep(self.poll_seconds)
+            batch = await self.client.batches.retrieve(batch_id)
+
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id is None:
+                continue
+            content = await self.client.files.content(file_id)
+            for line in content.text.splitlines():
+                try:
+                    row = json.loads(line)
+                    custom_id = row["custom_id"]
+                except (KeyError, TypeError, ValueError) as error:
+                    # no custom id to report it for: the job counts as missing in the results
+                    loguru.logger.warning(f"Batch --- unreadable result line in {batch_id}: {error!r}")
+                    continue
+                results[custom_id] = self._parse(row)
+
+        if not results and batch.status != "completed":
+            # e.g. expired before any request ran -> the jobs are submitted again next time
+            loguru.logger.warning(f"Batch --- {batch_id} ended as `{batch.status}` without results")
+        return results
+
+    def _parse(self, row: dict):
+        """Answer dict of one result row, or the error message (str) for this job only."""
+        response = row.get("response") or {}
+        if row.get("error") or response.get("status_code") != 200:
+            return f"batch error: {row.get('error') or response.get('status_code')}"
+
+        try:
+            for item in response["body"].get("output", []):
+                if item.get("type") == "message":
+                    text = "".join(
+                        part.get("text", "") for part in item["content"] if part.get("type") == "output_text"
+                    )
+                    return self.response_format(**json.loads(text)).dict()
+        except (KeyError, TypeError, AttributeError, ValueError) as error:
+            # malformed body, invalid JSON or a schema mismatch (pydantic's ValidationError is a ValueError)
+            return f"batch error: {type(error).__name__}: {error}"
+        return "batch error: no message in the response"
+
+
+@dataclass
+class Checkpoint:
+    run_id: str
+    period_start: str
+    period_end: str
+    # batch id -> custom ids of its jobs, submitted but not stored yet
+    pending: dict = field(default_factory=dict)
+    done: list = field(default_factory=list)
+    failed: int = 0
+    finished: bool = False
+
+    @classmethod
+    def load(cls, path: Path | None) -> "Checkpoint | None":
+        if path is None or not Path(path).exists():
+            return None
+        with open(path) as f:
+            return cls(**json.load(f))
+
+    def save(self, path: Path | None):
+        if path is None:
+            return
+        # write + rename, an interruption never leaves a half written checkpoint
+        tmp_path = Path(f"{path}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(asdict(self), f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,202 @@
+# %% batch behaviour analysis of all users
+"""
+Offline pipeline behind `analyzer_user_behaviour`, meant to run once a day
+(`python -m src.agent.behaviour` from the backend folder, e.g. as a cron job):
+
+1. the requests of all users in the last `days` days (and their app usage, when given) are
+   aggregated with vectorised group-bys into one statistics row per user
+2. every active user gets an analysis prompt built from these statistics and the preferences
+3. the prompts go through a batch runner: `OpenAIBatchRunner` (Batch API, half the price, results
+   within 24h) or `LocalBatchRunner` (normal API calls with analytics priority, or any stand-in
+   answer function for tests)
+4. the answers are stored as one insight per user (user_insight table / user_insights.pkl), the
+   gatekeeper reads them with a cached lookup (helpers.get_user_insight)
+
+After every step the progress is written to a checkpoint file: an interrupted run picks up the
+batches it already submitted and the users that are not done yet instead of starting over.
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import decouple
+import loguru
+import pandas as pd
+
+from .batch import BatchJob, Checkpoint, LocalBatchRunner, OpenAIBatchRunner
+from .behaviour_stats import aggregate_behaviour, stats_to_dict, stats_to_prompt
+from .formats import UserInsightFormat
+from .helpers import (
+    DATA_DIR,
+    get_all_log_entries,
+    get_name,
+    get_user_preference_row,
+    llm,
+    save_user_insights,
+    send_simple_query,
+)
+from .prompt_layout import assemble_messages
+from .prompt_templates import UserPreferences
+from .prompts import BEHAVIOUR_ANALYZER_SYSTEM_PROMPT
+from .scheduler import ANALYTICS, priority
+
+BEHAVIOUR_MODEL = decouple.config("BEHAVIOUR_MODEL", default="gpt-5-mini")
+BEHAVIOUR_DAYS = decouple.config("BEHAVIOUR_DAYS", default=7, cast=int)
+BEHAVIOUR_BATCH_SIZE = decouple.config("BEHAVIOUR_BATCH_SIZE", default=200, cast=int)
+checkpoint_path = DATA_DIR / "behaviour_checkpoint.json"
+
+
+async def ask_llm(job: BatchJob) -> dict:
+    # answer function of the local runner: normal API calls behind the interactive traffic
+    with priority(ANALYTICS):
+        insight = await send_simple_query(
+            job.messages,
+            response_schema=UserInsightFormat,
+            prompt_cache_key=job.prompt_cache_key,
+            model=BEHAVIOUR_MODEL,
+        )
+    return insight.dict()
+
+
+async def build_job(user_id: str, stats: dict, days: int) -> BatchJob:
+    name = await get_name(user_id)
+    preferences = UserPreferences.from_row(await get_user_preference_row(user_id))
+
+    prompt = assemble_messages(
+        flow="behaviour",
+        variant=None,
+        static=[BEHAVIOUR_ANALYZER_SYSTEM_PROMPT],
+        user=[
+            f"""
+    The users name is: {name}
+
+    {preferences.to_text()}
+    """
+        ],
+        dynamic=[stats_to_prompt(stats, days)],
+        user_input="Analyse the behaviour of this user.",
+    )
+    return BatchJob(custom_id=user_id, messages=prompt.messages, prompt_cache_key=prompt.cache_key)
+
+
+async def run_behaviour_analysis(
+    runner,
+    days: int = BEHAVIOUR_DAYS,
+    batch_size: int = BEHAVIOUR_BATCH_SIZE,
+    checkpoint_file: Path | None = checkpoint_path,
+    user_ids: list[str] | None = None,
+    usage: pd.DataFrame | None = None,
+    now: datetime | None = None,
+) -> dict:
+    """
+    Analyses every user with requests in the last `days` days (or only `user_ids`) and stores the
+    insights. Returns user_id -> insight row of the users stored in this call.
+    """
+    now = (now or datetime.now()).replace(microsecond=0)
+    run_id = f"{now.date().isoformat()}:{days}d" + (f":{','.join(sorted(user_ids))}" if user_ids else "")
+
+    checkpoint = Checkpoint.load(checkpoint_file)
+    if checkpoint is None or checkpoint.run_id != run_id:
+        checkpoint = Checkpoint(
+            run_id=run_id, period_start=(now - timedelta(days=days)).isoformat(), period_end=now.isoformat()
+        )
+    elif checkpoint.finished:
+        loguru.logger.info(f"Behaviour --- run {run_id} is already finished")
+        return {}
+
+    # a resumed run keeps the window of its first start
+    period_start = datetime.fromisoformat(checkpoint.period_start)
+    period_end = datetime.fromisoformat(checkpoint.period_end)
+
+    entries = [entry for entry in await get_all_log_entries(since=period_start) if entry["date_time"] <= period_end]
+    if user_ids is not None:
+        entries = [entry for entry in entries if entry["user_id"] in user_ids]
+    stats = aggregate_behaviour(entries, usage)
+    user_stats = {user_id: stats_to_dict(row) for user_id, row in stats.iterrows()}
+
+    stored = {}
+    # users without an insight in this call, a finished run with failures is retried on the next call
+    checkpoint.failed = 0
+
+    async def collect(batch_id: str):
+        results = await runner.results(batch_id)
+        users = checkpoint.pending.pop(batch_id)
+        if results is None:
+            # the runner does not know the batch anymore (local runner after a restart)
+            checkpoint.save(checkpoint_file)
+            return False
+
+        rows = []
+        for user_id in users:
+            result = results.get(user_id, "missing in the batch results")
+            if isinstance(result, str) or user_id not in user_stats:
+                loguru.logger.warning(f"Behaviour --- no insight for user {user_id}: {result}")
+                checkpoint.failed += 1
+                continue
+            rows.append(
+                {
+                    "user_id": user_id,
+                    "generated_at": now,
+                    "period_start": period_start,
+                    "period_end": period_end,
+                    "summary": result["summary"],
+                    "patterns": list(result["patterns"]),
+                    "recommendation": result["recommendation"],
+                    "stats": user_stats[user_id],
+                }
+            )
+
+        await save_user_insights(rows)
+        stored.update({row["user_id"]: row for row in rows})
+        checkpoint.done.extend(row["user_id"] for row in rows)
+        checkpoint.save(checkpoint_file)
+        return True
+
+    # 1. batches submitted before an interruption
+    for batch_id in list(checkpoint.pending):
+        await collect(batch_id)
+
+    # 2. everybody else (including users of batches the runner lost), submitted before waiting
+    done = set(checkpoint.done)
+    remaining = [user_id for user_id in user_stats if user_id not in done]
+    for start in range(0, len(remaining), batch_size):
+        chunk = remaining[start : start + batch_size]
+        jobs = [await build_job(user_id, user_stats[user_id], days) for user_id in chunk]
+        batch_id = await runner.submit(jobs)
+        checkpoint.pending[batch_id] = chunk
+        checkpoint.save(checkpoint_file)
+
+    for batch_id in list(checkpoint.pending):
+        await collect(batch_id)
+
+    checkpoint.finished = checkpoint.failed == 0
+    checkpoint.save(checkpoint_file)
+    loguru.logger.info(
+        f"Behaviour --- run {run_id}: {len(stored)} insights stored, {checkpoint.failed} failed, "
+        f"{len(checkpoint.done)} users done in total"
+    )
+    return stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=BEHAVIOUR_DAYS)
+    parser.add_argument("--batch-size", type=int, default=BEHAVIOUR_BATCH_SIZE)
+    parser.add_argument("--runner", choices=["openai", "local"], default="openai")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint of today's run")
+    args = parser.parse_args()
+
+    if args.restart and checkpoint_path.exists():
+        checkpoint_path.unlink()
+
+    runner: OpenAIBatchRunner | LocalBatchRunner
+    if args.runner == "openai":
+        runner = OpenAIBatchRunner(llm.client, model=BEHAVIOUR_MODEL, response_format=UserInsightFormat)
+    else:
+        runner = LocalBatchRunner(ask_llm)
+    asyncio.run(run_behaviour_analysis(runner, days=args.days, batch_size=args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# %% per-user behaviour statistics for the behaviour analysis
+"""
+Vectorised aggregation of the request log (and app usage) of all users into one statistics row per
+user, and the prompt text built from it. Used by the daily batch run in behaviour.py.
+"""
+import numpy as np
+import pandas as pd
+
+from .decision_cache import normalize_query
+from .prompt_templates import TIME_FACTOR_LABELS
+
+# the four periods of the onboarding time factors: morning, work, evening, late evening
+TIME_BUCKETS = ["morning", "work", "evening", "late"]
+TOP_REASONS = 3
+
+
+def time_buckets(hours: np.ndarray) -> np.ndarray:
+    # 5-9 morning, 9-17 work, 17-22 evening, 22-5 late
+    return np.select(
+        [(hours >= 5) & (hours < 9), (hours >= 9) & (hours < 17), (hours >= 17) & (hours < 22)],
+        TIME_BUCKETS[:3],
+        default=TIME_BUCKETS[3],
+    )
+
+
+def aggregate_behaviour(entries: list[dict], usage: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    One row per user: requests, allows, denies, granted minutes, active days, requests per time
+    bucket, busiest hour, most frequent reasons and (with `usage`: user_id, date_time, app,
+    minutes) the average daily minutes per app.
+    """
+    if not entries:
+        return pd.DataFrame()
+
+    log_df = pd.DataFrame(entries, columns=["user_id", "query", "answer", "date_time"])
+    answers = pd.DataFrame([answer if isinstance(answer, dict) else {} for answer in log_df["answer"]])
+    allow = answers["allow"] if "allow" in answers else pd.Series(None, index=log_df.index)
+    granted = answers["time"] if "time" in answers else pd.Series(0, index=log_df.index)
+
+    date_time = pd.to_datetime(log_df["date_time"])
+    log_df = log_df.assign(
+        allow=(allow == True).astype(int),  # noqa: E712 (None for answers without a verdict)
+        deny=(allow == False).astype(int),  # noqa: E712
+        minutes=pd.to_numeric(granted, errors="coerce").fillna(0).astype(int).where(allow == True, 0),  # noqa: E712
+        day=date_time.dt.date,
+        hour=date_time.dt.hour,
+        bucket=time_buckets(date_time.dt.hour.to_numpy()),
+        reason=log_df["query"].map(normalize_query),
+    )
+
+    grouped = log_df.groupby("user_id")
+    stats = grouped.agg(
+        requests=("query", "size"),
+        allows=("allow", "sum"),
+        denies=("deny", "sum"),
+        minutes_granted=("minutes", "sum"),
+        active_days=("day", "nunique"),
+        first_request=("date_time", "min"),
+        last_request=("date_time", "max"),
+    )
+    stats["requests_per_day"] = stats["requests"] / stats["active_days"]
+
+    buckets = pd.crosstab(log_df["user_id"], log_df["bucket"]).reindex(columns=TIME_BUCKETS, fill_value=0)
+    stats = stats.join(buckets.add_prefix("requests_"))
+
+    hours = log_df.groupby(["user_id", "hour"]).size()
+    stats["busiest_hour"] = hours.groupby(level=0).idxmax().map(lambda index: index[1])
+
+    reasons = log_df[log_df["reason"] != ""].groupby(["user_id", "reason"]).size().sort_values(ascending=False)
+    top_reasons = reasons.groupby(level=0).head(TOP_REASONS)
+    stats["top_reasons"] = pd.Series(
+        {
+            user_id: [(reason, int(count)) for (_, reason), count in rows.items()]
+            for user_id, rows in top_reasons.groupby(level=0)
+        }
+    )
+    stats["top_reasons"] = stats["top_reasons"].apply(lambda value: value if isinstance(value, list) else [])
+
+    stats["usage"] = [{} for _ in range(len(stats))]
+    if usage is not None and not usage.empty:
+        usage = usage.assign(day=pd.to_datetime(usage["date_time"]).dt.date)
+        daily = usage.groupby(["user_id", "app", "day"])["minutes"].sum()
+        per_app = daily.groupby(level=["user_id", "app"]).mean().round(1)
+        usage_by_user = {
+            user_id: {app: float(minutes) for (_, app), minutes in rows.items()}
+            for user_id, rows in per_app.groupby(level=0)
+        }
+        stats["usage"] = [usage_by_user.get(user_id, {}) for user_id in stats.index]
+
+    return stats
+
+
+def stats_to_dict(row: pd.Series) -> dict:
+    """JSON friendly statistics of one user (stored next to the insight)."""
+    return {
+        "requests": int(row["requests"]),
+        "allows": int(row["allows"]),
+        "denies": int(row["denies"]),
+        "minutes_granted": int(row["minutes_granted"]),
+        "active_days": int(row["active_days"]),
+        "requests_per_day": round(float(row["requests_per_day"]), 1),
+        "requests_by_time": {bucket: int(row[f"requests_{bucket}"]) for bucket in TIME_BUCKETS},
+        "busiest_hour": int(row["busiest_hour"]),
+        "top_reasons": [[reason, count] for reason, count in row["top_reasons"]],
+        "usage_minutes_per_day": dict(row["usage"]),
+    }
+
+
+def stats_to_prompt(stats: dict, days: int) -> str:
+    bucket_labels = dict(zip(TIME_BUCKETS, TIME_FACTOR_LABELS))
+    by_time = "\n".join(
+        f"    - {bucket_labels[bucket]}: {count} requests" for bucket, count in stats["requests_by_time"].items()
+    )
+    reasons = "\n".join(f'    - "{reason}" ({count}x)' for reason, count in stats["top_reasons"]) or "    - none"
+    usage = (
+        "\n".join(f"    - {app}: {minutes} min per day" for app, minutes in stats["usage_minutes_per_day"].items())
+        or "    - not available"
+    )
+
+    return f"""
+    STATISTICS OF THE LAST {days} DAYS:
+    - {stats["requests"]} requests on {stats["active_days"]} days ({stats["requests_per_day"]} per active day)
+    - {stats["allows"]} allowed, {stats["denies"]} denied, {stats["minutes_granted"]} minutes granted in total
+    - most requests around {stats["busiest_hour"]}:00
+
+    Requests by time of day:
+{by_time}
+
+    Most frequent reasons:
+{reasons}
+
+    App usage:
+{usage}
+    """
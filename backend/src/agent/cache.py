@@ -0,0 +1,124 @@
+# %% in-process caches
+"""
+Small process-local caches for the agent helpers.
+
+`LRUCache` is a bounded mapping with hit/miss counters, also used by the per-user stores of the
+agent (decision cache, semantic index, ...) instead of their own OrderedDict bookkeeping.
+`FileBackedCache` additionally remembers (mtime, size) of the file its values were derived from
+and drops everything as soon as the file changes (e.g. another worker wrote a new user).
+"""
+import os
+import threading
+import typing
+from collections import OrderedDict
+from pathlib import Path
+
+
+class LRUCache:
+    def __init__(self, max_entries: int = 1024, on_evict=None):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be a positive integer")
+
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # called with (key, value) of every entry dropped for space, while the cache is locked
+        self._on_evict = on_evict
+
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, key) -> tuple[bool, typing.Any]:
+        """Returns (hit, value). A hit marks the key as most recently used."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def get_or_create(self, key, factory):
+        """Value of `key`, created with `factory()` (and counted as a miss) when it is not cached."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            value = self._entries[key] = factory()
+            self._evict()
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything if no key is given."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def values(self) -> list:
+        with self._lock:
+            return list(self._entries.values())
+
+    def __contains__(self, key) -> bool:
+        # no hit / miss, the key does not become more recently used
+        return key in self._entries
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self.evictions += 1
+            if self._on_evict is not None:
+                self._on_evict(evicted_key, evicted)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class FileBackedCache(LRUCache):
+    def __init__(self, path: str | Path | None, max_entries: int = 1024):
+        super().__init__(max_entries=max_entries)
+        # without a path (e.g. postgres backend) only the writers invalidate
+        self.path = Path(path) if path is not None else None
+        self.file_invalidations = 0
+        self._signature = self._file_signature()
+
+    def _file_signature(self):
+        if self.path is None:
+            return None
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def lookup(self, key) -> tuple[bool, typing.Any]:
+        signature = self._file_signature()
+        if signature != self._signature:
+            self.invalidate()
+            self._signature = signature
+            self.file_invalidations += 1
+        return super().lookup(key)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "file_invalidations": self.file_invalidations}
@@ -0,0 +1,175 @@
+# %% deadlines, hedged requests and a circuit breaker for LLM calls
+"""
+Tail latency of `/echo` and `/supervise` is dominated by the occasional very slow OpenAI response.
+`CallPolicy.run` wraps one logical LLM call of an endpoint:
+
+- deadline: the call fails with LLMTimeoutError after `deadline_seconds` (the caller answers with
+  a deterministic fallback instead)
+- hedging: when the first request is still running after the p95 latency of recent calls, an
+  identical second request is fired and the first result wins, the other one is cancelled
+- circuit breaker: after `failure_threshold` consecutive failures no calls are made for
+  `reset_seconds` (CircuitOpenError right away), then a single trial call decides whether to close
+"""
+import asyncio
+import time
+from collections import deque
+
+from .llm_client import LLMTimeoutError
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised when the circuit breaker is open and the call is not even tried.
+    """
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200):
+        self._latencies: deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self._latencies.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._latencies)
+
+    def percentile(self, p: float) -> float | None:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        if self.state != self.CLOSED and time.monotonic() - self.opened_at >= self.reset_seconds:
+            # let one trial call through (again, if the last trial never reported back)
+            self.state = self.HALF_OPEN
+            self.opened_at = time.monotonic()
+            return True
+        return self.state == self.CLOSED
+
+    def success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+
+    def failure(self):
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class CallPolicy:
+    def __init__(
+        self,
+        name: str,
+        deadline_seconds: float,
+        hedge: bool = True,
+        hedge_percentile: float = 0.95,
+        hedge_min_samples: int = 20,
+        default_hedge_delay: float = 3.0,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.name = name
+        self.deadline_seconds = deadline_seconds
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.default_hedge_delay = default_hedge_delay
+        self.breaker = breaker or CircuitBreaker()
+
+        self.latencies = LatencyTracker()
+        self.counters = {
+            "calls": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "deadline_exceeded": 0,
+            "failures": 0,
+            "short_circuited": 0,
+        }
+
+    def hedge_delay(self) -> float:
+        delay = self.latencies.percentile(self.hedge_percentile)
+        if delay is None or len(self.latencies) < self.hedge_min_samples:
+            return self.default_hedge_delay
+        return delay
+
+    async def run(self, request):
+        """Run `request()` (a coroutine factory) under deadline, hedging and circuit breaker."""
+        if not self.breaker.allow():
+            self.counters["short_circuited"] += 1
+            raise CircuitOpenError(f"{self.name}: circuit open after {self.breaker.consecutive_failures} failures")
+
+        self.counters["calls"] += 1
+        started_at = time.monotonic()
+        deadline = started_at + self.deadline_seconds
+
+        tasks = [asyncio.ensure_future(request())]
+        pending = set(tasks)
+        error = None
+        try:
+            if self.hedge:
+                done, pending = await asyncio.wait(pending, timeout=min(self.hedge_delay(), self.deadline_seconds))
+                if not done:
+                    self.counters["hedged"] += 1
+                    tasks.append(asyncio.ensure_future(request()))
+                    pending.add(tasks[-1])
+
+            while True:
+                # a finished task can be a failure, then the other one may still succeed
+                for task in tasks:
+                    if task.done() and not task.cancelled():
+                        if task.exception() is None:
+                            self.counters["hedge_wins"] += task is not tasks[0]
+                            self.latencies.add(time.monotonic() - started_at)
+                            self.breaker.success()
+                            return task.result()
+                        error = task.exception()
+
+                if not pending:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.counters["deadline_exceeded"] += 1
+                    error = LLMTimeoutError(f"{self.name}: no answer within the {self.deadline_seconds}s deadline")
+                    break
+                _, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # mark the exception of a lost hedge as retrieved
+                    task.exception()
+
+        self.counters["failures"] += 1
+        self.breaker.failure()
+        if error is None:
+            # every attempt was cancelled without a result
+            raise LLMTimeoutError(f"{self.name}: no answer, all attempts were cancelled")
+        raise error
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "deadline_seconds": self.deadline_seconds,
+            "hedge_delay_seconds": self.hedge_delay(),
+            "p50_seconds": self.latencies.percentile(0.5),
+            "p95_seconds": self.latencies.percentile(0.95),
+            "breaker": self.breaker.state,
+            "breaker_trips": self.breaker.trips,
+        }
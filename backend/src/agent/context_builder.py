@@ -0,0 +1,251 @@
+# %% token-budgeted request history for the gatekeeper prompt
+"""
+The gatekeeper used to get every request of the last 24 hours as CSV (full answer dicts included),
+so the prompt of a heavy user grew without bound over the day.
+
+`ContextBuilder` keeps the prompt history bounded:
+
+- the last `recent_entries` requests verbatim, one compact line each
+- everything older folded into a per-user `HistorySummary` (counts, granted minutes, recurring
+  reasons) that is updated incrementally: new entries are folded in, entries that left the time
+  window are subtracted again. The folded entries (one small record each) are the cursor, so
+  entries with the same timestamp are neither skipped nor counted twice
+- the history never exceeds `max_tokens`, recent lines that do not fit go into the summary as well
+
+Token counts use tiktoken when it is installed and a 4-characters-per-token estimate otherwise.
+"""
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from .cache import LRUCache
+from .decision_cache import normalize_query
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("o200k_base")
+except ImportError:  # optional, the estimate is good enough for budgeting
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def compact_entry(entry: dict, max_reply_chars: int = 80) -> str:
+    """'14:05 | allow 10 min | just 5 more minutes | reply: Sure, ...'"""
+    answer = entry.get("answer")
+    if isinstance(answer, dict) and "allow" in answer:
+        verdict = f"allow {answer.get('time') or 0} min" if answer["allow"] else "deny"
+        reply = str(answer.get("reply") or "")
+    else:
+        verdict, reply = "-", ""
+
+    if len(reply) > max_reply_chars:
+        reply = reply[: max_reply_chars - 3] + "..."
+
+    return f"{entry['date_time'].strftime('%H:%M')} | {verdict} | {entry['query']} | reply: {reply}"
+
+
+@dataclass(frozen=True)
+class FoldedEntry:
+    date_time: datetime
+    query: str
+    reason: str
+    # None when the entry has no answer
+    allow: bool | None
+    minutes: int
+
+    @classmethod
+    def from_entry(cls, entry: dict) -> "FoldedEntry":
+        answer = entry.get("answer")
+        allow, minutes = None, 0
+        if isinstance(answer, dict) and "allow" in answer:
+            allow = bool(answer["allow"])
+            minutes = int(answer.get("time") or 0) if allow else 0
+        return cls(
+            date_time=entry["date_time"],
+            query=entry["query"],
+            reason=normalize_query(entry["query"])[:60],
+            allow=allow,
+            minutes=minutes,
+        )
+
+    def matches(self, entry: dict) -> bool:
+        return self.date_time == entry["date_time"] and self.query == entry["query"]
+
+
+@dataclass
+class HistorySummary:
+    requests: int = 0
+    allows: int = 0
+    denies: int = 0
+    minutes_granted: int = 0
+    reasons: Counter = field(default_factory=Counter)
+    # every folded entry, oldest first: the cursor into the entry list and what `unfold` subtracts
+    folded: deque = field(default_factory=deque)
+
+    # distinct reasons kept per user, the rarest are dropped beyond that
+    MAX_REASONS = 64
+
+    @property
+    def first_time(self) -> datetime | None:
+        return self.folded[0].date_time if self.folded else None
+
+    def fold(self, entry: dict):
+        folded = FoldedEntry.from_entry(entry)
+        self.folded.append(folded)
+        self._apply(folded, 1)
+
+    def unfold(self):
+        """Subtract the oldest folded entry again (it left the time window)."""
+        self._apply(self.folded.popleft(), -1)
+
+    def preview(self, entry: dict) -> "HistorySummary":
+        """Copy with the newer `entry` folded in, for the prompt only (only the oldest folded entry is kept)."""
+        folded = FoldedEntry.from_entry(entry)
+        summary = HistorySummary(
+            requests=self.requests,
+            allows=self.allows,
+            denies=self.denies,
+            minutes_granted=self.minutes_granted,
+            reasons=Counter(self.reasons),
+            folded=deque([self.folded[0] if self.folded else folded]),
+        )
+        summary._apply(folded, 1)
+        return summary
+
+    def _apply(self, folded: FoldedEntry, sign: int):
+        self.requests += sign
+        if folded.allow is True:
+            self.allows += sign
+            self.minutes_granted += sign * folded.minutes
+        elif folded.allow is False:
+            self.denies += sign
+
+        if not folded.reason:
+            return
+        if sign > 0:
+            self.reasons[folded.reason] += 1
+            if len(self.reasons) > self.MAX_REASONS:
+                rarest, _ = self.reasons.most_common()[-1]
+                del self.reasons[rarest]
+        elif folded.reason in self.reasons:
+            # reasons dropped as the rarest are not counted anymore
+            self.reasons[folded.reason] -= 1
+            if self.reasons[folded.reason] <= 0:
+                del self.reasons[folded.reason]
+
+    def to_prompt(self, max_reasons: int = 3) -> str:
+        first_time = self.first_time
+        if not self.requests or first_time is None:
+            return ""
+
+        recurring = [f'"{reason}" ({count}x)' for reason, count in self.reasons.most_common(max_reasons) if count > 1]
+        text = (
+            f"Earlier requests (since {first_time.strftime('%H:%M')}): {self.requests} requests, "
+            f"{self.allows} allowed ({self.minutes_granted} minutes granted), {self.denies} denied."
+        )
+        if recurring:
+            text += f" Recurring reasons: {', '.join(recurring)}."
+        return text
+
+
+@dataclass
+class HistoryContext:
+    text: str
+    # tokens of the summary and of the verbatim recent lines
+    tokens: dict
+
+
+class ContextBuilder:
+    def __init__(self, max_tokens: int = 600, recent_entries: int = 8, max_users: int = 4096):
+        self.max_tokens = max_tokens
+        self.recent_entries = recent_entries
+        self.max_users = max_users
+
+        # user_id -> HistorySummary
+        self._summaries = LRUCache(max_users)
+        self._lock = threading.Lock()
+
+        self.counters = {"builds": 0, "rebuilds": 0, "folded": 0, "unfolded": 0, "truncated": 0}
+
+    def history(self, user_id: str, entries: list, time_delay: int = 24) -> HistoryContext:
+        """Prompt history of `entries` (the requests of the last `time_delay` hours, oldest first)."""
+        self.counters["builds"] += 1
+        if not entries:
+            text = f"Empty log - The user has not asked for anything in the last {time_delay} hours"
+            return HistoryContext(text=text, tokens={"summary": 0, "recent": count_tokens(text)})
+
+        older, recent = entries[: -self.recent_entries], entries[-self.recent_entries :]
+        summary = self._summary(user_id, older)
+
+        # newest lines first until the budget is used up, the rest is folded into the summary
+        lines = [compact_entry(entry) for entry in recent]
+        summary_text = summary.to_prompt()
+        kept = len(lines)
+        while kept and count_tokens(summary_text) + count_tokens("\n".join(lines[-kept:])) > self.max_tokens:
+            kept -= 1
+            summary = summary.preview(recent[len(recent) - kept - 1])
+            summary_text = summary.to_prompt()
+        if kept < len(lines):
+            self.counters["truncated"] += 1
+
+        recent_text = "\n".join(lines[len(lines) - kept :])
+        text = "\n".join(part for part in (summary_text, recent_text) if part)
+        return HistoryContext(
+            text=text, tokens={"summary": count_tokens(summary_text), "recent": count_tokens(recent_text)}
+        )
+
+    def _summary(self, user_id: str, older: list) -> HistorySummary:
+        with self._lock:
+            _, summary = self._summaries.lookup(user_id)
+            summary = summary or HistorySummary()
+
+            # entries that left the time window are subtracted again
+            while summary.folded and (not older or not summary.folded[0].matches(older[0])):
+                summary.unfold()
+                self.counters["unfolded"] += 1
+
+            # the folded entries have to be the start of `older`, otherwise (log deleted) start over
+            cursor = len(summary.folded)
+            if cursor > len(older) or (cursor and not summary.folded[-1].matches(older[cursor - 1])):
+                summary = HistorySummary()
+                cursor = 0
+                self.counters["rebuilds"] += 1
+
+            for entry in older[cursor:]:
+                summary.fold(entry)
+                self.counters["folded"] += 1
+
+            self._summaries.put(user_id, summary)
+            return summary
+
+    def stats(self) -> dict:
+        return {**self.counters, "users": len(self._summaries)}
+
+
+class PromptTokenStats:
+    """Tokens per prompt section (average and max), to see where prompt size comes from."""
+
+    def __init__(self):
+        self.prompts = 0
+        self.total: Counter = Counter()
+        self.max: dict[str, int] = {}
+
+    def record(self, sections: dict[str, int]):
+        self.prompts += 1
+        for section, tokens in sections.items():
+            self.total[section] += tokens
+            self.max[section] = max(self.max.get(section, 0), tokens)
+
+    def stats(self) -> dict:
+        return {
+            "prompts": self.prompts,
+            "avg": {section: total / self.prompts for section, total in self.total.items()} if self.prompts else {},
+            "max": dict(self.max),
+        }
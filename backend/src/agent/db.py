@@ -0,0 +1,84 @@
+# %% postgres backend of the agent helpers
+"""
+Postgres storage for users, preferences and the request log (AGENT_STORAGE_BACKEND=postgres).
+
+Only imported by helpers.py when the postgres backend is selected, so the pickle backend keeps
+working without the database settings.
+
+Run `python -m src.agent.db` from the backend folder to copy the existing pickles into the tables.
+"""
+import asyncio
+import contextlib
+import typing
+
+import pandas as pd
+from sqlalchemy.ext.asyncio import AsyncSession as SQLAlchemyAsyncSession
+
+from src.models.db.agent_user import AgentUser
+from src.models.db.request_log import RequestLog
+from src.models.db.user_preference import UserPreference
+from src.repository.database import async_db
+
+
+@contextlib.asynccontextmanager
+async def agent_session() -> typing.AsyncGenerator[SQLAlchemyAsyncSession, None]:
+    # one short lived session per helper call, so concurrent requests never share a session
+    async with async_db.async_session_factory() as session:
+        yield session
+
+
+async def import_pickles(users_path, preferences_path, log_path):
+    users_df = pd.read_pickle(users_path)
+    preferences_df = pd.read_pickle(preferences_path)
+    log_df = pd.read_pickle(log_path)
+    # request_log.user_id references agent_user, logs of unknown users are left out
+    known = log_df["user_id"].isin(users_df["id"])
+    skipped, log_df = int((~known).sum()), log_df[known]
+
+    async with agent_session() as session:
+        session.add_all(
+            [
+                AgentUser(id=row["id"], name=row["name"], surname=row["surname"], joined=row["joined"].to_pydatetime())
+                for row in users_df.to_dict("records")
+            ]
+        )
+        # users have to exist before their preferences (foreign key)
+        await session.flush()
+
+        session.add_all(
+            [
+                UserPreference(
+                    user_id=row["user_id"],
+                    date_time=pd.Timestamp(row["date_time"]).to_pydatetime(),
+                    preference=row["preference"],
+                    preferred_personality=row["preferred_personality"],
+                    selected_apps=list(row["selected_apps"]),
+                    time_factors=row["time_factors"] if isinstance(row.get("time_factors"), list) else None,
+                    target_minutes=int(row["target_minutes"]) if pd.notna(row.get("target_minutes")) else None,
+                )
+                for row in preferences_df.to_dict("records")
+            ]
+        )
+        session.add_all(
+            [
+                RequestLog(
+                    user_id=row["user_id"],
+                    query=row["query"],
+                    answer=row["answer"],
+                    date_time=pd.Timestamp(row["date_time"]).to_pydatetime(),
+                )
+                for row in log_df.to_dict("records")
+            ]
+        )
+        await session.commit()
+
+    print(
+        f"Imported {len(users_df)} users, {len(preferences_df)} preferences and {len(log_df)} log entries "
+        f"({skipped} log entries of unknown users skipped)"
+    )
+
+
+if __name__ == "__main__":
+    from .helpers import log_path, preferences_path, users_path
+
+    asyncio.run(import_pickles(users_path, preferences_path, log_path))
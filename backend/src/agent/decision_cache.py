@@ -0,0 +1,122 @@
+# %% exact-match cache of gatekeeper decisions
+"""
+TTL + LRU cache in front of the gatekeeper LLM call.
+
+Users send the same request ("just 5 more minutes") several times within minutes. A decision is
+reused when user, normalized query, personality and a coarse context bucket (usage minutes,
+requests today, time of day) are the same.
+
+GATEKEEPER_SYSTEM_PROMPT asks for variability, so a hit is only served with
+`reuse_probability`; otherwise the model is asked again and the new answer replaces the old.
+"""
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+from .cache import LRUCache
+
+
+def normalize_query(query: str) -> str:
+    """'Just 5 more   minutes!!' -> 'just 5 more minutes'"""
+    query = re.sub(r"[^\w\s]", " ", query.lower())
+    return " ".join(query.split())
+
+
+@dataclass(frozen=True)
+class DecisionKey:
+    user_id: str
+    query: str
+    personality: str | None
+    usage_bucket: int
+    requests_bucket: int
+    time_slot: int
+
+
+class DecisionCache:
+    def __init__(
+        self,
+        ttl_seconds: float = 600,
+        max_entries: int = 4096,
+        reuse_probability: float = 0.8,
+        usage_bucket_minutes: int = 15,
+        requests_bucket_size: int = 5,
+        time_slot_hours: int = 2,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.reuse_probability = reuse_probability
+        self.usage_bucket_minutes = usage_bucket_minutes
+        self.requests_bucket_size = requests_bucket_size
+        self.time_slot_hours = time_slot_hours
+
+        # DecisionKey -> (expires at, answer)
+        self._entries = LRUCache(max_entries, on_evict=lambda key, _: self._forget(key))
+        self._keys_by_user: dict[str, set[DecisionKey]] = {}
+        self._lock = threading.Lock()
+
+        self.counters = {"hits": 0, "misses": 0, "bypassed": 0, "expired": 0, "invalidations": 0}
+
+    def key(
+        self, user_id: str, query: str, personality: str | None, usage_minutes: int, requests_today: int, now
+    ) -> DecisionKey:
+        return DecisionKey(
+            user_id=user_id,
+            query=normalize_query(query),
+            personality=personality,
+            usage_bucket=usage_minutes // self.usage_bucket_minutes,
+            requests_bucket=requests_today // self.requests_bucket_size,
+            time_slot=now.hour // self.time_slot_hours,
+        )
+
+    def get(self, key: DecisionKey):
+        with self._lock:
+            hit, entry = self._entries.lookup(key)
+            if not hit:
+                self.counters["misses"] += 1
+                return None
+
+            expires_at, answer = entry
+            if expires_at < time.monotonic():
+                self._entries.invalidate(key)
+                self._forget(key)
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return None
+
+            # keep some variability: sometimes ask the model again even though we know an answer
+            if random.random() >= self.reuse_probability:
+                self.counters["bypassed"] += 1
+                return None
+
+            self.counters["hits"] += 1
+            return answer
+
+    def put(self, key: DecisionKey, answer):
+        with self._lock:
+            self._keys_by_user.setdefault(key.user_id, set()).add(key)
+            self._entries.put(key, (time.monotonic() + self.ttl_seconds, answer))
+
+    def invalidate_user(self, user_id: str):
+        """Drop every cached decision of a user."""
+        with self._lock:
+            for key in self._keys_by_user.pop(user_id, set()):
+                self._entries.invalidate(key)
+            self.counters["invalidations"] += 1
+
+    def _forget(self, key: DecisionKey):
+        user_keys = self._keys_by_user.get(key.user_id)
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._keys_by_user[key.user_id]
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"] + self.counters["bypassed"]
+        return {
+            **self.counters,
+            "evictions": self._entries.evictions,
+            "entries": len(self._entries),
+            "hit_rate": self.counters["hits"] / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,44 @@
+# %% response formats of the agents
+from pydantic import BaseModel, Field
+
+
+class BouncerAnswerFormat(BaseModel):
+    allow: bool
+    time: int
+    reply: str
+
+
+class TieredBouncerAnswerFormat(BouncerAnswerFormat):
+    # 0-1, how sure the small model is, low confidence escalates to the large model (see routing.py)
+    confidence: float = Field(description="How sure you are about this decision, from 0 (guess) to 1 (obvious)")
+
+    def to_answer(self) -> BouncerAnswerFormat:
+        return BouncerAnswerFormat(allow=self.allow, time=self.time, reply=self.reply)
+
+
+class GoalFeedbackFormat(BaseModel):
+    # Is the user currently acting in line with the stated goal?
+    on_track: bool
+
+    # Short textual verdict, e.g. "You are still on track", "You drifted off into explore-feed"
+    verdict: str
+
+    # 1–100 score of how well current behavior matches the goal
+    score: int
+
+    # Short, actionable feedback (1–3 sentences)
+    feedback: str
+
+    # Optional suggestion for the *next* concrete action (e.g. "close app", "go back to DMs", etc.)
+    next_step: str
+
+
+class UserInsightFormat(BaseModel):
+    # 1-2 sentences about the user's behaviour in the analysed days
+    summary: str
+
+    # at most 4 short, concrete patterns, most important first
+    patterns: list[str]
+
+    # how the gatekeeper should handle the next requests of this user
+    recommendation: str
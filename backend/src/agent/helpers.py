@@ -1,4 +1,5 @@
 # %% helper funcitons
+import fcntl
 import os
 import pandas as pd
 import pickle as pkl
@@ -6,34 +7,42 @@ import openai
 import uuid
 import io
 import json
+import decouple
 
 from pydantic import BaseModel
 from pathlib import Path
-from datetime import datetime, timedelta
-
-client = openai.OpenAI()
-
-
-class BouncerAnswerFormat(BaseModel):
-    allow: bool
-    time: int
-    reply: str
-
-class GoalFeedbackFormat(BaseModel):
-    # Is the user currently acting in line with the stated goal?
-    on_track: bool
-
-    # Short textual verdict, e.g. "You are still on track", "You drifted off into explore-feed"
-    verdict: str
-
-    # 1–100 score of how well current behavior matches the goal
-    score: int
-
-    # Short, actionable feedback (1–3 sentences)
-    feedback: str
-
-    # Optional suggestion for the *next* concrete action (e.g. "close app", "go back to DMs", etc.)
-    next_step: str
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+from .aggregates import DailyAggregate, DailyAggregates
+from .cache import FileBackedCache
+from .formats import BouncerAnswerFormat, GoalFeedbackFormat, TieredBouncerAnswerFormat
+from .llm_client import LLMClient, parse_float_limits, parse_model_limits
+from .log_store import LogStore
+from .prompt_templates import DEFAULT_TARGET_MINUTES, UserPreferences, format_time_factors_to_str
+from .scheduler import LLMScheduler
+from .semantic_index import SemanticDecisionIndex
+
+# interactive > voice > supervision > analytics, with a concurrency cap and a maximum queue wait per class
+llm_scheduler = LLMScheduler(
+    max_in_flight=decouple.config("LLM_SCHEDULER_MAX_IN_FLIGHT", default=16, cast=int),
+    class_limits=parse_model_limits(
+        decouple.config("LLM_SCHEDULER_CLASS_LIMITS", default="voice=8,supervision=4,analytics=2", cast=str)
+    ),
+    max_wait_seconds=parse_float_limits(
+        decouple.config("LLM_SCHEDULER_MAX_WAIT_SECONDS", default="supervision=10,analytics=120", cast=str)
+    ),
+)
+
+# async client, LLM calls never block the event loop
+# LLM_MAX_IN_FLIGHT applies to every model, LLM_MODEL_LIMITS overrides it per model ("gpt-5.1=8,gpt-4o=4")
+llm = LLMClient(
+    openai.AsyncOpenAI(),
+    max_in_flight=decouple.config("LLM_MAX_IN_FLIGHT", default=8, cast=int),
+    model_limits=parse_model_limits(decouple.config("LLM_MODEL_LIMITS", default="", cast=str)),
+    timeout=decouple.config("LLM_TIMEOUT_SECONDS", default=30.0, cast=float),
+    scheduler=llm_scheduler,
+)
 
 
 # ===================================================================
@@ -43,15 +52,173 @@ class GoalFeedbackFormat(BaseModel):
 # Directory of THIS file: backend/src/agent/helpers.py 
 # -> should result in the path of agent folder independant form machine and executing script
 BASE_DIR = Path(__file__).resolve().parent
+# folder of the local .pkl's and the request log (benchmarks/load_test.py points it to a copy)
+DATA_DIR = Path(decouple.config("AGENT_DATA_DIR", default="", cast=str) or BASE_DIR)
+
+# "pickle" (local files, default) or "postgres" (tables of the async engine, shared by all workers)
+STORAGE_BACKEND = decouple.config("AGENT_STORAGE_BACKEND", default="pickle", cast=str)
+USE_POSTGRES = STORAGE_BACKEND == "postgres"
+
+if USE_POSTGRES:
+    from src.repository.crud.agent_user import AgentUserCRUDRepository
+    from src.repository.crud.request_log import RequestLogCRUDRepository
+    from src.repository.crud.user_daily_aggregate import UserDailyAggregateCRUDRepository
+    from src.repository.crud.user_insight import UserInsightCRUDRepository
+    from src.repository.crud.user_preference import UserPreferenceCRUDRepository
+    from src.utilities.exceptions.database import EntityDoesNotExist
+
+    from .db import agent_session
 
 # load local .pkl's simulating database
-preferences_path = BASE_DIR / "user_preferences.pkl"
-users_path = BASE_DIR / "users.pkl"
-log_path = BASE_DIR / "log.pkl"
+preferences_path = DATA_DIR / "user_preferences.pkl"
+users_path = DATA_DIR / "users.pkl"
+log_path = DATA_DIR / "log.pkl"
+# one row per user, written by the behaviour analysis (behaviour.py)
+insights_path = DATA_DIR / "user_insights.pkl"
+
+# requests / allows / denies / minutes of today per user, kept up to date by the log store
+daily_aggregates = DailyAggregates()
+
+# the request log lives in an append-only store, log.pkl is only read once to import old entries
+# (only used without USE_POSTGRES)
+log_store: LogStore = (
+    None if USE_POSTGRES else LogStore(DATA_DIR / "log_segments", listeners=[daily_aggregates])  # type: ignore[assignment]
+)
+legacy_log_marker = DATA_DIR / "log_segments" / ".legacy_imported"
+
+# past decisions per user for semantic reuse in the gatekeeper, seeded from the log
+semantic_index = SemanticDecisionIndex(
+    max_entries_per_user=decouple.config("SEMANTIC_INDEX_MAX_ENTRIES_PER_USER", default=128, cast=int),
+    max_users=decouple.config("SEMANTIC_INDEX_MAX_USERS", default=1024, cast=int),
+)
+
+
+def import_legacy_log():
+    """
+    Import the old log.pkl into the log store, once. Called at app startup (see src/config/events.py),
+    every worker process calls it: a lock file lets one of them import, the others wait and then
+    find the marker, which is only written after a successful import.
+    """
+    if USE_POSTGRES or legacy_log_marker.exists() or not log_path.exists():
+        return
+
+    legacy_log_marker.parent.mkdir(parents=True, exist_ok=True)
+    with open(legacy_log_marker.with_suffix(".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if legacy_log_marker.exists():
+                return
+
+            if log_store.is_empty():
+                log_df = pd.read_pickle(log_path).sort_values(by="date_time")
+                log_store.extend([
+                    {
+                        "user_id": row["user_id"],
+                        "query": row["query"],
+                        "answer": row["answer"],
+                        "date_time": pd.Timestamp(row["date_time"]).to_pydatetime(),
+                    }
+                    for row in log_df.to_dict("records")
+                ])
+            legacy_log_marker.touch()
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+# user_id -> name and user_id -> latest preference row
+# dropped when the pickle changes on disk or when add_user / update_user_preferences write
+CACHE_MAX_USERS = decouple.config("AGENT_CACHE_MAX_USERS", default=1024, cast=int)
+name_cache = FileBackedCache(None if USE_POSTGRES else users_path, max_entries=CACHE_MAX_USERS)
+preferences_cache = FileBackedCache(None if USE_POSTGRES else preferences_path, max_entries=CACHE_MAX_USERS)
+insight_cache = FileBackedCache(None if USE_POSTGRES else insights_path, max_entries=CACHE_MAX_USERS)
+
+
+def get_cache_stats():
+    return {"names": name_cache.stats(), "preferences": preferences_cache.stats(), "insights": insight_cache.stats()}
+
+
+def log_entries_to_csv(entries):
+    return pd.DataFrame(entries, columns=["user_id", "query", "answer", "date_time"]).to_csv(index=False)
+
+def format_user_log(entries, time_delay):
+    if not entries:
+        return f"Empty log - The user has not asked for anything in the last {time_delay} hours"
+    else:
+        return log_entries_to_csv(entries)
+
+def format_last_user_log(last_entry):
+    if last_entry is None:
+        return "Empty log - The user has not asked for anything yet"
+    else:
+        return json.dumps(last_entry, default=str)
+
+def format_user_insight(insight):
+    if insight is None:
+        return ""
+    patterns = "\n".join(f"    - {pattern}" for pattern in insight["patterns"])
+    return f"""
+    What we learned about the user in the last days:
+    {insight["summary"]}
+{patterns}
+    Recommendation: {insight["recommendation"]}
+    """
+
+def log_row_to_dict(row):
+    return {"user_id": row.user_id, "query": row.query, "answer": row.answer, "date_time": row.date_time}
+
+INSIGHT_COLUMNS = ["user_id", "generated_at", "period_start", "period_end", "summary", "patterns", "recommendation", "stats"]
 
 # getter >>>>>>>>>>>>>>>>>>>>>>>>>>
 
-def get_user_preferences(user_id):
+async def get_user_preferences(user_id):
+    latest = await get_user_preference_row(user_id)
+
+    if latest is None:
+        return None
+
+    # Return a tuple (preference, preferred_personality, selected_apps)
+    return latest["preference"], latest["preferred_personality"], latest["selected_apps"]
+
+async def get_user_preference_row(user_id):
+    # newest preference row of a user as dict (also holds the structured fields like time_factors)
+    hit, cached = preferences_cache.lookup(user_id)
+    if hit:
+        return cached
+
+    latest = await load_user_preferences(user_id)
+    preferences_cache.put(user_id, latest)
+
+    return latest
+
+def preference_row(preference, preferred_personality, selected_apps, time_factors, target_minutes=None):
+    # rows written before time_factors / target_minutes existed have NaN / None there
+    if not isinstance(time_factors, (list, tuple)):
+        time_factors = None
+    if target_minutes is None or pd.isna(target_minutes):
+        target_minutes = None
+
+    return {
+        "preference": preference,
+        "preferred_personality": preferred_personality,
+        "selected_apps": list(selected_apps),
+        "time_factors": list(time_factors) if time_factors is not None else None,
+        "target_minutes": int(target_minutes) if target_minutes is not None else None,
+    }
+
+async def load_user_preferences(user_id):
+
+    if USE_POSTGRES:
+        async with agent_session() as session:
+            try:
+                latest = await UserPreferenceCRUDRepository(async_session=session).read_latest_preference_by_user_id(
+                    user_id=user_id
+                )
+            except EntityDoesNotExist:
+                return None
+        return preference_row(
+            latest.preference, latest.preferred_personality, latest.selected_apps, latest.time_factors,
+            latest.target_minutes,
+        )
 
     preferences_df = pd.read_pickle(preferences_path)
 
@@ -71,18 +238,31 @@ def get_user_preferences(user_id):
     
     latest = user_entries.iloc[0]
     
-    # Return a tuple (preference, preferred_personality)
-    return latest["preference"], latest["preferred_personality"], latest['selected_apps']
+    return preference_row(
+        latest["preference"], latest["preferred_personality"], latest["selected_apps"], latest.get("time_factors"),
+        latest.get("target_minutes"),
+    )
 
-def get_name(id):
-    users_df = pd.read_pickle(users_path)
-    # Filter entries for this user
-    user_entry = users_df[users_df["id"] == id].iloc[0]
+async def get_name(id):
+    hit, cached = name_cache.lookup(id)
+    if hit:
+        return cached
+
+    if USE_POSTGRES:
+        async with agent_session() as session:
+            db_user = await AgentUserCRUDRepository(async_session=session).read_user_by_id(id=id)
+        name = db_user.name
+    else:
+        users_df = pd.read_pickle(users_path)
+        # Filter entries for this user
+        user_entry = users_df[users_df["id"] == id].iloc[0]
+        name = user_entry["name"]
 
-    return user_entry["name"]
+    name_cache.put(id, name)
 
-def get_user_log(user_id: str, time_delay: int):
-    log_df = pd.read_pickle(log_path)
+    return name
+
+async def get_user_log(user_id: str, time_delay: int):
     # the previous user requests and answers from the user to the agent
     # All request during the last *time_delay** hours (should be positve int)
 
@@ -93,182 +273,372 @@ def get_user_log(user_id: str, time_delay: int):
     # Compute time window
     cutoff = datetime.now() - timedelta(hours=time_delay)
 
-    # Filter logs
-    filtered_df = log_df[
-        (log_df['user_id'] == user_id) &
-        (log_df['date_time'] >= cutoff)
-    ].sort_values(by="date_time")
-
-    if filtered_df.empty:
-        return f"Empty log - The user has not asked for anything in the last {time_delay} hours"
+    if USE_POSTGRES:
+        async with agent_session() as session:
+            rows = await RequestLogCRUDRepository(async_session=session).read_logs_by_user_id(
+                user_id=user_id, since=cutoff
+            )
+        entries = [log_row_to_dict(row) for row in rows]
     else:
-        return filtered_df.to_csv(index=False)
-
-def get_last_user_log(user_id):
-    log_df = pd.read_pickle(log_path)
-    # Filter logs
-    filtered_df = log_df[
-        (log_df['user_id'] == user_id)
-    ].sort_values(by="date_time", ascending=False)
-
-    if filtered_df.empty:
-        return f"Empty log - The user has not asked for anything in the last {time_delay} hours"
+        # only this user's entries inside the window are read from disk
+        entries = log_store.entries(user_id, since=cutoff)
+
+    return format_user_log(entries, time_delay)
+
+async def get_recent_user_log_entries(user_id, limit: int):
+    # newest `limit` requests of a user as dicts, oldest first
+    if USE_POSTGRES:
+        async with agent_session() as session:
+            rows = await RequestLogCRUDRepository(async_session=session).read_recent_logs_by_user_id(
+                user_id=user_id, limit=limit
+            )
+        return [log_row_to_dict(row) for row in rows]
+
+    return log_store.tail(user_id, limit)
+
+async def get_last_user_log(user_id):
+    if USE_POSTGRES:
+        async with agent_session() as session:
+            try:
+                row = await RequestLogCRUDRepository(async_session=session).read_last_log_by_user_id(user_id=user_id)
+                last_entry = log_row_to_dict(row)
+            except EntityDoesNotExist:
+                last_entry = None
     else:
-        return str(filtered_df.iloc[0].to_json(index=False))
-
-def get_request_number(user_id):
-    log_df = pd.read_pickle(log_path)
-    # Ensure your column is datetime type
-    log_df['date_time'] = pd.to_datetime(log_df['date_time'])
-
-    # Today's date
-    today = datetime.today().date()
-
-    filtered_df = log_df[
-        (log_df['user_id'] == user_id) &
-        (log_df['date_time'].dt.date == today)
-    ]
-
-    return filtered_df.shape[0]
-
-
-
-
-# setter >>>>>>>>>>>>>>>>>>
-def update_log(user_id, query, answer):
-    log_df = pd.read_pickle(log_path)    # Create timestamp (seconds only)
-
-    date_time = datetime.now().replace(microsecond=0)
-
-    # Create a new row as a DataFrame for safe concatenation
-    new_entry = pd.DataFrame([{
-        "user_id": user_id,
-        "query": query,
-        "answer": answer,
-        "date_time": date_time,
-    }])
-
-    # Append using concat (recommended; .append() is deprecated)
-    log_df = pd.concat([log_df, new_entry], ignore_index=True)
-
-    log_df.to_pickle(log_path)
-
-def format_time_factors_to_str(factors):
-    times = [
-        "In the morning hours after waking up",
-        "During work hours",
-        "After work and in the evening",
-        "During the late evening before sleep"
-    ]
-
-    timing_pref_statements = []
-
-    for i, factor in enumerate(factors):
-        time = times[i]
-
-        match factor:
-            case 0 | 1 | 2 | 3:
-                # Factor too low → skip
-                continue
+        last_entry = log_store.last(user_id)
+
+    return format_last_user_log(last_entry)
+
+async def get_all_log_entries(since: datetime):
+    # requests of all users since `since` (batch jobs like the behaviour analysis)
+    if USE_POSTGRES:
+        async with agent_session() as session:
+            rows = await RequestLogCRUDRepository(async_session=session).read_logs_since(since=since)
+        return [log_row_to_dict(row) for row in rows]
+
+    return log_store.all_entries(since=since)
+
+async def get_user_insight(user_id):
+    # newest behaviour insight of a user as dict (or None), cached, read on every gatekeeper request
+    hit, cached = insight_cache.lookup(user_id)
+    if hit:
+        return cached
+
+    if USE_POSTGRES:
+        async with agent_session() as session:
+            try:
+                row = await UserInsightCRUDRepository(async_session=session).read_insight_by_user_id(user_id=user_id)
+                insight = {column: getattr(row, column) for column in INSIGHT_COLUMNS}
+            except EntityDoesNotExist:
+                insight = None
+    elif insights_path.exists():
+        insights_df = pd.read_pickle(insights_path)
+        user_rows = insights_df[insights_df["user_id"] == user_id]
+        insight = user_rows.iloc[-1].to_dict() if not user_rows.empty else None
+    else:
+        insight = None
 
-            case 4 | 5 | 6:
-                timing_pref_statements.append(
-                    f"{time}: The user wants to reduce their usage during this period."
-                )
+    insight_cache.put(user_id, insight)
 
-            case 7 | 8:
-                timing_pref_statements.append(
-                    f"{time}: The user should only use the apps for a good or meaningful reason."
-                )
+    return insight
 
-            case 9 | 10:
-                timing_pref_statements.append(
-                    f"{time}: Usage should generally not be allowed at this time. Only Emergencies"
+async def get_todays_aggregate(user_id) -> DailyAggregate:
+    # O(1): one row per user and day, updated by update_log
+    if USE_POSTGRES:
+        today = datetime.today().date()
+        async with agent_session() as session:
+            try:
+                row = await UserDailyAggregateCRUDRepository(async_session=session).read_aggregate(
+                    user_id=user_id, day=today
                 )
-
-            case _:
-                # Ignore invalid values
-                continue
-
-    if timing_pref_statements:
-        "\n".join(["Additionally the user has whishes for these specific times:"] + timing_pref_statements)
+            except EntityDoesNotExist:
+                return DailyAggregate(day=today)
+        return DailyAggregate(
+            day=row.day,
+            requests=row.requests,
+            allows=row.allows,
+            denies=row.denies,
+            minutes_granted=row.minutes_granted,
+            last_decision_time=row.last_decision_time,
+        )
+
+    # pick up entries other workers appended
+    log_store.refresh()
+    return daily_aggregates.get(user_id)
+
+async def get_request_number(user_id):
+    # Today's requests, straight from the daily aggregate
+    return (await get_todays_aggregate(user_id)).requests
+
+
+
+# everything the agents need about a user >>>>>>>>>>>>>>>>>>
+
+@dataclass
+class UserContext:
+    user_id: str
+    name: str
+    preference: str | None
+    preferred_personality: str | None
+    selected_apps: list = field(default_factory=list)
+    # onboarding factors (0-10) for morning, work time, evening and before bed, None for old users
+    time_factors: list | None = None
+    # requests of the last `time_delay` hours, oldest first
+    log_entries: list = field(default_factory=list)
+    last_log_entry: dict | None = None
+    # todays requests / allows / denies / granted minutes
+    today: DailyAggregate = field(default_factory=lambda: DailyAggregate(day=date.today()))
+    time_delay: int = 24
+    # structured preferences (prompt fragments and policy rules are built from these)
+    preferences: UserPreferences = field(default_factory=lambda: UserPreferences.from_row(None))
+    # newest result of the behaviour analysis (behaviour.py), None before the first run
+    insight: dict | None = None
+
+    @property
+    def request_count(self):
+        return self.today.requests
+
+    @property
+    def user_log(self):
+        return format_user_log(self.log_entries, self.time_delay)
+
+    @property
+    def last_user_log(self):
+        return format_last_user_log(self.last_log_entry)
+
+    @property
+    def insight_text(self):
+        return format_user_insight(self.insight)
+
+async def load_user_context(user_id: str, window: int = 24) -> UserContext:
+    # name, latest preferences, windowed log, last entry and todays aggregate
+    # with at most one read per backing store (names and preferences are usually cache hits)
+    if window <= 0:
+        raise ValueError("window must be a positive integer")
+
+    cutoff = datetime.now() - timedelta(hours=window)
+
+    name = await get_name(user_id)
+    preferences = await get_user_preference_row(user_id) or preference_row(None, None, [], None, None)
+
+    if USE_POSTGRES:
+        async with agent_session() as session:
+            log_repo = RequestLogCRUDRepository(async_session=session)
+            rows = await log_repo.read_logs_by_user_id(user_id=user_id, since=cutoff)
+            entries = [log_row_to_dict(row) for row in rows]
+
+            if entries:
+                last_entry = entries[-1]
+            else:
+                try:
+                    last_entry = log_row_to_dict(await log_repo.read_last_log_by_user_id(user_id=user_id))
+                except EntityDoesNotExist:
+                    last_entry = None
     else:
-        return ""
-
-    return timing_pref_statements
+        entries, last_entry, _ = log_store.user_view(user_id, since=cutoff, count_since=None)
+
+    today = await get_todays_aggregate(user_id)
+    insight = await get_user_insight(user_id)
+
+    return UserContext(
+        user_id=user_id,
+        name=name,
+        preference=preferences["preference"],
+        preferred_personality=preferences["preferred_personality"],
+        selected_apps=preferences["selected_apps"],
+        time_factors=preferences["time_factors"],
+        log_entries=entries,
+        last_log_entry=last_entry,
+        today=today,
+        time_delay=window,
+        preferences=UserPreferences.from_row(preferences),
+        insight=insight,
+    )
 
 
-def add_user(onboarding_config):
-    preferences_df = pd.read_pickle(preferences_path)
-    users_df = pd.read_pickle(users_path)
+# setter >>>>>>>>>>>>>>>>>>
+async def update_log(user_id, query, answer):
+    # Create timestamp (seconds only)
+    date_time = datetime.now().replace(microsecond=0)
 
+    if USE_POSTGRES:
+        # log row and daily aggregate in one transaction, they never disagree
+        async with agent_session() as session:
+            await RequestLogCRUDRepository(async_session=session).create_log(
+                user_id=user_id, query=query, answer=answer, date_time=date_time, commit=False
+            )
+            await UserDailyAggregateCRUDRepository(async_session=session).upsert_decision(
+                user_id=user_id, answer=answer, date_time=date_time, commit=False
+            )
+            await session.commit()
+        return
+
+    # O(1) append, the other entries are never touched (the daily aggregate is updated by the store)
+    log_store.append(user_id, query, answer, date_time)
+
+async def add_user(onboarding_config):
     # create a new row in users and user_preferences
     id = str(uuid.uuid4())
     name = onboarding_config['name']
     surname = onboarding_config['surname']
     date_time = datetime.now().replace(microsecond=0)
 
-    # define the new row
-    new_user = pd.DataFrame([{
-        'id': id, 
-        'name': name, 
-        'surname': surname, 
-        'joined': date_time
-    }])
-
-    # Append using concat adn save(recommended; .append() is deprecated)
-    users_df = pd.concat([users_df, new_user], ignore_index=True)
-    users_df.to_pickle(users_path)
-
-    # Now the preferences:
+    # Now the preferences (stored as data, the prompt text is compiled from it, see prompt_templates.py)
     apps_list = onboarding_config['apps']
-    apps = str(apps_list).strip("[]")
     morning_factor = onboarding_config['morning_factor']
     worktime_factor = onboarding_config['worktime_factor']
     evening_factor = onboarding_config['evening_factor']
     before_bed_factor = onboarding_config['before_bed_factor']
+    target_minutes = int(onboarding_config.get('target_minutes') or DEFAULT_TARGET_MINUTES)
         
     factors = [morning_factor, worktime_factor,evening_factor, before_bed_factor]
 
-    timing_preference = format_time_factors_to_str(factors)
-
+    personality = "chill"
 
-    preference = f"""
-    The user want to restrict his usage on the following app: {apps}
+    preference = UserPreferences(
+        apps=tuple(apps_list),
+        time_factors=tuple(factors),
+        personality=personality,
+        target_minutes=target_minutes,
+    ).to_text()
+
+    if USE_POSTGRES:
+        # user and first preference in one transaction, never a user without preferences
+        async with agent_session() as session:
+            await AgentUserCRUDRepository(async_session=session).create_user(
+                id=id, name=name, surname=surname, joined=date_time, commit=False
+            )
+            await UserPreferenceCRUDRepository(async_session=session).create_preference(
+                user_id=id,
+                date_time=date_time,
+                preference=preference,
+                preferred_personality=personality,
+                selected_apps=apps_list,
+                time_factors=factors,
+                target_minutes=target_minutes,
+                commit=False,
+            )
+            await session.commit()
+
+        name_cache.invalidate(id)
+        preferences_cache.invalidate(id)
+        return id
 
-    His longterm goal is to achieve a constant combined screentime of these apps at around 2 hours.
+    users_df = pd.read_pickle(users_path)
 
-    {timing_preference}
+    # define the new row
+    new_user = pd.DataFrame([{
+        'id': id, 
+        'name': name, 
+        'surname': surname, 
+        'joined': date_time
+    }])
 
+    # Append using concat adn save(recommended; .append() is deprecated)
+    users_df = pd.concat([users_df, new_user], ignore_index=True)
+    users_df.to_pickle(users_path)
 
-    """
+    name_cache.invalidate(id)
 
-    personality = "chill"
+    await save_user_preference(id, date_time, preference, personality, apps_list, factors, target_minutes)
 
-    new_preference = pd.DataFrame([{
-        "date_time": date_time,
-        "user_id": id,
-        "preference": preference,
-        "preferred_personality": personality,
-        "selected_apps": apps_list
-    }])
+    return id
 
-    # append to the pkl
-    preferences_df = pd.concat([preferences_df, new_preference], ignore_index=True)
-    preferences_df.to_pickle(preferences_path)
+async def save_user_preference(
+    user_id, date_time, preference, personality, apps_list, time_factors=None, target_minutes=None
+):
+    if USE_POSTGRES:
+        async with agent_session() as session:
+            await UserPreferenceCRUDRepository(async_session=session).create_preference(
+                user_id=user_id,
+                date_time=date_time,
+                preference=preference,
+                preferred_personality=personality,
+                selected_apps=apps_list,
+                time_factors=time_factors,
+                target_minutes=target_minutes,
+            )
+    else:
+        preferences_df = pd.read_pickle(preferences_path)
+
+        new_preference = pd.DataFrame([{
+            "date_time": date_time,
+            "user_id": user_id,
+            "preference": preference,
+            "preferred_personality": personality,
+            "selected_apps": apps_list,
+            "time_factors": time_factors,
+            "target_minutes": target_minutes,
+        }])
+
+        # append to the pkl
+        preferences_df = pd.concat([preferences_df, new_preference], ignore_index=True)
+        preferences_df.to_pickle(preferences_path)
+
+    preferences_cache.invalidate(user_id)
+
+async def update_user_preferences(user_id, preference=None, preferred_personality=None, selected_apps=None):
+    # a new row is stored, the newest row of a user is the one that counts
+    current = await load_user_preferences(user_id)
+    if current is None:
+        raise ValueError(f"User {user_id} has no preferences yet")
 
-    return id
+    date_time = datetime.now().replace(microsecond=0)
 
-def update_user_preferences():
-    pass
+    personality = preferred_personality if preferred_personality is not None else current["preferred_personality"]
+    apps_list = selected_apps if selected_apps is not None else current["selected_apps"]
+
+    if preference is None:
+        # structured preferences -> the stored text follows the data
+        updated = UserPreferences.from_row({**current, "preferred_personality": personality, "selected_apps": apps_list})
+        preference = updated.to_text()
+
+    await save_user_preference(
+        user_id,
+        date_time,
+        preference,
+        personality,
+        apps_list,
+        current["time_factors"],
+        current["target_minutes"],
+    )
 
-def delete_user_logs(user_id):
-    log_df = pd.read_pickle(log_path)
-    
-    # Keep only rows where user_id does NOT match
-    log_df = log_df[log_df['user_id'] != user_id].reset_index(drop=True)
+async def save_user_insights(insights):
+    # insight rows (INSIGHT_COLUMNS) of several users at once, an existing row of a user is replaced
+    if not insights:
+        return
 
-    log_df.to_pickle(log_path)
+    if USE_POSTGRES:
+        async with agent_session() as session:
+            await UserInsightCRUDRepository(async_session=session).upsert_insights(insights)
+    else:
+        new_df = pd.DataFrame(insights, columns=INSIGHT_COLUMNS)
+        if insights_path.exists():
+            insights_df = pd.read_pickle(insights_path)
+            insights_df = insights_df[~insights_df["user_id"].isin(new_df["user_id"])]
+            new_df = pd.concat([insights_df, new_df], ignore_index=True)
+        new_df.to_pickle(insights_path)
+
+    for insight in insights:
+        insight_cache.invalidate(insight["user_id"])
+
+async def delete_user_logs(user_id):
+    # the index would otherwise keep reusing the deleted decisions
+    semantic_index.drop_user(user_id)
+
+    if USE_POSTGRES:
+        async with agent_session() as session:
+            await RequestLogCRUDRepository(async_session=session).delete_logs_by_user_id(
+                user_id=user_id, commit=False
+            )
+            await UserDailyAggregateCRUDRepository(async_session=session).delete_aggregates_by_user_id(
+                user_id=user_id, commit=False
+            )
+            await session.commit()
+        return
+
+    # appends a tombstone, the user's entries disappear from the index right away
+    log_store.delete_user(user_id)
 
 
 # ===================================================================
@@ -276,23 +646,39 @@ def delete_user_logs(user_id):
 # ===================================================================
 
 
-def send_simple_query(messages, response_schema):
+async def send_simple_query(messages, response_schema, prompt_cache_key=None, model="gpt-5.1"):
     
-    response = client.responses.parse(
-        model="gpt-5.1",   
+    response = await llm.parse(
+        model=model,   
         input=messages,
         text_format=response_schema, 
+        prompt_cache_key=prompt_cache_key,
     )
 
     return response.output_parsed
 
 
+async def stream_simple_query(messages, response_schema, prompt_cache_key=None, model="gpt-5.1", timeout=None):
+    """
+    Streaming variant of `send_simple_query`.
+    Yields ("delta", text) while the JSON answer is generated and ("final", parsed answer) at the end.
+    """
+    async for item in llm.stream(
+        model=model,
+        input=messages,
+        text_format=response_schema,
+        prompt_cache_key=prompt_cache_key,
+        timeout=timeout,
+    ):
+        yield item
+
+
 
-def transcribe_voice(audio_bytes: bytes):
+async def transcribe_voice(audio_bytes: bytes):
     audio_buffer = io.BytesIO(audio_bytes)
     audio_buffer.name = "audio.m4a"   # Whisper requires a filename
 
-    transcript = client.audio.transcriptions.create(
+    transcript = await llm.transcribe(
         model="whisper-1",
         file=audio_buffer,
         language="en"
@@ -300,10 +686,11 @@ def transcribe_voice(audio_bytes: bytes):
 
     return transcript.text
 
-def ask_with_image(messages):
-    response = client.responses.create(
+async def ask_with_image(messages, prompt_cache_key=None):
+    response = await llm.create(
         model="gpt-4o",
         input=messages,
+        prompt_cache_key=prompt_cache_key,
     )
 
     return json.loads(response.output[0].content[0].text)
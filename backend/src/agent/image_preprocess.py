@@ -0,0 +1,206 @@
+# %% downscaling / re-encoding of screenshots before the vision call
+"""
+The app sends full resolution PNG screenshots (1080x2400 and more). The vision model scales them
+down anyway, but we pay for the upload, the image tokens and the latency of the full frame.
+
+Before the vision call a screenshot is
+
+- cropped by SCREENSHOT_CROP_TOP / SCREENSHOT_CROP_BOTTOM (share of the height, status and
+  navigation bar, off by default)
+- resized so its longer edge is at most SCREENSHOT_MAX_EDGE pixels
+- encoded as SCREENSHOT_FORMAT (jpeg / webp / png) with SCREENSHOT_QUALITY
+
+Decoding, resizing and encoding run in a process pool (SCREENSHOT_WORKERS processes), so the CPU
+work never blocks the event loop. Spilled frames (see screenshots.py) are read by the worker from
+their file. The original is kept when Pillow is not installed, when the result is not smaller or
+when the worker fails.
+
+Bytes and estimated image tokens before / after are logged per call and summed up in `stats()`.
+"""
+import asyncio
+import base64
+import io
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from pathlib import Path
+
+import decouple
+import loguru
+
+from .screenshots import Screenshot
+
+try:
+    from PIL import Image
+except ImportError:  # optional, screenshots are sent as they are
+    Image = None  # type: ignore[assignment]
+
+SCREENSHOT_PREPROCESS = decouple.config("SCREENSHOT_PREPROCESS", default=True, cast=bool)
+SCREENSHOT_MAX_EDGE = decouple.config("SCREENSHOT_MAX_EDGE", default=1024, cast=int)
+SCREENSHOT_FORMAT = decouple.config("SCREENSHOT_FORMAT", default="jpeg")
+SCREENSHOT_QUALITY = decouple.config("SCREENSHOT_QUALITY", default=75, cast=int)
+SCREENSHOT_CROP_TOP = decouple.config("SCREENSHOT_CROP_TOP", default=0.0, cast=float)
+SCREENSHOT_CROP_BOTTOM = decouple.config("SCREENSHOT_CROP_BOTTOM", default=0.0, cast=float)
+SCREENSHOT_WORKERS = decouple.config("SCREENSHOT_WORKERS", default=2, cast=int)
+
+MEDIA_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp", "png": "image/png"}
+
+
+def vision_tokens(width: int, height: int) -> int:
+    """Image tokens of a high detail input (fit into 2048x2048, shorter side 768, 512px tiles)."""
+    scale = min(1.0, 2048 / max(width, height))
+    fitted_width, fitted_height = width * scale, height * scale
+    scale = min(1.0, 768 / min(fitted_width, fitted_height))
+    fitted_width, fitted_height = fitted_width * scale, fitted_height * scale
+    tiles = -(-int(fitted_width) // 512) * -(-int(fitted_height) // 512)
+    return 85 + 170 * tiles
+
+
+@dataclass
+class PreprocessOptions:
+    max_edge: int = SCREENSHOT_MAX_EDGE
+    format: str = SCREENSHOT_FORMAT
+    quality: int = SCREENSHOT_QUALITY
+    crop_top: float = SCREENSHOT_CROP_TOP
+    crop_bottom: float = SCREENSHOT_CROP_BOTTOM
+
+
+@dataclass
+class PreprocessResult:
+    # base64 text of the new image
+    data: str
+    media_type: str
+    original_size: tuple[int, int]
+    size: tuple[int, int]
+
+
+def preprocess_image(source: str | Path, options: PreprocessOptions) -> PreprocessResult:
+    """Runs in the worker processes: `source` is the base64 text or the image file of a spilled frame."""
+    raw = source.read_bytes() if isinstance(source, Path) else base64.b64decode(source)
+
+    image: Image.Image = Image.open(io.BytesIO(raw))
+    original_size = image.size
+
+    width, height = image.size
+    top, bottom = int(height * options.crop_top), int(height * options.crop_bottom)
+    if top or bottom:
+        image = image.crop((0, top, width, height - bottom))
+
+    if options.max_edge and max(image.size) > options.max_edge:
+        image.thumbnail((options.max_edge, options.max_edge), Image.Resampling.LANCZOS)
+
+    if options.format in ("jpeg", "webp") and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    buffer = io.BytesIO()
+    if options.format == "png":
+        image.save(buffer, format="PNG", optimize=True)
+    else:
+        image.save(buffer, format=options.format.upper(), quality=options.quality)
+
+    return PreprocessResult(
+        data=base64.b64encode(buffer.getvalue()).decode("ascii"),
+        media_type=MEDIA_TYPES[options.format],
+        original_size=original_size,
+        size=image.size,
+    )
+
+
+class ScreenshotPreprocessor:
+    def __init__(
+        self,
+        options: PreprocessOptions | None = None,
+        workers: int = SCREENSHOT_WORKERS,
+        enabled: bool = SCREENSHOT_PREPROCESS,
+    ):
+        self.options = options or PreprocessOptions()
+        if self.options.format not in MEDIA_TYPES:
+            raise ValueError(f"SCREENSHOT_FORMAT must be one of {', '.join(MEDIA_TYPES)}")
+        self.workers = workers
+        self.enabled = enabled and Image is not None
+        # started with the first screenshot, `spawn` so the workers do not inherit the app's threads
+        self._pool: ProcessPoolExecutor | None = None
+
+        self.counters = {
+            "calls": 0,
+            "processed": 0,
+            "kept": 0,
+            "failures": 0,
+            "bytes_before": 0,
+            "bytes_after": 0,
+            "tokens_before": 0,
+            "tokens_after": 0,
+        }
+        self.total_seconds = 0.0
+
+    async def run(self, screenshot: Screenshot) -> Screenshot:
+        """The downscaled screenshot, or the original one when preprocessing does not help."""
+        self.counters["calls"] += 1
+        if not self.enabled:
+            return screenshot
+
+        source: str | Path | None = screenshot.path if screenshot.data is None else screenshot.data
+        if source is None:
+            # already closed
+            return screenshot
+
+        started_at = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._executor(), preprocess_image, source, self.options
+            )
+        except Exception as error:
+            # broken image, Pillow error or a crashed worker: the vision call gets the original
+            self.counters["failures"] += 1
+            loguru.logger.warning(f"Supervisor --- screenshot preprocessing failed: {error!r}")
+            if isinstance(error, BrokenProcessPool):
+                # the next call starts a new pool
+                self._pool = None
+            return screenshot
+        finally:
+            self.total_seconds += time.perf_counter() - started_at
+
+        tokens_before = vision_tokens(*result.original_size)
+        if len(result.data) >= screenshot.size:
+            self.counters["kept"] += 1
+            self._record(screenshot.size, screenshot.size, tokens_before, tokens_before)
+            return screenshot
+
+        tokens_after = vision_tokens(*result.size)
+        self.counters["processed"] += 1
+        self._record(screenshot.size, len(result.data), tokens_before, tokens_after)
+        loguru.logger.info(
+            f"Supervisor --- screenshot {result.original_size[0]}x{result.original_size[1]} -> "
+            f"{result.size[0]}x{result.size[1]} {result.media_type}: "
+            f"{screenshot.size - len(result.data)} bytes and {tokens_before - tokens_after} tokens saved"
+        )
+        return Screenshot(media_type=result.media_type, data=result.data, size=len(result.data))
+
+    def stats(self) -> dict:
+        calls = self.counters["calls"]
+        return {
+            **self.counters,
+            "enabled": self.enabled,
+            "bytes_saved": self.counters["bytes_before"] - self.counters["bytes_after"],
+            "tokens_saved": self.counters["tokens_before"] - self.counters["tokens_after"],
+            "avg_ms": self.total_seconds / calls * 1000 if calls else 0.0,
+        }
+
+    def shutdown(self):
+        """Stop the worker processes, called when the app shuts down (see src/config/events.py)."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _record(self, bytes_before: int, bytes_after: int, tokens_before: int, tokens_after: int):
+        self.counters["bytes_before"] += bytes_before
+        self.counters["bytes_after"] += bytes_after
+        self.counters["tokens_before"] += tokens_before
+        self.counters["tokens_after"] += tokens_after
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
@@ -0,0 +1,234 @@
+# %% async LLM client
+"""
+Non-blocking wrapper around `openai.AsyncOpenAI`.
+
+- at most `max_in_flight` concurrent calls per model, everything else waits in a FIFO queue
+- optionally a priority scheduler in front of that (interactive calls before background work)
+- per-call timeout (asyncio.wait_for, the request is cancelled when it fires)
+- streaming of structured responses, the slot is held until the stream is finished
+- per-model metrics: queue depth, wait time, latency, timeouts and errors
+- token usage of every response, including the input tokens served from the provider prompt cache
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+
+
+class LLMTimeoutError(Exception):
+    """
+    Raised when an LLM call does not finish within its timeout.
+    """
+
+
+@dataclass
+class ModelMetrics:
+    calls: int = 0
+    in_flight: int = 0
+    waiting: int = 0
+    max_waiting: int = 0
+    timeouts: int = 0
+    errors: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+    total_latency_seconds: float = 0.0
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    output_tokens: int = 0
+
+    def record_usage(self, response):
+        # responses API usage (transcriptions and fakes may not have it)
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        self.input_tokens += getattr(usage, "input_tokens", 0) or 0
+        self.output_tokens += getattr(usage, "output_tokens", 0) or 0
+        details = getattr(usage, "input_tokens_details", None)
+        self.cached_tokens += getattr(details, "cached_tokens", 0) or 0
+
+    def to_dict(self) -> dict:
+        row = asdict(self)
+        row["avg_wait_seconds"] = self.total_wait_seconds / self.calls if self.calls else 0.0
+        row["avg_latency_seconds"] = self.total_latency_seconds / self.calls if self.calls else 0.0
+        row["cached_token_ratio"] = self.cached_tokens / self.input_tokens if self.input_tokens else 0.0
+        return row
+
+
+def _parse_limits(spec: str, cast) -> dict:
+    limits = {}
+    for part in spec.split(","):
+        if "=" in part:
+            name, value = part.split("=", 1)
+            try:
+                limits[name.strip()] = cast(value)
+            except ValueError:
+                raise ValueError(f"invalid value in {part.strip()!r} of {spec!r}") from None
+    return limits
+
+
+def parse_model_limits(spec: str) -> dict[str, int]:
+    """'gpt-5.1=8,gpt-4o=4' -> {'gpt-5.1': 8, 'gpt-4o': 4}"""
+    return _parse_limits(spec, int)
+
+
+def parse_float_limits(spec: str) -> dict[str, float]:
+    """'supervision=2.5,analytics=120' -> {'supervision': 2.5, 'analytics': 120.0}"""
+    return _parse_limits(spec, float)
+
+
+def _cache_kwargs(prompt_cache_key: str | None) -> dict:
+    return {"prompt_cache_key": prompt_cache_key} if prompt_cache_key else {}
+
+
+class LLMClient:
+    def __init__(
+        self,
+        client,
+        max_in_flight: int = 8,
+        model_limits: dict[str, int] | None = None,
+        timeout: float = 30.0,
+        scheduler=None,
+    ):
+        self.client = client
+        # optional LLMScheduler (scheduler.py): priority classes in front of the per-model limits
+        self.scheduler = scheduler
+        self.max_in_flight = max_in_flight
+        self.model_limits = model_limits or {}
+        self.timeout = timeout
+
+        self.metrics: dict[str, ModelMetrics] = {}
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _semaphore(self, model: str) -> asyncio.Semaphore:
+        # semaphores belong to one event loop (tests / scripts may start several)
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphores = {}
+
+        if model not in self._semaphores:
+            self._semaphores[model] = asyncio.Semaphore(self.model_limits.get(model, self.max_in_flight))
+        return self._semaphores[model]
+
+    @asynccontextmanager
+    async def _slot(self, model: str):
+        if self.scheduler is None:
+            async with self._model_slot(model) as metrics:
+                yield metrics
+            return
+
+        async with self.scheduler.slot():
+            async with self._model_slot(model) as metrics:
+                yield metrics
+
+    @asynccontextmanager
+    async def _model_slot(self, model: str):
+        """Waits for a free slot of `model` and keeps the metrics of the call."""
+        metrics = self.metrics.setdefault(model, ModelMetrics())
+        semaphore = self._semaphore(model)
+
+        queued_at = time.perf_counter()
+        metrics.waiting += 1
+        metrics.max_waiting = max(metrics.max_waiting, metrics.waiting)
+        try:
+            await semaphore.acquire()
+        finally:
+            metrics.waiting -= 1
+
+        started_at = time.perf_counter()
+        wait = started_at - queued_at
+        metrics.calls += 1
+        metrics.in_flight += 1
+        metrics.total_wait_seconds += wait
+        metrics.max_wait_seconds = max(metrics.max_wait_seconds, wait)
+        try:
+            yield metrics
+        except LLMTimeoutError:
+            metrics.timeouts += 1
+            raise
+        except Exception:
+            metrics.errors += 1
+            raise
+        finally:
+            metrics.in_flight -= 1
+            metrics.total_latency_seconds += time.perf_counter() - started_at
+            semaphore.release()
+
+    async def call(self, model: str, request, timeout: float | None = None):
+        """Run `request()` (a coroutine factory) once a slot for `model` is free."""
+        timeout = timeout or self.timeout
+        async with self._slot(model) as metrics:
+            try:
+                response = await asyncio.wait_for(request(), timeout=timeout)
+            except asyncio.TimeoutError:
+                raise LLMTimeoutError(f"{model} call did not finish within {timeout}s")
+            metrics.record_usage(response)
+            return response
+
+    async def stream(
+        self, model: str, input, text_format, timeout: float | None = None, prompt_cache_key: str | None = None
+    ):
+        """
+        Streams a structured response. Yields ("delta", text) for every output text delta and
+        ("final", parsed output) at the end. `timeout` applies to the gap between two events.
+        """
+        timeout = timeout or self.timeout
+        async with self._slot(model) as metrics:
+            manager = self.client.responses.stream(
+                model=model, input=input, text_format=text_format, **_cache_kwargs(prompt_cache_key)
+            )
+            try:
+                stream = await asyncio.wait_for(manager.__aenter__(), timeout=timeout)
+            except asyncio.TimeoutError:
+                raise LLMTimeoutError(f"{model} stream did not start within {timeout}s")
+
+            try:
+                events = stream.__aiter__()
+                while True:
+                    try:
+                        event = await asyncio.wait_for(events.__anext__(), timeout=timeout)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise LLMTimeoutError(f"{model} stream stalled for more than {timeout}s")
+
+                    if event.type == "response.output_text.delta":
+                        yield "delta", event.delta
+
+                response = await asyncio.wait_for(stream.get_final_response(), timeout=timeout)
+            except BaseException as error:
+                await manager.__aexit__(type(error), error, error.__traceback__)
+                raise
+            await manager.__aexit__(None, None, None)
+            metrics.record_usage(response)
+
+        yield "final", response.output_parsed
+
+    async def parse(
+        self, model: str, input, text_format, timeout: float | None = None, prompt_cache_key: str | None = None
+    ):
+        return await self.call(
+            model,
+            lambda: self.client.responses.parse(
+                model=model, input=input, text_format=text_format, **_cache_kwargs(prompt_cache_key)
+            ),
+            timeout=timeout,
+        )
+
+    async def create(self, model: str, input, timeout: float | None = None, prompt_cache_key: str | None = None):
+        return await self.call(
+            model,
+            lambda: self.client.responses.create(model=model, input=input, **_cache_kwargs(prompt_cache_key)),
+            timeout=timeout,
+        )
+
+    async def transcribe(self, model: str, file, language: str, timeout: float | None = None):
+        return await self.call(
+            model,
+            lambda: self.client.audio.transcriptions.create(model=model, file=file, language=language),
+            timeout=timeout,
+        )
+
+    def stats(self) -> dict:
+        return {model: metrics.to_dict() for model, metrics in self.metrics.items()}
@@ -0,0 +1,309 @@
+# %% append-only log store
+"""
+Append-only storage engine for the request log (replaces the read-modify-write `log.pkl`).
+
+Every record is one JSON line appended to the newest segment file
+(`segment-000001.jsonl`, `segment-000002.jsonl`, ...). A new segment is started once the
+active one grows past `max_segment_bytes`.
+
+Next to the files we keep an in-memory index per user: the sorted `date_time`s of that user's
+records and where each record lives on disk (segment, offset, length). Lookups bisect the
+index and only read the records of this user inside the requested window.
+
+Appends use O_APPEND under an exclusive `flock` on `.write.lock` in the directory, so several
+worker processes can write without dropping each other's rows and a segment is never written
+to once the next one exists. Every call first "catches up" on bytes written by other
+processes, so the index never misses foreign records.
+
+Deleting a user's log appends a tombstone record instead of rewriting the files.
+
+Listeners (e.g. the daily aggregates) are told about every record that gets indexed, including
+records of other processes, via `listener.record(user_id, answer, date_time)` and
+`listener.reset(user_id)` for tombstones.
+"""
+import bisect
+import fcntl
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".jsonl"
+LOCK_NAME = ".write.lock"
+
+# record "op" values
+OP_APPEND = "append"
+OP_DELETE = "delete"
+
+
+def _segment_name(number: int) -> str:
+    return f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}"
+
+
+class _UserIndex:
+    """Sorted (date_time, location) pairs of a single user."""
+
+    __slots__ = ("times", "locations")
+
+    def __init__(self):
+        self.times: list[datetime] = []
+        # (segment number, byte offset, byte length)
+        self.locations: list[tuple[int, int, int]] = []
+
+    def add(self, date_time: datetime, location: tuple[int, int, int]):
+        # records normally arrive in time order -> plain append, otherwise keep the lists sorted
+        if not self.times or date_time >= self.times[-1]:
+            self.times.append(date_time)
+            self.locations.append(location)
+        else:
+            pos = bisect.bisect_right(self.times, date_time)
+            self.times.insert(pos, date_time)
+            self.locations.insert(pos, location)
+
+    def window(self, since: datetime | None, until: datetime | None) -> tuple[int, int]:
+        start = 0 if since is None else bisect.bisect_left(self.times, since)
+        end = len(self.times) if until is None else bisect.bisect_right(self.times, until)
+        return start, end
+
+
+class LogStore:
+    def __init__(self, directory: str | Path, max_segment_bytes: int = 4 * 1024 * 1024, listeners=()):
+        # created with the first write, not when the app is imported
+        self.directory = Path(directory)
+        self.max_segment_bytes = max_segment_bytes
+
+        self._lock = threading.RLock()
+        self._index: dict[str, _UserIndex] = {}
+        # registered before the first scan, so they see the existing records as well
+        self._listeners = list(listeners)
+
+        # segment we are currently reading/writing and how many bytes of it are indexed
+        self._segment = self._first_segment()
+        self._indexed_bytes = 0
+
+        self._catch_up()
+
+    # ---------------------------------------------------------------
+    # public API
+    # ---------------------------------------------------------------
+
+    def refresh(self):
+        """Index records written by other processes (and notify the listeners about them)."""
+        with self._lock:
+            self._catch_up()
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            self._catch_up()
+            return self._segment == 1 and self._indexed_bytes == 0
+
+    def append(self, user_id: str, query: str, answer, date_time: datetime):
+        """Append one request. O(1): one write + indexing of the new bytes."""
+        self.extend([{"user_id": user_id, "query": query, "answer": answer, "date_time": date_time}])
+
+    def extend(self, records: list[dict]):
+        """Append several records with a single write (used for bulk imports)."""
+        lines = [self._encode({"op": OP_APPEND, **record}) for record in records]
+        if lines:
+            self._write(b"".join(lines))
+
+    def delete_user(self, user_id: str):
+        """Forget all log entries of a user by appending a tombstone."""
+        self._write(self._encode({"op": OP_DELETE, "user_id": user_id}))
+
+    def entries(self, user_id: str, since: datetime | None = None, until: datetime | None = None) -> list[dict]:
+        """All records of a user with `since <= date_time <= until`, oldest first."""
+        with self._lock:
+            self._catch_up()
+            user_index = self._index.get(user_id)
+            if user_index is None:
+                return []
+            start, end = user_index.window(since, until)
+            locations = user_index.locations[start:end]
+
+        return self._read(locations)
+
+    def last(self, user_id: str) -> dict | None:
+        """Newest record of a user (or None)."""
+        with self._lock:
+            self._catch_up()
+            user_index = self._index.get(user_id)
+            if not user_index or not user_index.locations:
+                return None
+            location = user_index.locations[-1]
+
+        return self._read([location])[0]
+
+    def tail(self, user_id: str, n: int) -> list[dict]:
+        """The newest `n` records of a user, oldest first."""
+        with self._lock:
+            self._catch_up()
+            user_index = self._index.get(user_id)
+            if user_index is None or n <= 0:
+                return []
+            locations = user_index.locations[-n:]
+
+        return self._read(locations)
+
+    def user_view(
+        self, user_id: str, since: datetime | None, count_since: datetime | None
+    ) -> tuple[list[dict], dict | None, int]:
+        """
+        Window entries, newest entry and number of entries since `count_since` of a user,
+        taken from one consistent view of the index with a single read pass.
+        """
+        with self._lock:
+            self._catch_up()
+            user_index = self._index.get(user_id)
+            if not user_index or not user_index.locations:
+                return [], None, 0
+
+            start, end = user_index.window(since, None)
+            count_start, count_end = user_index.window(count_since, None)
+            locations = user_index.locations[start:end]
+            # the newest entry is only read separately if it is not part of the window
+            if not locations:
+                locations = [user_index.locations[-1]]
+
+        records = self._read(locations)
+        entries = records if end > start else []
+        return entries, records[-1], count_end - count_start
+
+    def all_entries(self, since: datetime | None = None, until: datetime | None = None) -> list[dict]:
+        """Records of all users inside the window (batch jobs), read in file order."""
+        with self._lock:
+            self._catch_up()
+            locations = []
+            for user_index in self._index.values():
+                start, end = user_index.window(since, until)
+                locations.extend(user_index.locations[start:end])
+
+        # sequential reads instead of jumping between the users' records
+        return self._read(sorted(locations))
+
+    def count(self, user_id: str, since: datetime | None = None, until: datetime | None = None) -> int:
+        """Number of records of a user in the window, answered from the index only."""
+        with self._lock:
+            self._catch_up()
+            user_index = self._index.get(user_id)
+            if user_index is None:
+                return 0
+            start, end = user_index.window(since, until)
+            return end - start
+
+    # ---------------------------------------------------------------
+    # internals
+    # ---------------------------------------------------------------
+
+    def _path(self, segment: int) -> Path:
+        return self.directory / _segment_name(segment)
+
+    def _first_segment(self) -> int:
+        numbers = sorted(
+            int(p.name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)])
+            for p in self.directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}")
+        )
+        return numbers[0] if numbers else 1
+
+    @staticmethod
+    def _encode(record: dict) -> bytes:
+        if isinstance(record.get("date_time"), datetime):
+            record = {**record, "date_time": record["date_time"].isoformat()}
+        return (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+    @staticmethod
+    def _decode(line: bytes) -> dict:
+        record = json.loads(line)
+        record.pop("op", None)
+        if "date_time" in record:
+            record["date_time"] = datetime.fromisoformat(record["date_time"])
+        return record
+
+    def _write(self, data: bytes):
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # rotation and append of all processes one after the other
+            with open(self.directory / LOCK_NAME, "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+
+                # make sure we know about segments other workers already rotated to
+                self._catch_up()
+
+                segment = self._segment
+                path = self._path(segment)
+                if path.exists() and path.stat().st_size >= self.max_segment_bytes:
+                    segment += 1
+                    path = self._path(segment)
+
+                fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, data)
+                finally:
+                    os.close(fd)
+
+            # index what we just wrote (and anything other processes wrote in between)
+            self._catch_up()
+
+    def _catch_up(self):
+        """Index all bytes appended since the last call (by us or by other processes)."""
+        while True:
+            # checked first: once the next segment exists nothing is appended to this one anymore,
+            # so reading it to its current end below finishes it
+            rotated = self._path(self._segment + 1).exists()
+
+            path = self._path(self._segment)
+            try:
+                size = path.stat().st_size
+            except FileNotFoundError:
+                size = 0
+
+            if size > self._indexed_bytes:
+                with open(path, "rb") as f:
+                    f.seek(self._indexed_bytes)
+                    chunk = f.read(size - self._indexed_bytes)
+                # only index complete lines, a concurrent writer may be mid-line
+                complete = chunk.rfind(b"\n") + 1
+                self._index_chunk(chunk[:complete], self._indexed_bytes)
+                self._indexed_bytes += complete
+
+            if rotated:
+                self._segment += 1
+                self._indexed_bytes = 0
+                continue
+            return
+
+    def _index_chunk(self, chunk: bytes, base_offset: int):
+        offset = 0
+        for line in chunk.splitlines(keepends=True):
+            record = json.loads(line)
+            user_id = record["user_id"]
+
+            if record.get("op") == OP_DELETE:
+                self._index.pop(user_id, None)
+                for listener in self._listeners:
+                    listener.reset(user_id)
+            else:
+                location = (self._segment, base_offset + offset, len(line))
+                date_time = datetime.fromisoformat(record["date_time"])
+                self._index.setdefault(user_id, _UserIndex()).add(date_time, location)
+                for listener in self._listeners:
+                    listener.record(user_id, record.get("answer"), date_time)
+
+            offset += len(line)
+
+    def _read(self, locations: list[tuple[int, int, int]]) -> list[dict]:
+        records = []
+        handles = {}
+        try:
+            for segment, offset, length in locations:
+                if segment not in handles:
+                    handles[segment] = open(self._path(segment), "rb")
+                f = handles[segment]
+                f.seek(offset)
+                records.append(self._decode(f.read(length)))
+        finally:
+            for f in handles.values():
+                f.close()
+        return records
@@ -0,0 +1,188 @@
+# %% deterministic fast path for the gatekeeper
+"""
+Rule engine that runs before the LLM in `ask_for_app_permission`.
+
+Some requests are foregone conclusions (an "Only Emergencies" time window, the 20th request of
+the day, a user far past the daily target). For those the engine answers in microseconds with a
+templated, personality-consistent reply instead of a full LLM round trip.
+
+Rules only ever DENY and never fire when the query mentions an emergency (whole words, "not an
+emergency" does not count), everything that needs judgement still goes to the model.
+"""
+import random
+import re
+import zlib
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from .aggregates import DailyAggregate
+from .formats import BouncerAnswerFormat
+
+# onboarding time factors (morning, work time, evening, before bed) -> hours of the day
+TIME_SLOTS = [
+    range(5, 9),
+    range(9, 17),
+    range(17, 22),
+    [22, 23, 0, 1, 2, 3, 4],
+]
+
+# factor from which a time slot is "Only Emergencies" (see format_time_factors_to_str)
+EMERGENCY_ONLY_FACTOR = 9
+
+EMERGENCY_WORDS = re.compile(
+    r"\b(emergency|emergencies|urgent|urgently|asap|hospital|accident|notfall|dringend)\b", re.IGNORECASE
+)
+# "not an emergency", "isn't urgent", "kein Notfall": a negation up to this many words before the emergency word
+NEGATIONS = {"not", "no", "isn't", "isnt", "nothing", "never", "nicht", "kein", "keine", "keinen"}
+NEGATION_WINDOW = 3
+
+
+def mentions_emergency(query: str) -> bool:
+    for match in EMERGENCY_WORDS.finditer(query):
+        before = re.findall(r"[\w']+", query[: match.start()].lower())[-NEGATION_WINDOW:]
+        if not NEGATIONS.intersection(before):
+            return True
+    return False
+
+
+REPLY_TEMPLATES: dict[str, dict[str, list[str]]] = {
+    "chill": {
+        "emergency_only_window": [
+            "Hey {name}, this is your no-scroll time. Unless it's an emergency, let's keep the apps closed for now.",
+            "Not now {name}, you wanted this time to stay app-free. Maybe grab a glass of water or stretch a bit instead.",
+            "{name}, you asked me to only let emergencies through right now. How about a short walk instead?",
+        ],
+        "too_many_requests": [
+            "That's request number {requests} today, {name}. Let's give the apps a proper break for the rest of the day.",
+            "{name}, you've asked {requests} times today already. Time to do something offline, maybe call a friend?",
+        ],
+        "far_over_target": [
+            "You're at {usage_minutes} minutes today, {name}, way past your {target_minutes}-minute goal. Let's call it a day.",
+            "{name}, {usage_minutes} minutes is already a lot more than the {target_minutes} you aimed for. Read a few pages instead?",
+        ],
+        "fallback_allow": [
+            "Alright {name}, take {minutes} minutes, then let's get back to it.",
+            "Okay {name}, {minutes} minutes. Enjoy, and close the app afterwards.",
+        ],
+        "fallback_deny": [
+            "Let's skip this one, {name}. You've already had quite a bit of screen time today.",
+            "Not right now {name}, maybe try again a bit later.",
+        ],
+    },
+}
+
+
+def _templates(personality: str | None) -> dict[str, list[str]]:
+    return REPLY_TEMPLATES.get(personality or "chill", REPLY_TEMPLATES["chill"])
+
+
+@dataclass
+class PolicyInput:
+    name: str
+    query: str
+    personality: str | None
+    time_factors: Sequence[int] | None
+    today: DailyAggregate
+    usage_minutes: int
+    target_minutes: int
+    now: datetime = field(default_factory=datetime.now)
+
+
+@dataclass
+class PolicyDecision:
+    rule: str
+    answer: BouncerAnswerFormat
+
+
+class PolicyEngine:
+    def __init__(self, max_requests_per_day: int = 20, over_target_factor: float = 1.5):
+        self.max_requests_per_day = max_requests_per_day
+        self.over_target_factor = over_target_factor
+
+        # how often each path was taken
+        self.counters: dict[str, int] = {"llm": 0}
+
+    def evaluate(self, policy_input: PolicyInput) -> PolicyDecision | None:
+        """Returns a decision when a rule fires, None when the LLM has to decide."""
+        if mentions_emergency(policy_input.query):
+            self.counters["llm"] += 1
+            return None
+
+        for rule in (
+            self._emergency_only_window,
+            self._too_many_requests,
+            self._far_over_target,
+        ):
+            fired = rule(policy_input)
+            if fired is not None:
+                rule_name, values = fired
+                self.counters[rule_name] = self.counters.get(rule_name, 0) + 1
+                return PolicyDecision(rule=rule_name, answer=self._deny(rule_name, policy_input, values))
+
+        self.counters["llm"] += 1
+        return None
+
+    # rules >>>>>>>>>>>>>>>>>>
+
+    def _emergency_only_window(self, policy_input: PolicyInput):
+        if not policy_input.time_factors:
+            return None
+
+        hour = policy_input.now.hour
+        for slot, factor in zip(TIME_SLOTS, policy_input.time_factors):
+            if hour in slot and factor >= EMERGENCY_ONLY_FACTOR:
+                return "emergency_only_window", {}
+        return None
+
+    def _too_many_requests(self, policy_input: PolicyInput):
+        # this request is not logged yet -> +1
+        requests = policy_input.today.requests + 1
+        if requests >= self.max_requests_per_day:
+            return "too_many_requests", {"requests": requests}
+        return None
+
+    def _far_over_target(self, policy_input: PolicyInput):
+        if policy_input.usage_minutes >= policy_input.target_minutes * self.over_target_factor:
+            return "far_over_target", {}
+        return None
+
+    # fallback >>>>>>>>>>>>>>>>>>
+
+    def fallback(self, policy_input: PolicyInput, minutes: int = 5, allow: bool | None = None) -> BouncerAnswerFormat:
+        """
+        Deterministic answer when the LLM is not available in time (deadline, open circuit):
+        a few minutes while the user is below the daily target, no otherwise. `allow` fixes the
+        verdict when the model already streamed one.
+        """
+        self.counters["fallback"] = self.counters.get("fallback", 0) + 1
+        if allow is None:
+            allow = policy_input.usage_minutes < policy_input.target_minutes
+
+        templates = _templates(policy_input.personality)["fallback_allow" if allow else "fallback_deny"]
+        # same request -> same reply, no randomness
+        template = templates[zlib.crc32(policy_input.query.encode("utf-8")) % len(templates)]
+
+        return BouncerAnswerFormat(
+            allow=allow,
+            time=minutes if allow else 0,
+            reply=template.format(name=policy_input.name, minutes=minutes),
+        )
+
+    # replies >>>>>>>>>>>>>>>>>>
+
+    def _deny(self, rule_name: str, policy_input: PolicyInput, values: dict) -> BouncerAnswerFormat:
+        templates = _templates(policy_input.personality)[rule_name]
+        reply = random.choice(templates).format(
+            **{
+                "name": policy_input.name,
+                "usage_minutes": policy_input.usage_minutes,
+                "target_minutes": policy_input.target_minutes,
+                "requests": policy_input.today.requests + 1,
+                **values,
+            }
+        )
+        return BouncerAnswerFormat(allow=False, time=0, reply=reply)
+
+    def stats(self) -> dict:
+        return dict(self.counters)
@@ -0,0 +1,52 @@
+# %% message layout for the provider prompt cache
+"""
+OpenAI caches the longest identical prompt prefix (from 1024 tokens on) and routes requests with
+the same `prompt_cache_key` to the same cache. To reuse as much as possible, messages are always
+assembled from the most static to the most dynamic part:
+
+    static    system prompt + personality      identical for every user of a personality
+    user      preferences, name                identical for every request of a user
+    dynamic   time, usage, history, events     changes with every request
+    input     the request itself (text / image)
+
+and the cache key pins the static prefix (flow, personality, hash of the static text), so it
+changes automatically when a prompt is edited.
+"""
+import hashlib
+from dataclasses import dataclass
+
+
+@dataclass
+class AssembledPrompt:
+    messages: list
+    cache_key: str
+    # characters of the static part, the prefix every request of this key shares
+    static_chars: int
+
+
+def prefix_cache_key(flow: str, variant: str | None, static: list[str]) -> str:
+    digest = hashlib.sha256("\x00".join(static).encode("utf-8")).hexdigest()[:12]
+    return f"{flow}:{variant or 'default'}:{digest}"
+
+
+def assemble_messages(
+    flow: str,
+    variant: str | None,
+    static: list[str],
+    user: list[str | None],
+    dynamic: list[str | None],
+    user_input,
+    cache_key: str | None = None,
+) -> AssembledPrompt:
+    """
+    `user_input` is the content of the final user message (text or multi-modal parts).
+    `cache_key` skips hashing the static part when the caller already knows its key.
+    """
+    messages = [{"role": "system", "content": part} for part in (*static, *user, *dynamic) if part]
+    messages.append({"role": "user", "content": user_input})
+
+    return AssembledPrompt(
+        messages=messages,
+        cache_key=cache_key or prefix_cache_key(flow, variant, static),
+        static_chars=sum(len(part) for part in static),
+    )
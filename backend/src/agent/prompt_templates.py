@@ -0,0 +1,192 @@
+# %% per-user prompt fragments, compiled once per preference version
+"""
+Preferences are stored as data (apps, the four onboarding time factors, personality, daily target)
+and turned into prompt text here, once per user and preference version instead of on every request.
+
+`PromptCompiler.get` returns the `CompiledPrompt` of a user: the static prefix (system prompt +
+personality), the per-user block and the precompiled per-request context template. A new version
+(preferences changed or TEMPLATE_VERSION bumped) is compiled on first use, the request itself
+only fills the context template.
+
+The policy fast path reads the same `UserPreferences`, so rules and prompt never disagree.
+"""
+import hashlib
+import json
+import threading
+from dataclasses import dataclass
+from string import Template
+
+from .cache import LRUCache
+from .prompt_layout import prefix_cache_key
+from .prompts import (
+    GATEKEEPER_CONTEXT_TEMPLATE,
+    GATEKEEPER_SYSTEM_PROMPT,
+    PERSONALITY_CHILL,
+    PERSONALITY_MAP,
+    USER_PREFERENCE_TEMPLATE,
+)
+
+# bump when a template changes, every user is compiled again
+TEMPLATE_VERSION = 1
+
+# daily screen time goal of users that did not choose one ("around 2 hours")
+DEFAULT_TARGET_MINUTES = 120
+
+TIME_FACTOR_LABELS = [
+    "In the morning hours after waking up",
+    "During work hours",
+    "After work and in the evening",
+    "During the late evening before sleep",
+]
+
+_user_preference_template = Template(USER_PREFERENCE_TEMPLATE)
+_context_template = Template(GATEKEEPER_CONTEXT_TEMPLATE)
+
+
+def format_time_factors_to_str(factors) -> str:
+    timing_pref_statements = []
+
+    for time, factor in zip(TIME_FACTOR_LABELS, factors):
+        match factor:
+            case 0 | 1 | 2 | 3:
+                # Factor too low → skip
+                continue
+
+            case 4 | 5 | 6:
+                timing_pref_statements.append(f"{time}: The user wants to reduce their usage during this period.")
+
+            case 7 | 8:
+                timing_pref_statements.append(
+                    f"{time}: The user should only use the apps for a good or meaningful reason."
+                )
+
+            case 9 | 10:
+                timing_pref_statements.append(
+                    f"{time}: Usage should generally not be allowed at this time. Only Emergencies"
+                )
+
+            case _:
+                # Ignore invalid values
+                continue
+
+    if timing_pref_statements:
+        return "\n".join(["Additionally the user has whishes for these specific times:"] + timing_pref_statements)
+    else:
+        return ""
+
+
+def format_target(target_minutes: int) -> str:
+    if target_minutes % 60 == 0:
+        hours = target_minutes // 60
+        return f"{hours} hour" if hours == 1 else f"{hours} hours"
+    return f"{target_minutes} minutes"
+
+
+@dataclass(frozen=True)
+class UserPreferences:
+    apps: tuple
+    time_factors: tuple | None
+    personality: str
+    target_minutes: int
+    # free-text preference of users onboarded before preferences were structured
+    legacy_text: str | None = None
+
+    @classmethod
+    def from_row(cls, row: dict | None) -> "UserPreferences":
+        row = row or {}
+        time_factors = row.get("time_factors")
+        structured = time_factors is not None
+
+        return cls(
+            apps=tuple(row.get("selected_apps") or ()),
+            time_factors=tuple(time_factors) if time_factors is not None else None,
+            personality=row.get("preferred_personality") or "chill",
+            target_minutes=int(row.get("target_minutes") or DEFAULT_TARGET_MINUTES),
+            legacy_text=None if structured else row.get("preference"),
+        )
+
+    @property
+    def version(self) -> str:
+        data = json.dumps(
+            [
+                TEMPLATE_VERSION,
+                list(self.apps),
+                self.time_factors,
+                self.personality,
+                self.target_minutes,
+                self.legacy_text,
+            ]
+        )
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()[:12]
+
+    def to_text(self) -> str:
+        """Free-text preference as stored in the preference column."""
+        if self.legacy_text is not None:
+            return self.legacy_text
+
+        return _user_preference_template.substitute(
+            apps=str(list(self.apps)).strip("[]"),
+            target=format_target(self.target_minutes),
+            timing_preference=format_time_factors_to_str(self.time_factors or ()),
+        )
+
+
+@dataclass(frozen=True)
+class CompiledPrompt:
+    version: str
+    personality: str
+    # identical for every user of a personality (provider prefix cache)
+    static: tuple
+    # identical for every request of a user
+    user_info: str
+    # provider prompt cache key of `static`
+    cache_key: str
+
+    def context(self, **values) -> str:
+        """Per-request context: time, history, today, insight, usage, usage_trend, events, similar_decision."""
+        return _context_template.substitute(**values)
+
+
+def compile_user_prompt(name: str, preferences: UserPreferences) -> CompiledPrompt:
+    personality_prompt = PERSONALITY_MAP.get(preferences.personality, PERSONALITY_CHILL)
+
+    static = (GATEKEEPER_SYSTEM_PROMPT, personality_prompt)
+    user_info = f"""
+    The users name is: {name}
+
+    {preferences.to_text()}
+    """
+
+    return CompiledPrompt(
+        version=preferences.version,
+        personality=preferences.personality,
+        static=static,
+        user_info=user_info,
+        cache_key=prefix_cache_key("gatekeeper", preferences.personality, list(static)),
+    )
+
+
+class PromptCompiler:
+    def __init__(self, max_users: int = 4096):
+        self._compiled = LRUCache(max_users)
+        self._lock = threading.Lock()
+        self.compiles = 0
+
+    def get(self, user_id: str, name: str, preferences: UserPreferences) -> CompiledPrompt:
+        version = f"{preferences.version}:{name}"
+        with self._lock:
+            hit, compiled = self._compiled.lookup(user_id)
+            if hit and compiled[0] == version:
+                return compiled[1]
+
+            prompt = compile_user_prompt(name, preferences)
+            self._compiled.put(user_id, (version, prompt))
+            self.compiles += 1
+            return prompt
+
+    def invalidate(self, user_id: str | None = None):
+        with self._lock:
+            self._compiled.invalidate(user_id)
+
+    def stats(self) -> dict:
+        return {**self._compiled.stats(), "compiles": self.compiles}
@@ -0,0 +1,151 @@
+# %% model routing: small fast model first, large model when needed
+"""
+Most gatekeeper decisions are easy, so they go to a small, cheap model. A request is escalated to
+the large model when
+
+- the query is long (more than `max_query_words`) or ambiguous (several questions, hedging words)
+- the context is borderline: usage within `near_limit_margin` of the daily target, or a calendar
+  event is running right now
+- the small model answers with a confidence below `min_confidence`
+
+Per-tier counters (calls, escalation reasons, latency) are kept here, the token usage of every
+model is kept by the LLM client; `stats()` turns both into an estimated cost per tier.
+"""
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from .decision_cache import normalize_query
+
+SMALL = "small"
+LARGE = "large"
+
+AMBIGUOUS_WORDS = ("maybe", "not sure", "depends", "kind of", "idk", "either")
+
+
+def parse_model_prices(spec: str) -> dict[str, tuple[float, float]]:
+    """'gpt-5-mini=0.25/2.0,gpt-5.1=1.25/10' -> {model: (input $ per 1M tokens, output $ per 1M tokens)}"""
+    prices = {}
+    for part in spec.split(","):
+        if "=" in part:
+            model, price = part.split("=", 1)
+            input_price, output_price = price.split("/", 1)
+            prices[model.strip()] = (float(input_price), float(output_price))
+    return prices
+
+
+def event_running(events: list, now: datetime) -> bool:
+    current = now.strftime("%H:%M")
+    for event in events:
+        # zero padded so string comparison works ("9:00" -> "09:00")
+        start, end = (f"{int(t.split(':')[0]):02d}:{t.split(':')[1]}" for t in (event["start"], event["end"]))
+        if start <= current < end:
+            return True
+    return False
+
+
+@dataclass
+class RoutingInput:
+    query: str
+    usage_minutes: int
+    target_minutes: int
+    events: list = field(default_factory=list)
+    now: datetime = field(default_factory=datetime.now)
+
+
+@dataclass
+class RouteDecision:
+    tier: str
+    model: str
+    reason: str
+
+
+@dataclass
+class TierMetrics:
+    calls: int = 0
+    total_latency_seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "avg_latency_seconds": self.total_latency_seconds / self.calls if self.calls else 0.0,
+        }
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        small_model: str = "gpt-5-mini",
+        large_model: str = "gpt-5.1",
+        enabled: bool = True,
+        max_query_words: int = 25,
+        near_limit_margin: float = 0.15,
+        min_confidence: float = 0.7,
+        prices: dict[str, tuple[float, float]] | None = None,
+    ):
+        self.small_model = small_model
+        self.large_model = large_model
+        self.enabled = enabled
+        self.max_query_words = max_query_words
+        self.near_limit_margin = near_limit_margin
+        self.min_confidence = min_confidence
+        self.prices = prices or {}
+
+        self.tiers = {SMALL: TierMetrics(), LARGE: TierMetrics()}
+        self.reasons: dict[str, int] = {}
+
+    def route(self, routing_input: RoutingInput) -> RouteDecision:
+        """Initial route of a decision, its escalation reason is counted here (once per decision)."""
+        reason = self._escalation_reason(routing_input) if self.enabled else "routing_disabled"
+        if reason is None:
+            return RouteDecision(tier=SMALL, model=self.small_model, reason="default")
+        self.count_escalation(reason)
+        return self.escalate(reason)
+
+    def escalate(self, reason: str) -> RouteDecision:
+        # not counted: a hedged call escalates once per attempt, see count_escalation
+        return RouteDecision(tier=LARGE, model=self.large_model, reason=reason)
+
+    def count_escalation(self, reason: str):
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+
+    def confident(self, answer) -> bool:
+        # None: refusal or empty parse of the small model
+        return answer is not None and answer.confidence >= self.min_confidence
+
+    def _escalation_reason(self, routing_input: RoutingInput) -> str | None:
+        query = normalize_query(routing_input.query)
+        words = query.split()
+
+        if len(words) > self.max_query_words:
+            return "long_query"
+        if routing_input.query.count("?") > 1 or any(re.search(rf"\b{word}\b", query) for word in AMBIGUOUS_WORDS):
+            return "ambiguous_query"
+        if (
+            routing_input.target_minutes
+            and abs(routing_input.usage_minutes / routing_input.target_minutes - 1) <= self.near_limit_margin
+        ):
+            return "near_limit"
+        if event_running(routing_input.events, routing_input.now):
+            return "event_running"
+        return None
+
+    def record(self, tier: str, latency_seconds: float):
+        metrics = self.tiers[tier]
+        metrics.calls += 1
+        metrics.total_latency_seconds += latency_seconds
+
+    def stats(self, llm_stats: dict | None = None) -> dict:
+        """`llm_stats` is LLMClient.stats(), used for the token based cost estimate."""
+        llm_stats = llm_stats or {}
+        tiers = {}
+        for tier, model in ((SMALL, self.small_model), (LARGE, self.large_model)):
+            row = {"model": model, **self.tiers[tier].to_dict()}
+            usage = llm_stats.get(model)
+            if usage is not None and model in self.prices:
+                input_price, output_price = self.prices[model]
+                row["estimated_cost_usd"] = (
+                    usage["input_tokens"] * input_price + usage["output_tokens"] * output_price
+                ) / 1_000_000
+            tiers[tier] = row
+        return {"enabled": self.enabled, "tiers": tiers, "escalations": dict(self.reasons)}
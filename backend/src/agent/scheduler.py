@@ -0,0 +1,191 @@
+# %% priority scheduling of LLM calls
+"""
+All LLM calls share the same OpenAI capacity. `LLMScheduler` hands out at most `max_in_flight`
+slots, always to the most important waiting class first:
+
+    interactive (/echo)  >  voice (/voice)  >  supervision (/supervise)  >  analytics
+
+Every class has its own concurrency cap, so background work can never take all slots, and an
+optional maximum wait: a job that waited longer is shed (JobShedError), a screenshot check from
+a minute ago is not worth an LLM call anymore.
+
+The class of a call is taken from the `llm_priority` context variable, set by the endpoints with
+`with priority(VOICE): ...`. Tasks inherit it, calls without a class count as interactive.
+"""
+import asyncio
+import contextvars
+import time
+from collections import deque
+from collections.abc import Mapping
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import asdict, dataclass
+
+INTERACTIVE = "interactive"
+VOICE = "voice"
+SUPERVISION = "supervision"
+ANALYTICS = "analytics"
+
+PRIORITY_CLASSES = (INTERACTIVE, VOICE, SUPERVISION, ANALYTICS)
+
+llm_priority: contextvars.ContextVar[str] = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(priority_class: str):
+    token = llm_priority.set(priority_class)
+    try:
+        yield
+    finally:
+        llm_priority.reset(token)
+
+
+class JobShedError(Exception):
+    """
+    Raised when a queued LLM call waited longer than its class allows and is dropped.
+    """
+
+
+@dataclass
+class ClassMetrics:
+    running: int = 0
+    waiting: int = 0
+    max_waiting: int = 0
+    started: int = 0
+    shed: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        row = asdict(self)
+        row["avg_wait_seconds"] = self.total_wait_seconds / self.started if self.started else 0.0
+        return row
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        max_in_flight: int = 16,
+        class_limits: dict[str, int] | None = None,
+        max_wait_seconds: Mapping[str, float] | None = None,
+    ):
+        self.max_in_flight = max_in_flight
+        self.class_limits = {cls: max_in_flight for cls in PRIORITY_CLASSES}
+        self.class_limits.update(class_limits or {})
+        self.max_wait_seconds = dict(max_wait_seconds or {})
+
+        self.metrics = {cls: ClassMetrics() for cls in PRIORITY_CLASSES}
+        self._queues: dict[str, deque] = {cls: deque() for cls in PRIORITY_CLASSES}
+        self._running = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _check_loop(self):
+        # waiters belong to one event loop (tests / scripts may start several)
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._queues = {cls: deque() for cls in PRIORITY_CLASSES}
+            self._running = 0
+            for metrics in self.metrics.values():
+                metrics.running = metrics.waiting = 0
+        return loop
+
+    def _can_start(self, priority_class: str) -> bool:
+        return (
+            self._running < self.max_in_flight
+            and self.metrics[priority_class].running < self.class_limits[priority_class]
+        )
+
+    def _start(self, priority_class: str, wait: float):
+        metrics = self.metrics[priority_class]
+        self._running += 1
+        metrics.running += 1
+        metrics.started += 1
+        metrics.total_wait_seconds += wait
+        metrics.max_wait_seconds = max(metrics.max_wait_seconds, wait)
+
+    async def acquire(self, priority_class: str):
+        loop = self._check_loop()
+        metrics = self.metrics[priority_class]
+
+        # nobody of the same or a more important class is waiting -> start right away
+        more_important = PRIORITY_CLASSES[: PRIORITY_CLASSES.index(priority_class) + 1]
+        if self._can_start(priority_class) and not any(self._queues[cls] for cls in more_important):
+            self._start(priority_class, 0.0)
+            return
+
+        future = loop.create_future()
+        queued_at = time.perf_counter()
+        self._queues[priority_class].append(future)
+        metrics.waiting += 1
+        metrics.max_waiting = max(metrics.max_waiting, metrics.waiting)
+
+        try:
+            await asyncio.wait_for(future, timeout=self.max_wait_seconds.get(priority_class))
+        except asyncio.TimeoutError:
+            # granted in the same moment the wait ran out -> keep the slot
+            if not future.done() or future.cancelled():
+                metrics.shed += 1
+                raise JobShedError(
+                    f"{priority_class} LLM call waited longer than {self.max_wait_seconds[priority_class]}s"
+                )
+        except asyncio.CancelledError:
+            # the slot may have been granted right before the caller went away
+            if future.done() and not future.cancelled():
+                self.release(priority_class)
+            raise
+        finally:
+            metrics.waiting -= 1
+            if not future.done() or future.cancelled():
+                self._remove(priority_class, future)
+
+        self._start_granted(priority_class, time.perf_counter() - queued_at)
+
+    def _start_granted(self, priority_class: str, wait: float):
+        # _dispatch already counted the slot in `_running`, only the metrics are missing
+        metrics = self.metrics[priority_class]
+        metrics.started += 1
+        metrics.total_wait_seconds += wait
+        metrics.max_wait_seconds = max(metrics.max_wait_seconds, wait)
+
+    def _remove(self, priority_class: str, future):
+        try:
+            self._queues[priority_class].remove(future)
+        except ValueError:
+            pass
+
+    def release(self, priority_class: str):
+        self._running -= 1
+        self.metrics[priority_class].running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        for priority_class in PRIORITY_CLASSES:
+            queue = self._queues[priority_class]
+            while queue and self._can_start(priority_class):
+                future = queue.popleft()
+                if future.done():
+                    continue
+                self._running += 1
+                self.metrics[priority_class].running += 1
+                future.set_result(None)
+            if self._running >= self.max_in_flight:
+                return
+
+    @asynccontextmanager
+    async def slot(self, priority_class: str | None = None):
+        """Holds one slot of `priority_class` (default: the class of the current context)."""
+        priority_class = priority_class or llm_priority.get()
+        await self.acquire(priority_class)
+        try:
+            yield priority_class
+        finally:
+            self.release(priority_class)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self._running,
+            "max_in_flight": self.max_in_flight,
+            "classes": {
+                cls: {**self.metrics[cls].to_dict(), "limit": self.class_limits[cls]} for cls in PRIORITY_CLASSES
+            },
+        }
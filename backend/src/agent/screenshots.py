@@ -0,0 +1,103 @@
+# %% screenshots of /supervise on their way to the vision call
+"""
+The app sends the screenshot base64 encoded, which is exactly what the vision call needs in its data
+URL. So the text is passed through as it is: no file, no encoding again. It is only decoded once to
+validate it and check the image type.
+
+Frames larger than SCREENSHOT_SPILL_BYTES (base64 text) are the fallback: they are decoded chunk by
+chunk straight into a uniquely named temporary file of this request (the image bytes, never a
+second full copy in memory) and only read back when the vision prompt is built. `close()` removes
+the file again.
+"""
+import base64
+import binascii
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+
+import decouple
+
+SCREENSHOT_SPILL_BYTES = decouple.config("SCREENSHOT_SPILL_BYTES", default=8 * 1024 * 1024, cast=int)
+# base64 characters decoded at once when spilling, a multiple of 4
+SPILL_CHUNK_CHARS = 1024 * 1024
+
+# magic bytes -> media type of the data URL
+IMAGE_SIGNATURES = {
+    b"\x89PNG\r\n\x1a\n": "image/png",
+    b"\xff\xd8\xff": "image/jpeg",
+    b"GIF8": "image/gif",
+}
+
+
+def sniff_media_type(head: bytes) -> str:
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, media_type in IMAGE_SIGNATURES.items():
+        if head.startswith(signature):
+            return media_type
+    raise ValueError("not a PNG, JPEG, WebP or GIF image")
+
+
+@dataclass
+class Screenshot:
+    media_type: str
+    # base64 text, or None when it was spilled to `path`
+    data: str | None = None
+    path: Path | None = None
+    # length of the base64 text
+    size: int = 0
+
+    @classmethod
+    def from_base64(cls, data: str, spill_bytes: int = SCREENSHOT_SPILL_BYTES) -> "Screenshot":
+        # offset instead of slicing, a data URL prefix does not cost a copy of the text
+        start = data.index(",") + 1 if data.startswith("data:") else 0
+        size = len(data) - start
+
+        if size > spill_bytes:
+            return cls._spill(data, start)
+
+        data = data[start:] if start else data
+        try:
+            image = base64.b64decode(data, validate=True)
+        except binascii.Error as error:
+            raise ValueError(f"invalid base64 image: {error}") from error
+        return cls(media_type=sniff_media_type(image[:12]), data=data, size=size)
+
+    @classmethod
+    def _spill(cls, data: str, start: int) -> "Screenshot":
+        fd, path = tempfile.mkstemp(prefix="screenshot-", suffix=".img")
+        try:
+            with os.fdopen(fd, "w+b") as f:
+                for offset in range(start, len(data), SPILL_CHUNK_CHARS):
+                    f.write(base64.b64decode(data[offset : offset + SPILL_CHUNK_CHARS], validate=True))
+                f.seek(0)
+                media_type = sniff_media_type(f.read(12))
+        except binascii.Error as error:
+            os.unlink(path)
+            raise ValueError(f"invalid base64 image: {error}") from error
+        except ValueError:
+            os.unlink(path)
+            raise
+
+        return cls(media_type=media_type, path=Path(path), size=len(data) - start)
+
+    @classmethod
+    def from_bytes(cls, image: bytes) -> "Screenshot":
+        data = base64.b64encode(image).decode("ascii")
+        return cls(media_type=sniff_media_type(image[:12]), data=data, size=len(data))
+
+    def base64_text(self) -> str:
+        if self.data is not None:
+            return self.data
+        if self.path is None:
+            raise ValueError("screenshot is closed")
+        return base64.b64encode(self.path.read_bytes()).decode("ascii")
+
+    def data_url(self) -> str:
+        return f"data:{self.media_type};base64,{self.base64_text()}"
+
+    def close(self):
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+            self.path = None
@@ -0,0 +1,197 @@
+# %% semantic nearest-neighbour index of past decisions
+"""
+Per-user vector index of past gatekeeper decisions, so paraphrases of earlier requests
+("answer a friend on insta" / "reply to my friend on Instagram") can reuse or seed a decision.
+
+Embeddings are hashed word + character-trigram features (signed feature hashing, L2 normalized),
+so no model or extra dependency is needed, only NumPy. Cosine similarity is a single mat-vec.
+
+Numbers barely move the embedding ("5 more minutes" / "50 more minutes" are ~0.9 similar), so a
+decision is only reused when both requests contain the same numbers (`SemanticMatch.reusable`).
+
+Every user has at most `max_entries_per_user` vectors (least recently used row is overwritten)
+and at most `max_users` users are kept (least recently used user is dropped).
+"""
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+
+import numpy as np
+
+from .cache import LRUCache
+from .decision_cache import normalize_query
+
+
+def embed(text: str, dim: int = 256) -> np.ndarray:
+    vector = np.zeros(dim, dtype=np.float32)
+    words = normalize_query(text).split()
+
+    features = list(words)
+    for word in words:
+        padded = f" {word} "
+        features.extend(padded[i : i + 3] for i in range(len(padded) - 2))
+
+    for feature in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % dim] += 1.0 if (h // dim) & 1 else -1.0
+
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+NUMBER_WORDS = {
+    "one",
+    "two",
+    "three",
+    "four",
+    "five",
+    "six",
+    "seven",
+    "eight",
+    "nine",
+    "ten",
+    "fifteen",
+    "twenty",
+    "thirty",
+    "forty",
+    "fifty",
+    "sixty",
+    "half",
+    "quarter",
+    "couple",
+    "few",
+    "zwei",
+    "drei",
+    "vier",
+    "fünf",
+    "zehn",
+    "fünfzehn",
+    "zwanzig",
+    "dreißig",
+    "halbe",
+}
+
+
+def numbers(text: str) -> list[str]:
+    """Digits and number words of a request in order, 'tiktok for 10 minutes' -> ['10']."""
+    return [word for word in normalize_query(text).split() if word.isdigit() or word in NUMBER_WORDS]
+
+
+@dataclass
+class SemanticEntry:
+    query: str
+    answer: dict
+    # (usage bucket, time slot) the decision was made in, None for entries seeded from the log
+    context: tuple | None = None
+
+
+@dataclass
+class SemanticMatch:
+    similarity: float
+    entry: SemanticEntry
+
+    def reusable(self, query: str, context: tuple, threshold: float) -> bool:
+        """Whether the decision can be reused for `query`: similar enough, same context and same numbers."""
+        return (
+            self.similarity >= threshold
+            and self.entry.context == context
+            and numbers(self.entry.query) == numbers(query)
+        )
+
+
+class _UserVectors:
+    def __init__(self, capacity: int, dim: int):
+        self.capacity = capacity
+        # grows on demand up to `capacity`, most users only have a handful of requests
+        initial = min(8, capacity)
+        self.vectors = np.zeros((initial, dim), dtype=np.float32)
+        self.last_used = np.zeros(initial, dtype=np.float64)
+        self.entries: list[SemanticEntry | None] = [None] * initial
+        self.size = 0
+
+    def slot(self) -> tuple[int, bool]:
+        """Row for a new vector and whether an old one gets evicted."""
+        if self.size == len(self.entries) and self.size < self.capacity:
+            grown = min(self.size * 2, self.capacity)
+            self.vectors = np.vstack([self.vectors, np.zeros((grown - self.size, self.vectors.shape[1]), np.float32)])
+            self.last_used = np.concatenate([self.last_used, np.zeros(grown - self.size)])
+            self.entries.extend([None] * (grown - self.size))
+
+        if self.size < len(self.entries):
+            self.size += 1
+            return self.size - 1, False
+        return int(np.argmin(self.last_used)), True
+
+
+class SemanticDecisionIndex:
+    def __init__(self, dim: int = 256, max_entries_per_user: int = 128, max_users: int = 1024):
+        self.dim = dim
+        self.max_entries_per_user = max_entries_per_user
+        self.max_users = max_users
+
+        # user_id -> _UserVectors
+        self._users = LRUCache(max_users)
+        self._lock = threading.Lock()
+
+        self.counters = {"lookups": 0, "matches": 0, "evictions": 0}
+        self.total_lookup_seconds = 0.0
+
+    def has_user(self, user_id: str) -> bool:
+        return user_id in self._users
+
+    def seed(self, user_id: str, entries: list[dict]):
+        """Build the index of a user from log entries (dicts with query + answer), oldest first."""
+        for entry in entries[-self.max_entries_per_user :]:
+            self.add(user_id, entry["query"], entry["answer"])
+        # users without history are remembered as well, so we do not seed them again
+        with self._lock:
+            self._user(user_id)
+
+    def add(self, user_id: str, query: str, answer: dict, context: tuple | None = None):
+        vector = embed(query, self.dim)
+        with self._lock:
+            user = self._user(user_id)
+            row, evicted = user.slot()
+            user.vectors[row] = vector
+            user.entries[row] = SemanticEntry(query=query, answer=answer, context=context)
+            user.last_used[row] = time.monotonic()
+            if evicted:
+                self.counters["evictions"] += 1
+
+    def nearest(self, user_id: str, query: str) -> SemanticMatch | None:
+        started_at = time.perf_counter()
+        vector = embed(query, self.dim)
+
+        with self._lock:
+            self.counters["lookups"] += 1
+            _, user = self._users.lookup(user_id)
+            if user is None or user.size == 0:
+                self.total_lookup_seconds += time.perf_counter() - started_at
+                return None
+
+            similarities = user.vectors[: user.size] @ vector
+            row = int(np.argmax(similarities))
+            user.last_used[row] = time.monotonic()
+            match = SemanticMatch(similarity=float(similarities[row]), entry=user.entries[row])
+
+        self.counters["matches"] += 1
+        self.total_lookup_seconds += time.perf_counter() - started_at
+        return match
+
+    def drop_user(self, user_id: str):
+        with self._lock:
+            self._users.invalidate(user_id)
+
+    def _user(self, user_id: str) -> _UserVectors:
+        return self._users.get_or_create(user_id, lambda: _UserVectors(self.max_entries_per_user, self.dim))
+
+    def stats(self) -> dict:
+        lookups = self.counters["lookups"]
+        return {
+            **self.counters,
+            "user_evictions": self._users.evictions,
+            "users": len(self._users),
+            "avg_lookup_us": self.total_lookup_seconds / lookups * 1e6 if lookups else 0.0,
+        }
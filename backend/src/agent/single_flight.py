@@ -0,0 +1,57 @@
+# %% single-flight coalescing of identical concurrent requests
+"""
+Retries and double taps in the app send the same request several times at once. Only the first
+one (the leader) does the work, concurrent duplicates await the same task and share its result,
+so there is one LLM call and one log entry.
+
+The work runs in its own task: a leader whose client disconnects does not cancel it for the others.
+"""
+import asyncio
+from dataclasses import dataclass
+
+
+@dataclass
+class _Flight:
+    task: asyncio.Future
+    waiters: int = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: dict = {}
+
+        self.counters = {"calls": 0, "leaders": 0, "coalesced": 0, "max_waiters": 0}
+
+    async def run(self, key, request):
+        """Run `request()` (a coroutine factory) unless the same key is already running."""
+        self.counters["calls"] += 1
+
+        flight = self._flights.get(key)
+        if flight is None:
+            self.counters["leaders"] += 1
+            flight = self._flights[key] = _Flight(task=asyncio.ensure_future(request()))
+            flight.task.add_done_callback(lambda task: self._done(key, flight))
+        else:
+            self.counters["coalesced"] += 1
+
+        flight.waiters += 1
+        self.counters["max_waiters"] = max(self.counters["max_waiters"], flight.waiters)
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+
+    def _done(self, key, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # nobody may be waiting anymore, do not warn about an unretrieved exception
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    def stats(self) -> dict:
+        calls = self.counters["calls"]
+        return {
+            **self.counters,
+            "in_flight": len(self._flights),
+            "coalesce_rate": self.counters["coalesced"] / calls if calls else 0.0,
+        }
@@ -0,0 +1,142 @@
+# %% incremental JSON decoding for streamed structured answers
+"""
+The gatekeeper answers with a flat JSON object ({"allow": ..., "time": ..., "reply": "..."}).
+When the answer is streamed, `IncrementalJSONObjectParser` decodes it while the text arrives:
+
+- scalar fields (allow, time) are emitted as soon as their value is complete
+- string fields (reply) are emitted piece by piece, so they can be forwarded token by token
+
+Only flat objects with scalar / string values are supported, which is all the answer formats need.
+"""
+import json
+
+# parser states
+_BEFORE_KEY = "before_key"
+_IN_KEY = "in_key"
+_BEFORE_COLON = "before_colon"
+_BEFORE_VALUE = "before_value"
+_IN_STRING = "in_string"
+_IN_SCALAR = "in_scalar"
+_AFTER_VALUE = "after_value"
+_DONE = "done"
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class IncrementalJSONObjectParser:
+    def __init__(self):
+        self.values: dict = {}
+        self._state = _BEFORE_KEY
+        self._started = False
+        self._key = ""
+        self._token = ""
+        # pending escape sequence inside a string ("\\" or "\\u12")
+        self._escape = ""
+
+    @property
+    def done(self) -> bool:
+        return self._state == _DONE
+
+    def feed(self, text: str) -> list[tuple]:
+        """
+        Feed the next chunk. Returns a list of events:
+            ("field", key, value)         a value is complete
+            ("string_delta", key, text)   more characters of a string value
+        """
+        events = []
+        delta = ""
+
+        for char in text:
+            state = self._state
+
+            if state == _IN_STRING:
+                if self._escape:
+                    self._escape += char
+                    decoded = self._decode_escape()
+                    if decoded is not None:
+                        delta += decoded
+                        self._token += decoded
+                    continue
+                if char == "\\":
+                    self._escape = char
+                elif char == '"':
+                    if delta:
+                        events.append(("string_delta", self._key, delta))
+                        delta = ""
+                    self.values[self._key] = self._token
+                    events.append(("field", self._key, self._token))
+                    self._state = _AFTER_VALUE
+                else:
+                    delta += char
+                    self._token += char
+                continue
+
+            if state == _IN_KEY:
+                if char == '"':
+                    self._key = json.loads(f'"{self._token}"')
+                    self._state = _BEFORE_COLON
+                else:
+                    self._token += char
+                continue
+
+            if state == _IN_SCALAR:
+                if char in ",}" or char.isspace():
+                    self._finish_scalar(events)
+                    self._state = _AFTER_VALUE
+                    # the terminating character is handled as "after value" below
+                else:
+                    self._token += char
+                    continue
+
+            if char.isspace():
+                continue
+
+            if self._state == _BEFORE_KEY:
+                if not self._started:
+                    if char == "{":
+                        self._started = True
+                    continue
+                if char == '"':
+                    self._token = ""
+                    self._state = _IN_KEY
+                elif char == "}":
+                    self._state = _DONE
+            elif self._state == _BEFORE_COLON:
+                if char == ":":
+                    self._state = _BEFORE_VALUE
+            elif self._state == _BEFORE_VALUE:
+                self._token = ""
+                if char == '"':
+                    self._state = _IN_STRING
+                else:
+                    self._token = char
+                    self._state = _IN_SCALAR
+            elif self._state == _AFTER_VALUE:
+                if char == ",":
+                    self._state = _BEFORE_KEY
+                elif char == "}":
+                    self._state = _DONE
+
+        if delta:
+            events.append(("string_delta", self._key, delta))
+        return events
+
+    def _finish_scalar(self, events: list):
+        value = json.loads(self._token)
+        self.values[self._key] = value
+        events.append(("field", self._key, value))
+
+    def _decode_escape(self) -> str | None:
+        escape = self._escape
+        if escape[1] == "u":
+            if len(escape) < 6:
+                return None
+            self._escape = ""
+            return chr(int(escape[2:], 16))
+        self._escape = ""
+        return _ESCAPES.get(escape[1], escape[1])
+
+
+def sse_event(event: str, data) -> str:
+    """One Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -1,37 +1,61 @@
 # %%
 # 
 import base64
+import decouple
+import loguru
+import openai
 from .helpers import *
 from .prompts import *
-
-def encode_image(image_path):
-    
-    if not os.path.isfile(image_path):
-        raise RuntimeError("Not an Image")
-
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
-
-
+from .call_policy import CallPolicy, CircuitBreaker, CircuitOpenError
+from .image_preprocess import ScreenshotPreprocessor
+from .llm_client import LLMTimeoutError
+from .prompt_layout import assemble_messages
+from .scheduler import SUPERVISION, JobShedError, priority
+from .screenshots import Screenshot
+
+# deadline, hedged duplicate after the p95 latency and circuit breaker for the screenshot check
+supervisor_calls = CallPolicy(
+    name="supervisor",
+    deadline_seconds=decouple.config("CALL_DEADLINE_SUPERVISE_SECONDS", default=15, cast=float),
+    hedge=decouple.config("CALL_HEDGING", default=True, cast=bool),
+    default_hedge_delay=6.0,
+    breaker=CircuitBreaker(
+        failure_threshold=decouple.config("CALL_BREAKER_FAILURES", default=5, cast=int),
+        reset_seconds=decouple.config("CALL_BREAKER_RESET_SECONDS", default=30, cast=float),
+    ),
+)
+
+# smaller / cheaper screenshots for the vision call, in a process pool
+screenshot_preprocessor = ScreenshotPreprocessor()
+
+# answer when the check did not finish in time, neutral: a missed check is no reason to scold the user
+FALLBACK_FEEDBACK = {
+    "on_track": True,
+    "verdict": "Could not check right now",
+    "score": 50,
+    "feedback": "Keep your goal in mind, the next check will follow soon.",
+    "next_step": "Continue with what you planned.",
+}
 
 async def check_goal_follow_through(
     user_id: str,
     handy_logs,
-    image_path: str,
+    screenshot: Screenshot | None = None,
 ):
     """
     Check whether current app behavior matches the given GOAL.
 
     logs: list[dict] or list[str] – will be serialized into text.
-    screenshot_b64: base64-encoded image string of the current screen (optional).
+    screenshot: the current screen as sent by the app (optional), passed on without re-encoding.
     """
 
-    user_name = get_name(user_id)
+    # only the name (cached) and the newest log entry, not the whole user context
+    user_name = await get_name(user_id)
 
     #user_pref, _, _ = get_user_preferences(user_id)
 
     # TODO users last request
-    last_log = get_last_user_log(user_id)
+    last_log = await get_last_user_log(user_id)
     
     # Logs schön als Text
     if isinstance(handy_logs, str):
@@ -39,10 +63,13 @@ async def check_goal_follow_through(
     else:
         handy_logs_str = "\n".join([str(entry) for entry in handy_logs])
 
-    context_text = f"""
-    CONTEXT:
+    # the same for every check of this user, so it belongs to the cacheable prefix
+    user_info = f"""
     - User name: {user_name}
+    """
 
+    context_text = f"""
+    CONTEXT:
     - most recent user query: {last_log}
 
     LOGS (most recent last):
@@ -52,31 +79,30 @@ async def check_goal_follow_through(
     # ==============================
     #   Build multi-modal "input"
     # ==============================
-    base64_image = encode_image(image_path)
-
-    # System-Kontext: Gatekeeper + Goal Coach + Personality + User Prefs + Logs
-    messages = [
-        {
-            "role": "system", 
-            "content": GOAL_COACH_SYSTEM_PROMPT
-        },
-        {
-            "role": "user", 
-            "content": context_text
-        },
-        {
-            "role": "user",
-            "content": [
-                { "type": "input_text", "text": "what's in this image?" },
-                {
-                    "type": "input_image",
-                    "image_url": f"data:image/png;base64,{base64_image}",
-                }
-            ]
-        }
-    ]
-
-    response = ask_with_image(messages)
+    user_input = [{ "type": "input_text", "text": "what's in this image?" }]
+    if screenshot is not None:
+        screenshot = await screenshot_preprocessor.run(screenshot)
+        user_input.append({"type": "input_image", "image_url": screenshot.data_url()})
+
+    # System-Kontext: Goal Coach + User -> Logs -> Screenshot (most static first, see prompt_layout.py)
+    prompt = assemble_messages(
+        flow="goal_coach",
+        variant=None,
+        static=[GOAL_COACH_SYSTEM_PROMPT],
+        user=[user_info],
+        dynamic=[context_text],
+        user_input=user_input,
+    )
+
+    try:
+        # background check, interactive requests go first (see scheduler.py)
+        with priority(SUPERVISION):
+            response = await supervisor_calls.run(
+                lambda: ask_with_image(prompt.messages, prompt_cache_key=prompt.cache_key)
+            )
+    except (LLMTimeoutError, CircuitOpenError, JobShedError, openai.OpenAIError) as error:
+        loguru.logger.warning(f"Supervisor --- fallback feedback for user {user_id}: {error!r}")
+        response = dict(FALLBACK_FEEDBACK)
 
 
 
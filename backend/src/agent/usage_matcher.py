@@ -0,0 +1,93 @@
+# %% package name -> tracked app matching for the Android usage lists
+"""
+Maps the package names of an Android usage list ("com.instagram.android", "com.zhiliaoapp.musically",
+...) to the tracked apps of a user ("instagram", "tiktok", ...) and sums the minutes per app.
+
+A package belongs to the longest tracked name it contains ("youtube music" before "youtube"), so a
+package that contains two names is counted once. The answer is remembered per package name: the
+usage lists of a user contain mostly the same 200+ packages every time, so after the first request
+matching is one dict lookup per package instead of a substring test against every tracked app.
+
+Matchers are cached per user and built again when the tracked apps of the user change. At most
+`max_users` users (least recently used user is dropped) and `max_packages` remembered packages per
+user are kept.
+"""
+import threading
+
+from .cache import LRUCache
+
+
+def app_key(tracked_apps) -> tuple[str, ...]:
+    """Lowercase tracked app names without duplicates (order of the preferences)."""
+    return tuple(dict.fromkeys(app.lower() for app in tracked_apps if app))
+
+
+class AppMatcher:
+    def __init__(self, tracked_apps, max_packages: int = 4096):
+        self.apps = app_key(tracked_apps)
+        self.max_packages = max_packages
+        # longest name first, ties keep the order of the preferences
+        self._by_length = sorted(self.apps, key=len, reverse=True)
+        # package name -> tracked app (None for packages of untracked apps)
+        self._packages: dict[str, str | None] = {}
+        self.counters = {"hits": 0, "misses": 0}
+
+    def app_for(self, package: str) -> str | None:
+        if package in self._packages:
+            self.counters["hits"] += 1
+            return self._packages[package]
+
+        self.counters["misses"] += 1
+        lowered = package.lower()
+        app = next((name for name in self._by_length if name in lowered), None)
+        if len(self._packages) < self.max_packages:
+            self._packages[package] = app
+        return app
+
+    def totals(self, usage_list) -> dict[str, int]:
+        """Minutes per tracked app (apps without usage are left out), in one pass over the list."""
+        totals: dict[str, int] = {}
+        for item in usage_list:
+            app = self.app_for(item.packageName)
+            if app is not None:
+                totals[app] = totals.get(app, 0) + item.totalMinutes
+        return totals
+
+
+class UsageMatcherCache:
+    def __init__(self, max_users: int = 1024, max_packages: int = 4096):
+        self.max_users = max_users
+        self.max_packages = max_packages
+
+        # user_id -> AppMatcher
+        self._users = LRUCache(max_users)
+        self._lock = threading.Lock()
+
+        self.counters = {"builds": 0}
+
+    def get(self, user_id: str, tracked_apps) -> AppMatcher:
+        apps = app_key(tracked_apps)
+        with self._lock:
+            _, matcher = self._users.lookup(user_id)
+            if matcher is None or matcher.apps != apps:
+                matcher = AppMatcher(apps, self.max_packages)
+                self._users.put(user_id, matcher)
+                self.counters["builds"] += 1
+            return matcher
+
+    def drop_user(self, user_id: str):
+        with self._lock:
+            self._users.invalidate(user_id)
+
+    def stats(self) -> dict:
+        matchers = self._users.values()
+        hits = sum(matcher.counters["hits"] for matcher in matchers)
+        misses = sum(matcher.counters["misses"] for matcher in matchers)
+        return {
+            **self.counters,
+            "user_evictions": self._users.evictions,
+            "users": len(matchers),
+            "package_hits": hits,
+            "package_misses": misses,
+            "package_hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
@@ -0,0 +1,234 @@
+# %% per-user app usage time series with hourly / daily / weekly rollups
+"""
+Usage history of the tracked apps per user, so the gatekeeper can judge the trend ("weekly
+improvement") without raw history in the prompt.
+
+Every user has three rollups, fixed size NumPy arrays with one row per tracked app (row 0 is the
+sum of all tracked apps) and one column per hour / day / week. The columns are ring buffers: a
+column is stamped with the absolute hour / day / week it holds and cleared when it is reused, so
+old data ages out without shifting arrays.
+
+Ingest takes the cumulative minutes of today per app (what Android reports with every request),
+turns them into increments since the last ingest and adds these to the current hour, day and week
+column of all rows at once. The first snapshot of a day (or after a restart) is only a baseline
+for the hourly rollup: its minutes count for the day and the week, but they were used at some
+unknown time since midnight and would otherwise show up as a spike in the current hour.
+
+Past days can also be set from the daily history of the app (`ingest_daily`). That history only
+knows the sum of the tracked apps, so it fills row 0 only and the per-app rows of those days
+stay empty (their averages cover the live ingests only).
+
+`features` derives the small summary that goes into the prompt (today vs. the 7 day average, slope
+of the last 7 days, this week vs. last week, last 3 hours) with vectorised operations over all
+rows. Series only live in memory, at most `max_users` users are kept (least recently used user is
+dropped).
+"""
+import threading
+from datetime import date, datetime
+
+import numpy as np
+
+from .cache import LRUCache
+
+TOTAL = "all tracked apps"
+
+HOURS = 24 * 8
+DAYS = 7 * 5
+WEEKS = 6
+TREND_DAYS = 7
+
+
+def hour_number(now: datetime) -> int:
+    return now.date().toordinal() * 24 + now.hour
+
+
+def week_number(day: int) -> int:
+    # ordinal 1 (0001-01-01) is a Monday -> weeks start on Monday
+    return (day - 1) // 7
+
+
+class _Rollup:
+    """Ring buffer of (rows x size) minutes, every column stamped with the period it holds."""
+
+    __slots__ = ("values", "stamps")
+
+    def __init__(self, rows: int, size: int):
+        self.values = np.zeros((rows, size), dtype=np.float32)
+        self.stamps = np.full(size, -1, dtype=np.int64)
+
+    def grow(self, rows: int):
+        extra = np.zeros((rows - self.values.shape[0], self.values.shape[1]), dtype=np.float32)
+        self.values = np.vstack([self.values, extra])
+
+    def column(self, period: int) -> int:
+        """Column of `period`, cleared first when it still holds an older period."""
+        column = period % len(self.stamps)
+        if self.stamps[column] != period:
+            self.values[:, column] = 0.0
+            self.stamps[column] = period
+        return column
+
+    def window(self, first: int, last: int) -> tuple[np.ndarray, np.ndarray]:
+        """Values of the periods first..last (rows x periods) and which periods hold data."""
+        periods = np.arange(first, last + 1)
+        columns = periods % len(self.stamps)
+        valid = self.stamps[columns] == periods
+        values = np.where(valid, self.values[:, columns], 0.0)
+        return values, valid
+
+
+class _UserSeries:
+    def __init__(self):
+        self.apps: dict[str, int] = {TOTAL: 0}
+        self.hourly = _Rollup(1, HOURS)
+        self.daily = _Rollup(1, DAYS)
+        self.weekly = _Rollup(1, WEEKS)
+        # cumulative minutes per row of `day` at the last ingest
+        self.last_totals = np.zeros(1, dtype=np.float32)
+        self.day = -1
+
+    def rows(self, apps) -> np.ndarray:
+        for app in apps:
+            if app not in self.apps:
+                self.apps[app] = len(self.apps)
+        size = len(self.apps)
+        if size > len(self.last_totals):
+            for rollup in (self.hourly, self.daily, self.weekly):
+                rollup.grow(size)
+            self.last_totals = np.concatenate([self.last_totals, np.zeros(size - len(self.last_totals), np.float32)])
+        return np.array([self.apps[app] for app in apps], dtype=np.int64)
+
+    def ingest(self, totals: dict[str, float], now: datetime):
+        day = now.date().toordinal()
+        periods = [(self.daily, day), (self.weekly, week_number(day))]
+        if day == self.day:
+            periods.append((self.hourly, hour_number(now)))
+        else:
+            # Android's totals restart at midnight, the first snapshot of the day is the baseline
+            self.last_totals[:] = 0.0
+            self.day = day
+
+        rows = self.rows(list(totals))
+        minutes = np.fromiter(totals.values(), dtype=np.float32, count=len(totals))
+        # a smaller total than last time (other device, clock change) adds nothing
+        increments = np.maximum(minutes - self.last_totals[rows], 0.0)
+        self.last_totals[rows] = np.maximum(minutes, self.last_totals[rows])
+
+        for rollup, period in periods:
+            column = rollup.column(period)
+            rollup.values[rows, column] += increments
+            rollup.values[0, column] += increments.sum()
+
+    def ingest_daily(self, days: np.ndarray, minutes: np.ndarray, today: int):
+        """Totals of past days (sum of the tracked apps, row 0 only) from the app's daily history."""
+        keep = (days < today) & (days > today - DAYS)
+        for day, value in zip(days[keep].tolist(), minutes[keep].tolist()):
+            daily_column = self.daily.column(day)
+            weekly_column = self.weekly.column(week_number(day))
+            self.weekly.values[0, weekly_column] += value - self.daily.values[0, daily_column]
+            self.daily.values[0, daily_column] = value
+
+
+class UsageSeriesStore:
+    def __init__(self, max_users: int = 4096):
+        self.max_users = max_users
+
+        # user_id -> _UserSeries
+        self._users = LRUCache(max_users)
+        self._lock = threading.Lock()
+
+        self.counters = {"ingests": 0, "daily_ingests": 0}
+
+    def ingest(self, user_id: str, totals: dict[str, float], now: datetime | None = None):
+        """Cumulative minutes of today per tracked app (apps without usage can be left out)."""
+        with self._lock:
+            self._user(user_id).ingest(totals, now or datetime.now())
+            self.counters["ingests"] += 1
+
+    def ingest_daily(self, user_id: str, history: list[tuple[date, float]], today: date | None = None):
+        if not history:
+            return
+        days = np.array([day.toordinal() for day, _ in history], dtype=np.int64)
+        minutes = np.array([value for _, value in history], dtype=np.float32)
+        with self._lock:
+            self._user(user_id).ingest_daily(days, minutes, (today or date.today()).toordinal())
+            self.counters["daily_ingests"] += 1
+
+    def features(self, user_id: str, now: datetime | None = None) -> dict | None:
+        """Summary of the usage history per app (TOTAL = all tracked apps), None without history."""
+        now = now or datetime.now()
+        with self._lock:
+            _, user = self._users.lookup(user_id)
+            if user is None:
+                return None
+
+            today = now.date().toordinal()
+            days, valid_days = user.daily.window(today - TREND_DAYS, today - 1)
+            weeks, _ = user.weekly.window(week_number(today) - 1, week_number(today))
+            hours, _ = user.hourly.window(hour_number(now) - 2, hour_number(now))
+            today_minutes, _ = user.daily.window(today, today)
+            apps = list(user.apps)
+
+        observed = int(valid_days.sum())
+        averages = days.sum(axis=1) / observed if observed else np.zeros(len(apps))
+
+        # least squares slope over the observed days, all rows at once
+        x = np.arange(TREND_DAYS, dtype=np.float64)[valid_days]
+        trend = np.zeros(len(apps))
+        if observed >= 3:
+            y = days[:, valid_days]
+            dx = x - x.mean()
+            trend = ((y - y.mean(axis=1, keepdims=True)) * dx).sum(axis=1) / (dx * dx).sum()
+
+        return {
+            app: {
+                "today": float(today_minutes[row, 0]),
+                "average_7d": round(float(averages[row]), 1),
+                "trend_7d": round(float(trend[row]), 1),
+                "this_week": float(weeks[row, 1]),
+                "last_week": float(weeks[row, 0]),
+                "last_3h": float(hours[row].sum()),
+                "observed_days": observed,
+            }
+            for row, app in enumerate(apps)
+        }
+
+    def drop_user(self, user_id: str):
+        with self._lock:
+            self._users.invalidate(user_id)
+
+    def stats(self) -> dict:
+        return {**self.counters, "user_evictions": self._users.evictions, "users": len(self._users)}
+
+    def _user(self, user_id: str) -> _UserSeries:
+        return self._users.get_or_create(user_id, _UserSeries)
+
+
+def _change(today: float, average: float) -> str:
+    if not average:
+        return ""
+    return f" ({(today - average) / average:+.0%})"
+
+
+def features_to_prompt(features: dict | None) -> str:
+    if not features or (not features[TOTAL]["observed_days"] and not features[TOTAL]["last_week"]):
+        return "There is no usage history of the last days yet."
+
+    total = features[TOTAL]
+    lines = [
+        "Usage trend of the tracked apps:",
+        f"- today so far: {total['today']:.0f} min, average of the last 7 days: "
+        f"{total['average_7d']:.0f} min{_change(total['today'], total['average_7d'])}",
+    ]
+    if total["observed_days"] >= 3:
+        direction = "less" if total["trend_7d"] < 0 else "more"
+        lines.append(
+            f"- over the last 7 days the usage changed by {abs(total['trend_7d']):.0f} min per day ({direction})"
+        )
+    lines.append(f"- this week: {total['this_week']:.0f} min, last week: {total['last_week']:.0f} min")
+    lines.append(f"- last 3 hours: {total['last_3h']:.0f} min")
+
+    for app, values in features.items():
+        if app != TOTAL and (values["today"] or values["average_7d"]):
+            lines.append(f"- {app}: today {values['today']:.0f} min, average {values['average_7d']:.0f} min")
+    return "\n    ".join(lines)
@@ -0,0 +1,123 @@
+# %% per-user usage snapshots for delta uploads
+"""
+Server-side copy of the latest Android usage list of every user, so the app only has to send the
+packages that changed instead of the full list (200+ packages) with every request.
+
+Protocol (fields of /echo, /echo/stream and /voice, answer headers):
+
+- request without `usage_version`: `usage` is the full list and replaces the snapshot
+- request with `usage_version`: `usage` only holds the packages whose `totalTimeForeground`
+  changed since that version and is merged into the snapshot
+- request without `usage`: the stored snapshot is used as it is
+- every answer carries the new version in `X-Usage-Version`. `X-Usage-Resync: 1` means the
+  delta did not fit the stored snapshot (other worker, restart, new day). The delta is still merged
+  as well as possible, but the next request has to send the full list again.
+
+Snapshots only live in memory and belong to one day (the usage totals restart at midnight). At
+most `max_users` users are kept (least recently used user is dropped).
+"""
+import threading
+import uuid
+from dataclasses import dataclass, field
+from datetime import date
+
+from .cache import LRUCache
+
+
+def new_version() -> str:
+    # random instead of a counter, so versions of different workers never collide
+    return uuid.uuid4().hex[:16]
+
+
+@dataclass
+class UsageSnapshot:
+    version: str
+    day: date
+    # packageName -> usage item (anything with packageName and totalMinutes)
+    packages: dict = field(default_factory=dict)
+
+    @property
+    def items(self) -> list:
+        return list(self.packages.values())
+
+
+@dataclass
+class UsageUpdate:
+    items: list
+    version: str
+    # the client has to send the full list next time
+    resync: bool = False
+
+
+class UsageSnapshotStore:
+    def __init__(self, max_users: int = 4096):
+        self.max_users = max_users
+
+        # user_id -> UsageSnapshot
+        self._users = LRUCache(max_users)
+        self._lock = threading.Lock()
+
+        self.counters = {
+            "full": 0,
+            "deltas": 0,
+            "resyncs": 0,
+            "stored_only": 0,
+            "received_packages": 0,
+            "merged_packages": 0,
+        }
+
+    def update(
+        self, user_id: str, usage: list | None, base_version: str | None = None, today: date | None = None
+    ) -> UsageUpdate:
+        """Apply a full list / delta / nothing (see the module docstring) and return the merged usage."""
+        today = today or date.today()
+
+        with self._lock:
+            _, snapshot = self._users.lookup(user_id)
+            if snapshot is not None and snapshot.day != today:
+                snapshot = None
+
+            if usage is None:
+                self.counters["stored_only"] += 1
+                if snapshot is None:
+                    # nothing known yet: no usage for this request, full list next time
+                    return UsageUpdate(items=[], version=new_version(), resync=True)
+                return UsageUpdate(items=snapshot.items, version=snapshot.version)
+
+            resync = False
+            if base_version is None:
+                self.counters["full"] += 1
+                packages = {}
+            elif snapshot is not None and snapshot.version == base_version:
+                self.counters["deltas"] += 1
+                packages = snapshot.packages
+            else:
+                self.counters["resyncs"] += 1
+                resync = True
+                packages = snapshot.packages if snapshot is not None else {}
+
+            for item in usage:
+                packages[item.packageName] = item
+
+            self.counters["received_packages"] += len(usage)
+            self.counters["merged_packages"] += len(packages)
+
+            snapshot = UsageSnapshot(version=new_version(), day=today, packages=packages)
+            self._users.put(user_id, snapshot)
+
+            return UsageUpdate(items=snapshot.items, version=snapshot.version, resync=resync)
+
+    def drop_user(self, user_id: str):
+        with self._lock:
+            self._users.invalidate(user_id)
+
+    def stats(self) -> dict:
+        received = self.counters["received_packages"]
+        merged = self.counters["merged_packages"]
+        return {
+            **self.counters,
+            "user_evictions": self._users.evictions,
+            "users": len(self._users),
+            # share of the merged packages that actually had to be sent
+            "sent_share": received / merged if merged else 0.0,
+        }
@@ -2,12 +2,15 @@ import re
 import base64
 import json
 import os
+from datetime import date
 from fastapi import APIRouter, File, UploadFile, Form
 from typing import Any, Dict
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 import src.agent.agent as agent
 import src.agent.supervisor as supervisor
+from src.agent.scheduler import VOICE, priority
+from src.agent.screenshots import Screenshot
 #import src.utilities.parse_tum_cal as calendar_tum
 
 router = APIRouter()
@@ -21,9 +24,20 @@ class UsageItem(BaseModel):
 
 class BaseMessage(BaseModel):
     text: str
-    usage: list[UsageItem]
+    # full list, or only the changed packages since `usage_version` (see src/agent/usage_snapshots.py)
+    usage: list[UsageItem] | None = None
+    usage_version: str | None = None
     user_id: str
     
+class DailyUsage(BaseModel):
+    date: date
+    totalMinutes: int
+
+class UsageHistoryInput(BaseModel):
+    user_id: str
+    # daily sum of the tracked apps, from UsageService.getDailyUsageHistory in the app
+    history: list[DailyUsage]
+    
 class OnboardInput(BaseModel):
     config: Dict[str, Any]
 
@@ -31,32 +45,86 @@ class OnboardInput(BaseModel):
 class SuperviseInput(BaseModel):
     text: list[dict] | Any # or list[ContextEvent]
     image: str | None = None
+
+
+def usage_headers(usage) -> dict:
+    # snapshot version for the next delta, resync -> the next request sends the full list
+    headers = {"X-Usage-Version": usage.version}
+    if usage.resync:
+        headers["X-Usage-Resync"] = "1"
+    return headers
     
 
 @router.post("/echo")
 async def echo(msg: BaseMessage):
+    usage = agent.usage_snapshots.update(msg.user_id, msg.usage, msg.usage_version)
     agent_reply = await agent.ask_for_app_permission(
         user_id=msg.user_id,
         query=msg.text,
-        app_usage=msg.usage,
+        app_usage=usage.items,
         #calendar_tum=[calendar.hardcoded_event] incoming events # Hardcorded calendar
     )
 
     return JSONResponse(
         status_code=200,
         content=agent_reply.dict(),
+        headers=usage_headers(usage),
     )
 
+@router.post("/echo/stream")
+async def echo_stream(msg: BaseMessage):
+    usage = agent.usage_snapshots.update(msg.user_id, msg.usage, msg.usage_version)
+    # Server-Sent Events: verdict first, then the reply token by token, see agent.stream_app_permission
+    return StreamingResponse(
+        agent.stream_app_permission(
+            user_id=msg.user_id,
+            query=msg.text,
+            app_usage=usage.items,
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **usage_headers(usage)},
+    )
+
+@router.post("/usage_history")
+async def usage_history(payload: UsageHistoryInput):
+    # past days for the usage trend in the gatekeeper prompt, see src/agent/usage_series.py
+    agent.usage_series.ingest_daily(payload.user_id, [(day.date, day.totalMinutes) for day in payload.history])
+    return JSONResponse(status_code=200, content={"days": len(payload.history)})
+
 @router.get("/todays_count")
 async def todays_count(user_id: str):
-    n = agent.get_request_number(user_id)
+    n = await agent.get_request_number(user_id)
     response_count = {"daily_count": n}
     print(response_count)
     return response_count
     
+@router.get("/metrics")
+async def metrics():
+    return {
+        "llm": agent.llm.stats(),
+        "scheduler": agent.llm_scheduler.stats(),
+        "caches": agent.get_cache_stats(),
+        "policy": agent.policy_engine.stats(),
+        "decision_cache": agent.decision_cache.stats(),
+        "semantic_index": agent.semantic_index.stats(),
+        "usage_matcher": agent.usage_matchers.stats(),
+        "usage_snapshots": agent.usage_snapshots.stats(),
+        "usage_series": agent.usage_series.stats(),
+        "single_flight": agent.permission_flights.stats(),
+        "context": agent.context_builder.stats(),
+        "prompt_compiler": agent.prompt_compiler.stats(),
+        "routing": agent.model_router.stats(agent.llm.stats()),
+        "calls": {
+            "gatekeeper": agent.gatekeeper_calls.stats(),
+            "supervisor": supervisor.supervisor_calls.stats(),
+        },
+        "prompt_tokens": agent.prompt_tokens.stats(),
+        "screenshots": supervisor.screenshot_preprocessor.stats(),
+    }
+
 @router.post("/onboard")
 async def onboard(payload: OnboardInput):
-    user_id = agent.add_user(payload.config)
+    user_id = await agent.add_user(payload.config)
 
     return JSONResponse(
         status_code=200,
@@ -71,13 +139,16 @@ async def voice(
     file: UploadFile = File(...),
     user_id: str = Form(...),
     usage: str = Form(None),  # JSON string, optional
+    usage_version: str = Form(None),  # `usage` only holds the changes since this version
 ):
     # ---- Read audio ----
     audio_bytes = await file.read()
-    text = agent.transcribe_voice(audio_bytes)
+    # the user waits, but /echo requests go first (see src/agent/scheduler.py)
+    with priority(VOICE):
+        text = await agent.transcribe_voice(audio_bytes)
 
     # ---- Parse usage JSON if provided ----
-    usage_list = []
+    usage_list = None
     if usage:
         try:
             parsed = json.loads(usage)
@@ -85,52 +156,50 @@ async def voice(
         except Exception as e:
             print("Usage parsing error:", e)
 
+    # without (valid) usage the stored snapshot is used
+    merged_usage = agent.usage_snapshots.update(user_id, usage_list, usage_version)
+    if usage and usage_list is None:
+        # the changes of this request are lost, the app has to send everything again
+        merged_usage.resync = True
+
     # ---- Call your agent ----
-    agent_reply = await agent.ask_for_app_permission(
-        user_id=user_id,
-        query=text,
-        app_usage=usage_list
-    )
+    with priority(VOICE):
+        agent_reply = await agent.ask_for_app_permission(
+            user_id=user_id,
+            query=text,
+            app_usage=merged_usage.items
+        )
 
     return JSONResponse(
         status_code=200,
         content=agent_reply.dict(),
+        headers=usage_headers(merged_usage),
     )    
 
 @router.post("/supervise")
 async def supervise(payload: SuperviseInput):
 
-    image_bytes = None
-
-    # ---- Save the image if provided ----
+    # ---- Keep the image in memory (base64 as sent, see src/agent/screenshots.py) ----
+    screenshot = None
     if payload.image:
         try:
-            # decode base64
-            image_bytes = base64.b64decode(payload.image)
-
-            # generate file name
-            file_name = f"img.png"
-
-            # write file
-            with open(file_name, "wb") as f:
-                f.write(image_bytes)
-
-            #print("Saved screenshot to:", file_name)
-
-        except Exception as e:
-            print("Image save error:", e)
+            screenshot = Screenshot.from_base64(payload.image)
+        except ValueError as e:
+            print("Image error:", e)
 
     # ---- Convert events to JSON string ----
     text_for_supervisor = json.dumps(payload.text)
 
     # ---- Call your supervisor logic ----
-    agent_reply = await supervisor.check_goal_follow_through(
-        "682596a5-7863-4419-9138-5f52c2779e61",
-        text_for_supervisor,
-        file_name           # still pass bytes if needed
-    )
-
-    os.remove(file_name)
+    try:
+        agent_reply = await supervisor.check_goal_follow_through(
+            "682596a5-7863-4419-9138-5f52c2779e61",
+            text_for_supervisor,
+            screenshot,
+        )
+    finally:
+        if screenshot is not None:
+            screenshot.close()
 
     return JSONResponse(
         status_code=200,
@@ -1,8 +1,11 @@
+import asyncio
 import typing
 
 import fastapi
 import loguru
 
+from src.agent.helpers import import_legacy_log
+from src.agent.supervisor import screenshot_preprocessor
 from src.repository.events import dispose_db_connection, initialize_db_connection
 
 
@@ -19,3 +22,20 @@ def terminate_backend_server_event_handler(backend_app: fastapi.FastAPI) -> typi
         await dispose_db_connection(backend_app=backend_app)
 
     return stop_backend_server_events
+
+
+def execute_agent_event_handler() -> typing.Any:
+    async def launch_agent_events() -> None:
+        # one-time import of the old log.pkl, off the event loop
+        await asyncio.to_thread(import_legacy_log)
+
+    return launch_agent_events
+
+
+def terminate_agent_event_handler() -> typing.Any:
+    @loguru.logger.catch
+    async def stop_agent_events() -> None:
+        # worker processes of the screenshot preprocessing
+        screenshot_preprocessor.shutdown()
+
+    return stop_agent_events
@@ -6,7 +6,12 @@ import uvicorn
 from fastapi.middleware.cors import CORSMiddleware
 
 from src.api.endpoints import router as api_endpoint_router
-from src.config.events import execute_backend_server_event_handler, terminate_backend_server_event_handler
+from src.config.events import (
+    execute_agent_event_handler,
+    execute_backend_server_event_handler,
+    terminate_agent_event_handler,
+    terminate_backend_server_event_handler,
+)
 from src.config.manager import settings
 from .api.routes.test import router as test_router
 
@@ -45,6 +50,9 @@ def initialize_backend_application() -> fastapi.FastAPI:
             },
         )
 
+    app.router.add_event_handler("startup", execute_agent_event_handler())
+    app.router.add_event_handler("shutdown", terminate_agent_event_handler())
+
     app.include_router(router=api_endpoint_router, prefix=settings.API_PREFIX)
     app.include_router(test_router)
 
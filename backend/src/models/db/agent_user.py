@@ -0,0 +1,20 @@
+import datetime
+
+import sqlalchemy
+from sqlalchemy.orm import Mapped as SQLAlchemyMapped, mapped_column as sqlalchemy_mapped_column
+from sqlalchemy.sql import functions as sqlalchemy_functions
+
+from src.repository.table import Base
+
+
+class AgentUser(Base):  # type: ignore
+    __tablename__ = "agent_user"
+
+    id: SQLAlchemyMapped[str] = sqlalchemy_mapped_column(sqlalchemy.String(length=36), primary_key=True)
+    name: SQLAlchemyMapped[str] = sqlalchemy_mapped_column(sqlalchemy.String(length=64), nullable=False)
+    surname: SQLAlchemyMapped[str] = sqlalchemy_mapped_column(sqlalchemy.String(length=64), nullable=True)
+    joined: SQLAlchemyMapped[datetime.datetime] = sqlalchemy_mapped_column(
+        sqlalchemy.DateTime(timezone=False), nullable=False, server_default=sqlalchemy_functions.now()
+    )
+
+    __mapper_args__ = {"eager_defaults": True}
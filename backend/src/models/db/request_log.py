@@ -0,0 +1,22 @@
+import datetime
+
+import sqlalchemy
+from sqlalchemy.orm import Mapped as SQLAlchemyMapped, mapped_column as sqlalchemy_mapped_column
+
+from src.repository.table import Base
+
+
+class RequestLog(Base):  # type: ignore
+    __tablename__ = "request_log"
+
+    id: SQLAlchemyMapped[int] = sqlalchemy_mapped_column(primary_key=True, autoincrement="auto")
+    user_id: SQLAlchemyMapped[str] = sqlalchemy_mapped_column(
+        sqlalchemy.String(length=36), sqlalchemy.ForeignKey("agent_user.id", ondelete="CASCADE"), nullable=False
+    )
+    query: SQLAlchemyMapped[str] = sqlalchemy_mapped_column(sqlalchemy.Text, nullable=False)
+    answer: SQLAlchemyMapped[dict] = sqlalchemy_mapped_column(sqlalchemy.JSON, nullable=False)
+    date_time: SQLAlchemyMapped[datetime.datetime] = sqlalchemy_mapped_column(
+        sqlalchemy.DateTime(timezone=False), nullable=False
+    )
+
+    __table_args__ = (sqlalchemy.Index("ix_request_log_user_id_date_time", "user_id", "date_time"),)
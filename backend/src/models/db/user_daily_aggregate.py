@@ -0,0 +1,21 @@
+import datetime
+
+import sqlalchemy
+from sqlalchemy.orm import Mapped as SQLAlchemyMapped, mapped_column as sqlalchemy_mapped_column
+
+from src.repository.table import Base
+
+
+class UserDailyAggregate(Base):  # type: ignore
+    __tablename__ = "user_daily_aggregate"
+
+    # one row per user and day, a new day simply starts a new row
+    user_id: SQLAlchemyMapped[str] = sqlalchemy_mapped_column(sqlalchemy.String(length=36), primary_key=True)
+    day: SQLAlchemyMapped[datetime.date] = sqlalchemy_mapped_column(sqlalchemy.Date, primary_key=True)
+    requests: SQLAlchemyMapped[int] = sqlalchemy_mapped_column(sqlalchemy.Integer, nullable=False, default=0)
+    allows: SQLAlchemyMapped[int] = sqlalchemy_mapped_column(sqlalchemy.Integer, nullable=False, default=0)
+    denies: SQLAlchemyMapped[int] = sqlalchemy_mapped_column(sqlalchemy.Integer, nullable=False, default=0)
+    minutes_granted: SQLAlchemyMapped[int] = sqlalchemy_mapped_column(sqlalchemy.Integer, nullable=False, default=0)
+    last_decision_time: SQLAlchemyMapped[datetime.datetime] = sqlalchemy_mapped_column(
+        sqlalchemy.DateTime(timezone=False), nullable=True
+    )
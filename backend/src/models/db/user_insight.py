@@ -0,0 +1,28 @@
+import datetime
+
+import sqlalchemy
+from sqlalchemy.orm import Mapped as SQLAlchemyMapped, mapped_column as sqlalchemy_mapped_column
+
+from src.repository.table import Base
+
+
+class UserInsight(Base):  # type: ignore
+    __tablename__ = "user_insight"
+
+    # one row per user, every run of the behaviour analysis replaces it
+    user_id: SQLAlchemyMapped[str] = sqlalchemy_mapped_column(
+        sqlalchemy.String(length=36), sqlalchemy.ForeignKey("agent_user.id", ondelete="CASCADE"), primary_key=True
+    )
+    generated_at: SQLAlchemyMapped[datetime.datetime] = sqlalchemy_mapped_column(
+        sqlalchemy.DateTime(timezone=False), nullable=False
+    )
+    period_start: SQLAlchemyMapped[datetime.datetime] = sqlalchemy_mapped_column(
+        sqlalchemy.DateTime(timezone=False), nullable=False
+    )
+    period_end: SQLAlchemyMapped[datetime.datetime] = sqlalchemy_mapped_column(
+        sqlalchemy.DateTime(timezone=False), nullable=False
+    )
+    summary: SQLAlchemyMapped[str] = sqlalchemy_mapped_column(sqlalchemy.Text, nullable=False)
+    patterns: SQLAlchemyMapped[list] = sqlalchemy_mapped_column(sqlalchemy.JSON, nullable=False)
+    recommendation: SQLAlchemyMapped[str] = sqlalchemy_mapped_column(sqlalchemy.Text, nullable=False)
+    stats: SQLAlchemyMapped[dict] = sqlalchemy_mapped_column(sqlalchemy.JSON, nullable=False)
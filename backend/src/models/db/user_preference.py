@@ -0,0 +1,27 @@
+import datetime
+
+import sqlalchemy
+from sqlalchemy.orm import Mapped as SQLAlchemyMapped, mapped_column as sqlalchemy_mapped_column
+
+from src.repository.table import Base
+
+
+class UserPreference(Base):  # type: ignore
+    __tablename__ = "user_preference"
+
+    id: SQLAlchemyMapped[int] = sqlalchemy_mapped_column(primary_key=True, autoincrement="auto")
+    user_id: SQLAlchemyMapped[str] = sqlalchemy_mapped_column(
+        sqlalchemy.String(length=36), sqlalchemy.ForeignKey("agent_user.id", ondelete="CASCADE"), nullable=False
+    )
+    date_time: SQLAlchemyMapped[datetime.datetime] = sqlalchemy_mapped_column(
+        sqlalchemy.DateTime(timezone=False), nullable=False
+    )
+    preference: SQLAlchemyMapped[str] = sqlalchemy_mapped_column(sqlalchemy.Text, nullable=False)
+    preferred_personality: SQLAlchemyMapped[str] = sqlalchemy_mapped_column(
+        sqlalchemy.String(length=32), nullable=False
+    )
+    selected_apps: SQLAlchemyMapped[list] = sqlalchemy_mapped_column(sqlalchemy.JSON, nullable=False)
+    time_factors: SQLAlchemyMapped[list] = sqlalchemy_mapped_column(sqlalchemy.JSON, nullable=True)
+    target_minutes: SQLAlchemyMapped[int] = sqlalchemy_mapped_column(sqlalchemy.Integer, nullable=True)
+
+    __table_args__ = (sqlalchemy.Index("ix_user_preference_user_id_date_time", "user_id", "date_time"),)
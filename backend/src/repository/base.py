@@ -1,2 +1,7 @@
 from src.models.db.account import Account
+from src.models.db.agent_user import AgentUser
+from src.models.db.request_log import RequestLog
+from src.models.db.user_daily_aggregate import UserDailyAggregate
+from src.models.db.user_insight import UserInsight
+from src.models.db.user_preference import UserPreference
 from src.repository.table import Base
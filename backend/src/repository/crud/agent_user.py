@@ -0,0 +1,35 @@
+import datetime
+
+import sqlalchemy
+
+from src.models.db.agent_user import AgentUser
+from src.repository.crud.base import BaseCRUDRepository
+from src.utilities.exceptions.database import EntityDoesNotExist
+
+
+class AgentUserCRUDRepository(BaseCRUDRepository):
+    async def create_user(
+        self, id: str, name: str, surname: str, joined: datetime.datetime, commit: bool = True
+    ) -> AgentUser:
+        new_user = AgentUser(id=id, name=name, surname=surname, joined=joined)
+
+        self.async_session.add(instance=new_user)
+        if not commit:
+            # part of a larger transaction, the caller commits
+            await self.async_session.flush()
+            return new_user
+
+        await self.async_session.commit()
+        await self.async_session.refresh(instance=new_user)
+
+        return new_user
+
+    async def read_user_by_id(self, id: str) -> AgentUser:
+        stmt = sqlalchemy.select(AgentUser).where(AgentUser.id == id)
+        query = await self.async_session.execute(statement=stmt)
+        db_user = query.scalar()
+
+        if not db_user:
+            raise EntityDoesNotExist(f"User with id `{id}` does not exist!")
+
+        return db_user  # type: ignore
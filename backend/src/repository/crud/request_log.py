@@ -0,0 +1,87 @@
+import datetime
+import typing
+
+import sqlalchemy
+
+from src.models.db.request_log import RequestLog
+from src.repository.crud.base import BaseCRUDRepository
+from src.utilities.exceptions.database import EntityDoesNotExist
+
+
+class RequestLogCRUDRepository(BaseCRUDRepository):
+    async def create_log(
+        self, user_id: str, query: str, answer: dict, date_time: datetime.datetime, commit: bool = True
+    ) -> RequestLog:
+        new_log = RequestLog(user_id=user_id, query=query, answer=answer, date_time=date_time)
+
+        self.async_session.add(instance=new_log)
+        if not commit:
+            # part of a larger transaction, the caller commits
+            await self.async_session.flush()
+            return new_log
+
+        await self.async_session.commit()
+
+        return new_log
+
+    async def read_logs_by_user_id(
+        self, user_id: str, since: datetime.datetime | None = None
+    ) -> typing.Sequence[RequestLog]:
+        stmt = sqlalchemy.select(RequestLog).where(RequestLog.user_id == user_id)
+
+        if since is not None:
+            stmt = stmt.where(RequestLog.date_time >= since)
+
+        stmt = stmt.order_by(RequestLog.date_time)
+        query = await self.async_session.execute(statement=stmt)
+        return query.scalars().all()
+
+    async def read_logs_since(self, since: datetime.datetime) -> typing.Sequence[RequestLog]:
+        # all users, for batch jobs
+        stmt = sqlalchemy.select(RequestLog).where(RequestLog.date_time >= since).order_by(RequestLog.date_time)
+        query = await self.async_session.execute(statement=stmt)
+        return query.scalars().all()
+
+    async def read_recent_logs_by_user_id(self, user_id: str, limit: int) -> typing.Sequence[RequestLog]:
+        stmt = (
+            sqlalchemy.select(RequestLog)
+            .where(RequestLog.user_id == user_id)
+            .order_by(RequestLog.date_time.desc())
+            .limit(limit)
+        )
+        query = await self.async_session.execute(statement=stmt)
+        # oldest first, like read_logs_by_user_id
+        return list(reversed(query.scalars().all()))
+
+    async def read_last_log_by_user_id(self, user_id: str) -> RequestLog:
+        stmt = (
+            sqlalchemy.select(RequestLog)
+            .where(RequestLog.user_id == user_id)
+            .order_by(RequestLog.date_time.desc())
+            .limit(1)
+        )
+        query = await self.async_session.execute(statement=stmt)
+        db_log = query.scalar()
+
+        if not db_log:
+            raise EntityDoesNotExist(f"Log for user with id `{user_id}` does not exist!")
+
+        return db_log  # type: ignore
+
+    async def count_logs_by_user_id(self, user_id: str, since: datetime.datetime) -> int:
+        stmt = (
+            sqlalchemy.select(sqlalchemy.func.count())
+            .select_from(RequestLog)
+            .where(RequestLog.user_id == user_id, RequestLog.date_time >= since)
+        )
+        query = await self.async_session.execute(statement=stmt)
+        return query.scalar() or 0
+
+    async def delete_logs_by_user_id(self, user_id: str, commit: bool = True) -> str:
+        stmt = sqlalchemy.delete(table=RequestLog).where(RequestLog.user_id == user_id)
+
+        await self.async_session.execute(statement=stmt)
+        if commit:
+            await self.async_session.commit()
+
+        return f"Logs of user with id '{user_id}' are successfully deleted!"
@@ -0,0 +1,61 @@
+import datetime
+
+import sqlalchemy
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+
+from src.models.db.user_daily_aggregate import UserDailyAggregate
+from src.repository.crud.base import BaseCRUDRepository
+from src.utilities.exceptions.database import EntityDoesNotExist
+
+
+class UserDailyAggregateCRUDRepository(BaseCRUDRepository):
+    async def upsert_decision(
+        self, user_id: str, answer: dict, date_time: datetime.datetime, commit: bool = True
+    ) -> None:
+        allow = bool(answer.get("allow")) if isinstance(answer, dict) else None
+        minutes = int(answer.get("time") or 0) if allow else 0
+
+        stmt = postgresql_insert(UserDailyAggregate).values(
+            user_id=user_id,
+            day=date_time.date(),
+            requests=1,
+            allows=1 if allow else 0,
+            denies=1 if allow is False else 0,
+            minutes_granted=minutes,
+            last_decision_time=date_time,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserDailyAggregate.user_id, UserDailyAggregate.day],
+            set_={
+                "requests": UserDailyAggregate.requests + stmt.excluded.requests,
+                "allows": UserDailyAggregate.allows + stmt.excluded.allows,
+                "denies": UserDailyAggregate.denies + stmt.excluded.denies,
+                "minutes_granted": UserDailyAggregate.minutes_granted + stmt.excluded.minutes_granted,
+                "last_decision_time": sqlalchemy.func.greatest(
+                    UserDailyAggregate.last_decision_time, stmt.excluded.last_decision_time
+                ),
+            },
+        )
+
+        await self.async_session.execute(statement=stmt)
+        if commit:
+            await self.async_session.commit()
+
+    async def read_aggregate(self, user_id: str, day: datetime.date) -> UserDailyAggregate:
+        stmt = sqlalchemy.select(UserDailyAggregate).where(
+            UserDailyAggregate.user_id == user_id, UserDailyAggregate.day == day
+        )
+        query = await self.async_session.execute(statement=stmt)
+        db_aggregate = query.scalar()
+
+        if not db_aggregate:
+            raise EntityDoesNotExist(f"Aggregate for user with id `{user_id}` on `{day}` does not exist!")
+
+        return db_aggregate  # type: ignore
+
+    async def delete_aggregates_by_user_id(self, user_id: str, commit: bool = True) -> None:
+        stmt = sqlalchemy.delete(table=UserDailyAggregate).where(UserDailyAggregate.user_id == user_id)
+
+        await self.async_session.execute(statement=stmt)
+        if commit:
+            await self.async_session.commit()
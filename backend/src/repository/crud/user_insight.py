@@ -0,0 +1,43 @@
+import sqlalchemy
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+
+from src.models.db.user_insight import UserInsight
+from src.repository.crud.base import BaseCRUDRepository
+from src.utilities.exceptions.database import EntityDoesNotExist
+
+
+class UserInsightCRUDRepository(BaseCRUDRepository):
+    async def upsert_insights(self, insights: list[dict]) -> None:
+        """Insert or replace the insight rows (keys as the UserInsight columns) of several users."""
+        if not insights:
+            return
+
+        stmt = postgresql_insert(UserInsight).values(insights)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserInsight.user_id],
+            set_={
+                column: stmt.excluded[column]
+                for column in (
+                    "generated_at",
+                    "period_start",
+                    "period_end",
+                    "summary",
+                    "patterns",
+                    "recommendation",
+                    "stats",
+                )
+            },
+        )
+
+        await self.async_session.execute(statement=stmt)
+        await self.async_session.commit()
+
+    async def read_insight_by_user_id(self, user_id: str) -> UserInsight:
+        stmt = sqlalchemy.select(UserInsight).where(UserInsight.user_id == user_id)
+        query = await self.async_session.execute(statement=stmt)
+        db_insight = query.scalar()
+
+        if not db_insight:
+            raise EntityDoesNotExist(f"Insight for user with id `{user_id}` does not exist!")
+
+        return db_insight  # type: ignore
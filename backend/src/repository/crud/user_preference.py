@@ -0,0 +1,57 @@
+import datetime
+
+import sqlalchemy
+
+from src.models.db.user_preference import UserPreference
+from src.repository.crud.base import BaseCRUDRepository
+from src.utilities.exceptions.database import EntityDoesNotExist
+
+
+class UserPreferenceCRUDRepository(BaseCRUDRepository):
+    async def create_preference(
+        self,
+        user_id: str,
+        date_time: datetime.datetime,
+        preference: str,
+        preferred_personality: str,
+        selected_apps: list[str],
+        time_factors: list[int] | None = None,
+        target_minutes: int | None = None,
+        commit: bool = True,
+    ) -> UserPreference:
+        new_preference = UserPreference(
+            user_id=user_id,
+            date_time=date_time,
+            preference=preference,
+            preferred_personality=preferred_personality,
+            selected_apps=selected_apps,
+            time_factors=time_factors,
+            target_minutes=target_minutes,
+        )
+
+        self.async_session.add(instance=new_preference)
+        if not commit:
+            # part of a larger transaction, the caller commits
+            await self.async_session.flush()
+            return new_preference
+
+        await self.async_session.commit()
+        await self.async_session.refresh(instance=new_preference)
+
+        return new_preference
+
+    async def read_latest_preference_by_user_id(self, user_id: str) -> UserPreference:
+        # index seek on (user_id, date_time), newest row first
+        stmt = (
+            sqlalchemy.select(UserPreference)
+            .where(UserPreference.user_id == user_id)
+            .order_by(UserPreference.date_time.desc())
+            .limit(1)
+        )
+        query = await self.async_session.execute(statement=stmt)
+        db_preference = query.scalar()
+
+        if not db_preference:
+            raise EntityDoesNotExist(f"Preference for user with id `{user_id}` does not exist!")
+
+        return db_preference  # type: ignore
@@ -24,6 +24,9 @@ class AsyncDatabase:
             poolclass=SQLAlchemyQueuePool,
         )
         self.async_session: SQLAlchemyAsyncSession = SQLAlchemyAsyncSession(bind=self.async_engine)
+        self.async_session_factory: sqlalchemy_async_sessionmaker[SQLAlchemyAsyncSession] = (
+            sqlalchemy_async_sessionmaker(bind=self.async_engine, expire_on_commit=False)
+        )
         self.pool: SQLAlchemyPool = self.async_engine.pool
 
     @property
@@ -0,0 +1,27 @@
+"""request log user foreign key
+
+Revision ID: b395c8e3b911
+Revises: 9d4c2a7e8b13
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b395c8e3b911"
+down_revision = "9d4c2a7e8b13"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # logs of deleted or unknown users can not satisfy the constraint
+    op.execute("DELETE FROM request_log WHERE user_id NOT IN (SELECT id FROM agent_user)")
+    op.create_foreign_key(
+        "request_log_user_id_fkey", "request_log", "agent_user", ["user_id"], ["id"], ondelete="CASCADE"
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("request_log_user_id_fkey", "request_log", type_="foreignkey")
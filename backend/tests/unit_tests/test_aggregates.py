@@ -0,0 +1,26 @@
+from datetime import date, datetime, timedelta
+
+from src.agent.aggregates import DailyAggregates
+from src.agent.log_store import LogStore
+
+
+def test_daily_aggregates_follow_the_log_store(tmp_path) -> None:
+    aggregates = DailyAggregates()
+    store = LogStore(tmp_path, listeners=[aggregates])
+    now = datetime.now().replace(microsecond=0)
+
+    store.append("mikey", "yesterday", {"allow": True, "time": 30, "reply": "ok"}, now - timedelta(days=1))
+    store.append("mikey", "5 more minutes", {"allow": True, "time": 5, "reply": "ok"}, now)
+    store.append("mikey", "just bored", {"allow": False, "time": 0, "reply": "no"}, now)
+
+    today = aggregates.get("mikey")
+    assert (today.requests, today.allows, today.denies, today.minutes_granted) == (2, 1, 1, 5)
+
+    # a second store on the same files rebuilds the same row from the segments
+    assert DailyAggregates().get("nobody").day == date.today()
+    rebuilt = DailyAggregates()
+    LogStore(tmp_path, listeners=[rebuilt])
+    assert rebuilt.get("mikey") == today
+
+    store.delete_user("mikey")
+    assert aggregates.get("mikey").requests == 0
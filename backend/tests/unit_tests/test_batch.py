@@ -0,0 +1,72 @@
+import json
+from types import SimpleNamespace
+
+from pydantic import BaseModel
+
+from src.agent.batch import BatchJob, Checkpoint, LocalBatchRunner, OpenAIBatchRunner
+
+
+async def test_local_batch_runner_results_and_errors() -> None:
+    async def answer(job: BatchJob) -> dict:
+        if job.custom_id == "broken":
+            raise ValueError("no answer")
+        return {"summary": f"summary of {job.custom_id}"}
+
+    runner = LocalBatchRunner(answer)
+    jobs = [BatchJob(custom_id=user_id, messages=[], prompt_cache_key="key") for user_id in ["mikey", "broken"]]
+    batch_id = await runner.submit(jobs)
+
+    results = await runner.results(batch_id)
+    assert results is not None
+    assert results["mikey"] == {"summary": "summary of mikey"}
+    assert "no answer" in results["broken"]
+    # results are handed out once, an unknown batch has to be submitted again
+    assert await runner.results(batch_id) is None
+
+
+class _Insight(BaseModel):
+    summary: str
+
+
+def _result_line(custom_id: str, text: str) -> str:
+    body = {"output": [{"type": "message", "content": [{"type": "output_text", "text": text}]}]}
+    return json.dumps({"custom_id": custom_id, "response": {"status_code": 200, "body": body}})
+
+
+async def test_openai_batch_runner_reports_malformed_rows_per_job() -> None:
+    lines = [
+        _result_line("mikey", '{"summary": "fine"}'),
+        _result_line("broken_json", '{"summary": '),
+        _result_line("wrong_schema", '{"patterns": []}'),
+        "not json at all",
+    ]
+
+    async def retrieve(batch_id):
+        return SimpleNamespace(status="completed", output_file_id="out", error_file_id=None)
+
+    async def content(file_id):
+        return SimpleNamespace(text="\n".join(lines))
+
+    client = SimpleNamespace(batches=SimpleNamespace(retrieve=retrieve), files=SimpleNamespace(content=content))
+    results = await OpenAIBatchRunner(client, model="gpt-5.1", response_format=_Insight).results("batch-1")
+
+    assert results is not None
+    assert results["mikey"] == {"summary": "fine"}
+    assert results["broken_json"].startswith("batch error: JSONDecodeError")
+    assert results["wrong_schema"].startswith("batch error: ValidationError")
+    assert len(results) == 3
+
+
+def test_checkpoint_round_trip(tmp_path) -> None:
+    path = tmp_path / "checkpoint.json"
+    assert Checkpoint.load(path) is None
+
+    checkpoint = Checkpoint(
+        run_id="2025-11-23:7d", period_start="2025-11-16T09:00:00", period_end="2025-11-23T09:00:00"
+    )
+    checkpoint.pending["batch-1"] = ["mikey"]
+    checkpoint.done.append("donatello")
+    checkpoint.save(path)
+
+    assert Checkpoint.load(path) == checkpoint
+    assert not (tmp_path / "checkpoint.json.tmp").exists()
@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import pandas as pd
+
+from src.agent.behaviour_stats import aggregate_behaviour, stats_to_dict, stats_to_prompt
+
+
+def test_aggregate_behaviour_per_user() -> None:
+    entries = [
+        {
+            "user_id": "mikey",
+            "query": "Answer my sister",
+            "answer": {"allow": True, "time": 10, "reply": "ok"},
+            "date_time": datetime(2025, 11, 23, 7, 30),
+        },
+        {
+            "user_id": "mikey",
+            "query": "answer my sister!",
+            "answer": {"allow": True, "time": 5, "reply": "ok"},
+            "date_time": datetime(2025, 11, 23, 7, 50),
+        },
+        {
+            "user_id": "mikey",
+            "query": "just bored",
+            "answer": {"allow": False, "time": 0, "reply": "no"},
+            "date_time": datetime(2025, 11, 24, 23, 10),
+        },
+        {
+            "user_id": "donatello",
+            "query": "hello",
+            "answer": {"reply": "no verdict"},
+            "date_time": datetime(2025, 11, 23, 12, 0),
+        },
+    ]
+    usage = pd.DataFrame(
+        [
+            {"user_id": "mikey", "date_time": datetime(2025, 11, 23, 8), "app": "instagram", "minutes": 20},
+            {"user_id": "mikey", "date_time": datetime(2025, 11, 23, 20), "app": "instagram", "minutes": 10},
+            {"user_id": "mikey", "date_time": datetime(2025, 11, 24, 20), "app": "instagram", "minutes": 10},
+        ]
+    )
+
+    stats = aggregate_behaviour(entries, usage)
+
+    mikey = stats_to_dict(stats.loc["mikey"])
+    assert (mikey["requests"], mikey["allows"], mikey["denies"]) == (3, 2, 1)
+    assert mikey["minutes_granted"] == 15
+    assert mikey["active_days"] == 2
+    assert mikey["requests_by_time"] == {"morning": 2, "work": 0, "evening": 0, "late": 1}
+    assert mikey["busiest_hour"] == 7
+    assert mikey["top_reasons"][0] == ["answer my sister", 2]
+    assert mikey["usage_minutes_per_day"] == {"instagram": 20.0}
+
+    donatello = stats_to_dict(stats.loc["donatello"])
+    assert (donatello["allows"], donatello["denies"], donatello["minutes_granted"]) == (0, 0, 0)
+    assert donatello["usage_minutes_per_day"] == {}
+
+    prompt = stats_to_prompt(mikey, days=7)
+    assert "3 requests on 2 days" in prompt
+    assert '"answer my sister" (2x)' in prompt
+    assert "instagram: 20.0 min per day" in prompt
+
+
+def test_aggregate_behaviour_without_entries() -> None:
+    assert aggregate_behaviour([]).empty
@@ -0,0 +1,51 @@
+import os
+
+from src.agent.cache import FileBackedCache, LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used() -> None:
+    cache = LRUCache(max_entries=2)
+    cache.put("mikey", "Mikey")
+    cache.put("donatello", "Donatello")
+    cache.lookup("mikey")
+    cache.put("peter", "Peter")
+
+    assert cache.lookup("donatello") == (False, None)
+    assert cache.lookup("mikey") == (True, "Mikey")
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["hits"] == 2
+
+
+def test_lru_cache_reports_evicted_entries() -> None:
+    evicted = []
+    cache = LRUCache(max_entries=1, on_evict=lambda key, value: evicted.append((key, value)))
+    cache.put("mikey", "Mikey")
+    cache.put("donatello", "Donatello")
+    cache.invalidate("donatello")
+
+    assert evicted == [("mikey", "Mikey")]
+
+
+def test_lru_cache_get_or_create() -> None:
+    cache = LRUCache(max_entries=2)
+
+    assert cache.get_or_create("mikey", list) == []
+    cache.get_or_create("mikey", list).append("request")
+    assert cache.lookup("mikey") == (True, ["request"])
+    assert "mikey" in cache and "donatello" not in cache
+    assert cache.stats()["misses"] == 1 and cache.stats()["hits"] == 2
+
+
+def test_file_backed_cache_drops_entries_when_file_changes(tmp_path) -> None:
+    path = tmp_path / "users.pkl"
+    path.write_bytes(b"v1")
+    cache = FileBackedCache(path)
+    cache.put("mikey", "Mikey")
+
+    assert cache.lookup("mikey") == (True, "Mikey")
+
+    path.write_bytes(b"v2 with another size")
+    os.utime(path, ns=(1, 1))
+
+    assert cache.lookup("mikey") == (False, None)
+    assert cache.stats()["file_invalidations"] == 1
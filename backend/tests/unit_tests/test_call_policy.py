@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from src.agent.call_policy import CallPolicy, CircuitBreaker, CircuitOpenError
+from src.agent.llm_client import LLMTimeoutError
+
+
+async def test_call_policy_hedges_slow_requests() -> None:
+    policy = CallPolicy("test", deadline_seconds=1.0, default_hedge_delay=0.02)
+    delays = [0.5, 0.01]
+
+    async def request():
+        delay = delays.pop(0)
+        await asyncio.sleep(delay)
+        return delay
+
+    assert await policy.run(request) == 0.01
+    assert policy.stats()["hedged"] == 1
+    assert policy.stats()["hedge_wins"] == 1
+
+
+async def test_call_policy_deadline_and_circuit_breaker() -> None:
+    policy = CallPolicy(
+        "test", deadline_seconds=0.02, hedge=False, breaker=CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    )
+
+    for _ in range(2):
+        with pytest.raises(LLMTimeoutError):
+            await policy.run(lambda: asyncio.sleep(1))
+
+    assert policy.stats()["breaker"] == "open"
+    with pytest.raises(CircuitOpenError):
+        await policy.run(lambda: asyncio.sleep(0, result="ok"))
+
+    # after reset_seconds one trial call closes the breaker again
+    await asyncio.sleep(0.06)
+    assert await policy.run(lambda: asyncio.sleep(0, result="ok")) == "ok"
+    assert policy.stats()["breaker"] == "closed"
+    assert policy.stats()["deadline_exceeded"] == 2
+    assert policy.stats()["short_circuited"] == 1
+
+
+async def test_call_policy_cancelled_attempts_time_out() -> None:
+    policy = CallPolicy("test", deadline_seconds=1.0, hedge=False)
+
+    async def request():
+        raise asyncio.CancelledError()
+
+    with pytest.raises(LLMTimeoutError):
+        await policy.run(request)
+    assert policy.stats()["failures"] == 1
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+from src.agent.context_builder import compact_entry, ContextBuilder, count_tokens
+
+
+def _entries(n: int, start: datetime = datetime(2025, 11, 23, 8, 0)) -> list:
+    return [
+        {
+            "user_id": "mikey",
+            "query": "just 5 more minutes" if i % 2 else f"answer message number {i}",
+            "answer": {"allow": i % 3 != 0, "time": 5, "reply": "Okay, but then back to work " * 5},
+            "date_time": start + timedelta(minutes=10 * i),
+        }
+        for i in range(n)
+    ]
+
+
+def test_compact_entry() -> None:
+    entry = _entries(2)[1]
+    assert compact_entry(entry, max_reply_chars=10) == "08:10 | allow 5 min | just 5 more minutes | reply: Okay, b..."
+
+
+def test_history_is_summarized_and_bounded() -> None:
+    builder = ContextBuilder(max_tokens=10_000, recent_entries=3)
+    history = builder.history("mikey", _entries(10))
+
+    assert history.text.startswith(
+        "Earlier requests (since 08:00): 7 requests, 4 allowed (20 minutes granted), 3 denied."
+    )
+    assert '"just 5 more minutes" (3x)' in history.text
+    assert len(history.text.splitlines()) == 4
+
+    # one more request only folds one more entry into the summary
+    builder.history("mikey", _entries(11))
+    assert builder.stats()["folded"] == 8
+    assert builder.stats()["rebuilds"] == 0
+
+    small = ContextBuilder(max_tokens=80, recent_entries=8)
+    for n in (10, 100, 1000):
+        history = small.history("mikey", _entries(n))
+        assert history.tokens["summary"] + history.tokens["recent"] <= 80
+        assert count_tokens(history.text) <= 80
+        kept = len(history.text.splitlines()) - 1
+        assert f": {n - kept} requests" in history.text
+
+
+def test_history_slides_with_the_time_window() -> None:
+    builder = ContextBuilder(recent_entries=2)
+    builder.history("mikey", _entries(6))
+    history = builder.history("mikey", _entries(7)[2:])
+
+    # two entries left the window, one new entry became old enough for the summary
+    assert history.text.startswith("Earlier requests (since 08:20): 3 requests")
+    assert builder.stats()["rebuilds"] == 0
+    assert builder.stats()["unfolded"] == 2
+    assert builder.stats()["folded"] == 5
+
+    # log deleted and written again
+    history = builder.history("mikey", _entries(4, start=datetime(2025, 11, 23, 12, 0)))
+    assert history.text.startswith("Earlier requests (since 12:00): 2 requests")
+
+
+def test_history_folds_entries_of_the_same_second() -> None:
+    builder = ContextBuilder(recent_entries=1)
+    same_second = [{**entry, "date_time": datetime(2025, 11, 23, 8, 0)} for entry in _entries(4)]
+
+    builder.history("mikey", same_second[:2])
+    history = builder.history("mikey", same_second)
+
+    assert ": 3 requests" in history.text
+    assert builder.stats()["folded"] == 3
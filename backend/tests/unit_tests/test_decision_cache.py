@@ -0,0 +1,57 @@
+from datetime import datetime
+
+from src.agent.decision_cache import DecisionCache, normalize_query
+
+
+def test_normalize_query() -> None:
+    assert normalize_query("  Just 5 more   MINUTES!! ") == "just 5 more minutes"
+
+
+def test_decision_cache_reuses_decisions_in_the_same_context() -> None:
+    cache = DecisionCache(reuse_probability=1.0)
+    now = datetime(2025, 11, 23, 14, 0)
+    key = cache.key("mikey", "just 5 more minutes", "chill", usage_minutes=20, requests_today=2, now=now)
+    cache.put(key, "allow 5")
+
+    same_context = cache.key("mikey", "Just 5 more minutes!", "chill", usage_minutes=25, requests_today=3, now=now)
+    other_context = cache.key("mikey", "just 5 more minutes", "chill", usage_minutes=95, requests_today=3, now=now)
+
+    assert cache.get(same_context) == "allow 5"
+    assert cache.get(other_context) is None
+
+    cache.invalidate_user("mikey")
+    assert cache.get(key) is None
+
+
+def test_decision_cache_keeps_decisions_of_other_queries() -> None:
+    cache = DecisionCache(reuse_probability=1.0)
+    now = datetime(2025, 11, 23, 14, 0)
+    five_more = cache.key("mikey", "just 5 more minutes", "chill", usage_minutes=20, requests_today=1, now=now)
+    cache.put(five_more, "allow 5")
+    cache.put(cache.key("mikey", "answer a friend", "chill", usage_minutes=20, requests_today=2, now=now), "allow 2")
+
+    # the first question again, after the other decision was logged
+    again = cache.key("mikey", "just 5 more minutes", "chill", usage_minutes=20, requests_today=3, now=now)
+    assert cache.get(again) == "allow 5"
+    assert cache.stats()["hits"] == 1
+
+
+def test_decision_cache_ttl_lru_and_variability() -> None:
+    now = datetime(2025, 11, 23, 14, 0)
+
+    expired = DecisionCache(ttl_seconds=-1, reuse_probability=1.0)
+    key = expired.key("mikey", "yo please", "chill", 0, 0, now)
+    expired.put(key, "deny")
+    assert expired.get(key) is None
+    assert expired.stats()["expired"] == 1
+
+    small = DecisionCache(max_entries=1, reuse_probability=1.0)
+    small.put(small.key("mikey", "a", "chill", 0, 0, now), "deny")
+    small.put(small.key("mikey", "b", "chill", 0, 0, now), "deny")
+    assert small.stats()["entries"] == 1 and small.stats()["evictions"] == 1
+
+    never = DecisionCache(reuse_probability=0.0)
+    key = never.key("mikey", "yo please", "chill", 0, 0, now)
+    never.put(key, "deny")
+    assert never.get(key) is None
+    assert never.stats()["bypassed"] == 1
@@ -0,0 +1,59 @@
+import base64
+import io
+
+import pytest
+
+from src.agent.image_preprocess import preprocess_image, PreprocessOptions, ScreenshotPreprocessor, vision_tokens
+from src.agent.screenshots import Screenshot
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def screenshot_png(width: int = 1080, height: int = 2400) -> str:
+    image = Image.linear_gradient("L").resize((width, height)).convert("RGBA")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def test_vision_tokens() -> None:
+    assert vision_tokens(1080, 2400) == 85 + 170 * 8
+    assert vision_tokens(461, 1024) == 85 + 170 * 2
+
+
+def test_preprocess_image_crops_resizes_and_reencodes() -> None:
+    options = PreprocessOptions(max_edge=1024, format="jpeg", quality=70, crop_top=0.05, crop_bottom=0.05)
+
+    result = preprocess_image(screenshot_png(), options)
+
+    assert result.original_size == (1080, 2400)
+    assert max(result.size) == 1024
+    assert result.media_type == "image/jpeg"
+    assert Image.open(io.BytesIO(base64.b64decode(result.data))).format == "JPEG"
+
+    # spilled frames are read from their file
+    spilled = Screenshot.from_base64(screenshot_png(), spill_bytes=16)
+    try:
+        assert spilled.path is not None
+        assert preprocess_image(spilled.path, options) == result
+    finally:
+        spilled.close()
+
+
+async def test_screenshot_preprocessor_reports_savings() -> None:
+    preprocessor = ScreenshotPreprocessor(PreprocessOptions(max_edge=1024, format="webp"), workers=1)
+    original = Screenshot.from_base64(screenshot_png())
+    try:
+        processed = await preprocessor.run(original)
+    finally:
+        preprocessor.shutdown()
+
+    assert processed.media_type == "image/webp"
+    assert processed.size < original.size
+    stats = preprocessor.stats()
+    assert stats["processed"] == 1
+    assert stats["bytes_saved"] == original.size - processed.size
+    assert stats["tokens_saved"] == vision_tokens(1080, 2400) - vision_tokens(461, 1024)
+
+    disabled = ScreenshotPreprocessor(enabled=False)
+    assert await disabled.run(original) is original
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from src.agent.llm_client import LLMClient, LLMTimeoutError, parse_float_limits, parse_model_limits
+
+
+async def test_llm_client_limits_in_flight_calls_per_model() -> None:
+    llm = LLMClient(client=None, model_limits={"gpt-5.1": 2})
+    running = 0
+    peak = 0
+
+    async def request():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return "ok"
+
+    results = await asyncio.gather(*[llm.call("gpt-5.1", request) for _ in range(6)])
+
+    assert results == ["ok"] * 6
+    assert peak == 2
+    assert llm.stats()["gpt-5.1"]["calls"] == 6
+    assert llm.stats()["gpt-5.1"]["max_waiting"] >= 4
+
+
+async def test_llm_client_timeout() -> None:
+    llm = LLMClient(client=None, timeout=0.01)
+
+    with pytest.raises(LLMTimeoutError):
+        await llm.call("gpt-4o", lambda: asyncio.sleep(1))
+
+    assert llm.stats()["gpt-4o"]["timeouts"] == 1
+    assert llm.stats()["gpt-4o"]["in_flight"] == 0
+
+
+def test_parse_model_limits() -> None:
+    assert parse_model_limits("gpt-5.1=8, gpt-4o=4") == {"gpt-5.1": 8, "gpt-4o": 4}
+    assert parse_model_limits("") == {}
+
+
+def test_parse_float_limits() -> None:
+    assert parse_float_limits("supervision=2.5, analytics=120") == {"supervision": 2.5, "analytics": 120.0}
+
+    with pytest.raises(ValueError, match="'supervision=soon'"):
+        parse_float_limits("supervision=soon")
+    with pytest.raises(ValueError, match="'voice=2.5'"):
+        parse_model_limits("voice=2.5")
+
+
+class _FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield type("Event", (), {"type": "response.output_text.delta", "delta": chunk})()
+
+    async def get_final_response(self):
+        return type("Response", (), {"output_parsed": "".join(self.chunks)})()
+
+
+async def test_llm_client_stream() -> None:
+    responses = type("Responses", (), {"stream": lambda self, **kwargs: _FakeStream(["{", '"a"', ": 1}"])})()
+    llm = LLMClient(client=type("Client", (), {"responses": responses})())
+
+    items = [item async for item in llm.stream("gpt-5.1", input=[], text_format=None)]
+
+    assert items == [("delta", "{"), ("delta", '"a"'), ("delta", ": 1}"), ("final", '{"a": 1}')]
+    assert llm.stats()["gpt-5.1"]["calls"] == 1
+    assert llm.stats()["gpt-5.1"]["in_flight"] == 0
+
+
+async def test_llm_client_records_cached_tokens() -> None:
+    usage = type(
+        "Usage",
+        (),
+        {
+            "input_tokens": 2000,
+            "output_tokens": 50,
+            "input_tokens_details": type("Details", (), {"cached_tokens": 1536})(),
+        },
+    )()
+    llm = LLMClient(client=None)
+
+    async def request():
+        return type("Response", (), {"usage": usage})()
+
+    await llm.call("gpt-5.1", request)
+    await llm.call("gpt-5.1", request)
+
+    stats = llm.stats()["gpt-5.1"]
+    assert (stats["input_tokens"], stats["cached_tokens"], stats["output_tokens"]) == (4000, 3072, 100)
+    assert stats["cached_token_ratio"] == 0.768
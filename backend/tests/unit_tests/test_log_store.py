@@ -0,0 +1,108 @@
+import multiprocessing
+from datetime import datetime, timedelta
+
+from src.agent.log_store import LogStore
+
+
+def test_log_store_window_last_and_count(tmp_path) -> None:
+    store = LogStore(tmp_path)
+    start = datetime(2025, 11, 23, 9, 0, 0)
+
+    for i in range(5):
+        store.append("mikey", f"query {i}", {"allow": False, "time": 0, "reply": "no"}, start + timedelta(hours=i))
+    store.append("donatello", "hello", {"allow": True, "time": 5, "reply": "ok"}, start)
+
+    window = store.entries("mikey", since=start + timedelta(hours=3))
+    assert [entry["query"] for entry in window] == ["query 3", "query 4"]
+    assert window[0]["date_time"] == start + timedelta(hours=3)
+    last = store.last("mikey")
+    assert last is not None and last["query"] == "query 4"
+    assert store.count("mikey", since=start + timedelta(hours=1)) == 4
+    assert store.count("donatello") == 1
+
+
+def test_log_store_sees_appends_of_other_instances(tmp_path) -> None:
+    writer = LogStore(tmp_path, max_segment_bytes=64)
+    reader = LogStore(tmp_path)
+    start = datetime(2025, 11, 23, 9, 0, 0)
+
+    for i in range(3):
+        writer.append("mikey", f"query {i}", {"allow": True, "time": 3, "reply": "ok"}, start + timedelta(minutes=i))
+
+    assert len(list(tmp_path.glob("segment-*.jsonl"))) == 3
+    assert [entry["query"] for entry in reader.entries("mikey")] == ["query 0", "query 1", "query 2"]
+
+
+def test_log_store_delete_user(tmp_path) -> None:
+    store = LogStore(tmp_path)
+    now = datetime(2025, 11, 23, 9, 0, 0)
+    store.append("mikey", "yo please", {"allow": False, "time": 0, "reply": "no"}, now)
+    store.delete_user("mikey")
+
+    assert store.last("mikey") is None
+    assert LogStore(tmp_path).count("mikey") == 0
+
+
+def test_log_store_user_view_reads_last_entry_outside_window(tmp_path) -> None:
+    store = LogStore(tmp_path)
+    start = datetime(2025, 11, 22, 9, 0, 0)
+    store.append("mikey", "yesterday", {"allow": True, "time": 5, "reply": "ok"}, start)
+    store.append("mikey", "today", {"allow": False, "time": 0, "reply": "no"}, start + timedelta(days=1))
+
+    entries, last, count = store.user_view(
+        "mikey", since=start + timedelta(days=2), count_since=start + timedelta(hours=1)
+    )
+    assert entries == []
+    assert last is not None and last["query"] == "today"
+    assert count == 1
+
+
+def test_log_store_all_entries(tmp_path) -> None:
+    store = LogStore(tmp_path, max_segment_bytes=128)
+    start = datetime(2025, 11, 23, 9, 0, 0)
+    for i in range(4):
+        store.append("mikey", f"mikey {i}", {"allow": True, "time": 5, "reply": "ok"}, start + timedelta(hours=i))
+        store.append("peter", f"peter {i}", {"allow": False, "time": 0, "reply": "no"}, start + timedelta(hours=i))
+    store.delete_user("peter")
+
+    entries = store.all_entries(since=start + timedelta(hours=2))
+    assert [entry["query"] for entry in entries] == ["mikey 2", "mikey 3"]
+
+
+def test_log_store_creates_its_directory_with_the_first_write(tmp_path) -> None:
+    store = LogStore(tmp_path / "log_segments")
+    assert store.is_empty() and store.entries("mikey") == []
+    assert not (tmp_path / "log_segments").exists()
+
+    store.append("mikey", "hello", {"allow": True, "time": 5, "reply": "ok"}, datetime(2025, 11, 23, 9, 0))
+    assert store.count("mikey") == 1
+
+
+def _append_concurrently(directory, user_id, n, barrier, counts):
+    store = LogStore(directory, max_segment_bytes=300)
+    barrier.wait()
+    start = datetime(2025, 11, 23, 9, 0, 0)
+    for i in range(n):
+        store.append(user_id, f"query {i}", {"allow": True, "time": 1, "reply": "ok"}, start + timedelta(seconds=i))
+    # both processes are done writing
+    barrier.wait()
+    counts.put(store.count("mikey") + store.count("peter"))
+
+
+def test_log_store_indexes_all_records_across_rotations_of_two_processes(tmp_path) -> None:
+    context = multiprocessing.get_context("fork")
+    barrier, counts = context.Barrier(2), context.Queue()
+    workers = [
+        context.Process(target=_append_concurrently, args=(tmp_path, user_id, 200, barrier, counts))
+        for user_id in ("mikey", "peter")
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+
+    assert [worker.exitcode for worker in workers] == [0, 0]
+    # every process saw every record, including the ones the other one wrote around a rotation
+    assert [counts.get(timeout=1), counts.get(timeout=1)] == [400, 400]
+    assert len(list(tmp_path.glob("segment-*.jsonl"))) > 10
+    assert LogStore(tmp_path).count("mikey") == 200
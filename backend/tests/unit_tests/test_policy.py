@@ -0,0 +1,83 @@
+import typing
+from datetime import date, datetime
+
+from src.agent.aggregates import DailyAggregate
+from src.agent.policy import PolicyEngine, PolicyInput
+
+
+def make_input(**overrides) -> PolicyInput:
+    values: dict[str, typing.Any] = dict(
+        name="Mikey",
+        query="just 5 more minutes",
+        personality="chill",
+        time_factors=[0, 5, 5, 10],
+        today=DailyAggregate(day=date.today()),
+        usage_minutes=30,
+        target_minutes=120,
+        now=datetime(2025, 11, 23, 14, 0),
+    )
+    values.update(overrides)
+    return PolicyInput(**values)
+
+
+def test_policy_engine_leaves_normal_requests_to_the_llm() -> None:
+    engine = PolicyEngine()
+
+    assert engine.evaluate(make_input()) is None
+    assert engine.stats() == {"llm": 1}
+
+
+def test_policy_engine_denies_clear_cut_requests() -> None:
+    engine = PolicyEngine(max_requests_per_day=20)
+
+    late = engine.evaluate(make_input(now=datetime(2025, 11, 23, 23, 30)))
+    assert late is not None
+    assert late.rule == "emergency_only_window"
+    assert late.answer.allow is False and late.answer.time == 0
+    assert "Mikey" in late.answer.reply
+
+    busy = engine.evaluate(make_input(today=DailyAggregate(day=date.today(), requests=19)))
+    assert busy is not None
+    assert busy.rule == "too_many_requests"
+
+    over = engine.evaluate(make_input(usage_minutes=200))
+    assert over is not None and over.rule == "far_over_target"
+
+    # the placeholder calendar event of the prompt does not block anything
+    assert engine.evaluate(make_input(now=datetime(2025, 11, 23, 9, 30))) is None
+
+
+def test_policy_engine_never_blocks_emergencies() -> None:
+    engine = PolicyEngine()
+
+    assert (
+        engine.evaluate(make_input(query="Emergency, need to message my mum", now=datetime(2025, 11, 23, 23, 30)))
+        is None
+    )
+    assert engine.evaluate(make_input(query="kein Spaß, es ist dringend", now=datetime(2025, 11, 23, 23, 30))) is None
+
+
+def test_policy_engine_ignores_negated_and_partial_emergency_words() -> None:
+    engine = PolicyEngine()
+    late = datetime(2025, 11, 23, 23, 30)
+
+    for query in ("not an emergency, just bored", "it isn't urgent", "kein Notfall", "check the emergencybrake meme"):
+        decision = engine.evaluate(make_input(query=query, now=late))
+        assert decision is not None and decision.rule == "emergency_only_window", query
+
+
+def test_policy_engine_fallback_is_deterministic() -> None:
+    engine = PolicyEngine()
+
+    below_target = engine.fallback(make_input())
+    assert below_target.allow is True and below_target.time == 5
+    assert below_target == engine.fallback(make_input())
+
+    over_target = engine.fallback(make_input(usage_minutes=150, personality=None))
+    assert over_target.allow is False and over_target.time == 0
+    assert "Mikey" in over_target.reply
+
+    # verdict the model already streamed
+    streamed = engine.fallback(make_input(usage_minutes=150), minutes=7, allow=True)
+    assert streamed.allow is True and streamed.time == 7 and "7 minutes" in streamed.reply
+    assert engine.stats()["fallback"] == 4
@@ -0,0 +1,32 @@
+from src.agent.prompt_layout import assemble_messages
+
+
+def test_assemble_messages_orders_static_to_dynamic() -> None:
+    prompt = assemble_messages(
+        flow="gatekeeper",
+        variant="army",
+        static=["SYSTEM", "ARMY"],
+        user=["name: Mikey", None],
+        dynamic=["time: 14:05"],
+        user_input="5 more minutes",
+    )
+
+    assert [message["content"] for message in prompt.messages] == [
+        "SYSTEM",
+        "ARMY",
+        "name: Mikey",
+        "time: 14:05",
+        "5 more minutes",
+    ]
+    assert prompt.messages[-1]["role"] == "user"
+    assert prompt.static_chars == 10
+    assert prompt.cache_key.startswith("gatekeeper:army:")
+
+
+def test_prefix_cache_key_is_pinned_to_the_static_prefix() -> None:
+    def key(variant, static, user="Mikey", dynamic="14:05"):
+        return assemble_messages("gatekeeper", variant, static, [user], [dynamic], "query").cache_key
+
+    assert key("chill", ["SYSTEM", "CHILL"]) == key("chill", ["SYSTEM", "CHILL"], user="Leo", dynamic="18:00")
+    assert key("chill", ["SYSTEM", "CHILL"]) != key("army", ["SYSTEM", "ARMY"])
+    assert key("chill", ["SYSTEM", "CHILL"]) != key("chill", ["SYSTEM v2", "CHILL"])
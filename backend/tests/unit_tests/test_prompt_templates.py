@@ -0,0 +1,51 @@
+from src.agent.prompt_templates import format_time_factors_to_str, PromptCompiler, UserPreferences
+
+
+def _row(**overrides) -> dict:
+    row = {
+        "preference": "stored text",
+        "preferred_personality": "chill",
+        "selected_apps": ["instagram", "tiktok"],
+        "time_factors": [2, 5, 8, 10],
+        "target_minutes": 90,
+    }
+    return {**row, **overrides}
+
+
+def test_format_time_factors_to_str() -> None:
+    text = format_time_factors_to_str([2, 5, 8, 10])
+
+    assert text.startswith("Additionally the user has whishes for these specific times:")
+    assert "During work hours: The user wants to reduce" in text
+    assert "During the late evening before sleep: Usage should generally not be allowed" in text
+    assert "morning" not in text
+    assert format_time_factors_to_str([0, 1, 2, 3]) == ""
+
+
+def test_user_preferences_from_structured_and_legacy_rows() -> None:
+    structured = UserPreferences.from_row(_row())
+    assert structured.time_factors == (2, 5, 8, 10)
+    assert "'instagram', 'tiktok'" in structured.to_text()
+    assert "around 90 minutes" in structured.to_text()
+
+    legacy = UserPreferences.from_row(_row(time_factors=None, target_minutes=None))
+    assert legacy.to_text() == "stored text"
+    assert legacy.target_minutes == 120
+
+
+def test_prompt_compiler_only_recompiles_changed_preferences() -> None:
+    compiler = PromptCompiler()
+
+    first = compiler.get("mikey", "Mikey", UserPreferences.from_row(_row()))
+    again = compiler.get("mikey", "Mikey", UserPreferences.from_row(_row()))
+    changed = compiler.get("mikey", "Mikey", UserPreferences.from_row(_row(target_minutes=60)))
+
+    assert first is again
+    assert changed.version != first.version
+    assert "around 1 hour" in changed.user_info
+    assert compiler.stats()["compiles"] == 2
+
+    context = first.context(
+        time="14:05", history="-", today="-", insight="", usage="-", usage_trend="", events="-", similar_decision=""
+    )
+    assert "current time: 14:05" in context
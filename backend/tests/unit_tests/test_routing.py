@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from src.agent.formats import TieredBouncerAnswerFormat
+from src.agent.routing import LARGE, ModelRouter, parse_model_prices, RoutingInput, SMALL
+
+NOW = datetime(2025, 11, 23, 15, 0)
+
+
+def _route(router: ModelRouter, query: str, usage_minutes: int = 20, events: list | None = None):
+    return router.route(
+        RoutingInput(query=query, usage_minutes=usage_minutes, target_minutes=120, events=events or [], now=NOW)
+    )
+
+
+def test_router_escalates_hard_requests() -> None:
+    router = ModelRouter()
+
+    assert _route(router, "just 5 more minutes").tier == SMALL
+    assert _route(router, " ".join(["please"] * 30)).reason == "long_query"
+    assert _route(router, "maybe check insta, not sure").reason == "ambiguous_query"
+    assert _route(router, "just 5 more minutes", usage_minutes=110).reason == "near_limit"
+    event = {"lecture": "Linear Algebra", "start": "14:00", "end": "16:00"}
+    assert _route(router, "just 5 more minutes", events=[event]).reason == "event_running"
+    assert ModelRouter(enabled=False).route(RoutingInput("hi", 0, 120)).tier == LARGE
+
+    assert router.stats()["escalations"] == {
+        "long_query": 1,
+        "ambiguous_query": 1,
+        "near_limit": 1,
+        "event_running": 1,
+    }
+
+
+def test_router_confidence_and_cost() -> None:
+    router = ModelRouter(min_confidence=0.7, prices=parse_model_prices("gpt-5-mini=0.25/2.0, gpt-5.1=1.25/10"))
+
+    assert router.confident(TieredBouncerAnswerFormat(allow=True, time=5, reply="ok", confidence=0.9))
+    assert not router.confident(TieredBouncerAnswerFormat(allow=True, time=5, reply="ok", confidence=0.3))
+    # refusal / empty parse
+    assert not router.confident(None)
+
+    # hedged attempts escalate each, the decision counts once
+    assert router.escalate("low_confidence").tier == LARGE
+    assert router.escalate("low_confidence").tier == LARGE
+    assert router.stats()["escalations"] == {}
+    router.count_escalation("low_confidence")
+    assert router.stats()["escalations"] == {"low_confidence": 1}
+
+    router.record(SMALL, 0.4)
+    stats = router.stats({"gpt-5-mini": {"input_tokens": 1_000_000, "output_tokens": 100_000}})
+    assert stats["tiers"][SMALL]["calls"] == 1
+    assert stats["tiers"][SMALL]["estimated_cost_usd"] == 0.45
+    assert "estimated_cost_usd" not in stats["tiers"][LARGE]
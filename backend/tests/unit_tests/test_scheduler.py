@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from src.agent.scheduler import ANALYTICS, INTERACTIVE, JobShedError, LLMScheduler, priority, SUPERVISION
+
+
+async def test_scheduler_serves_interactive_jobs_first() -> None:
+    scheduler = LLMScheduler(max_in_flight=1)
+    order = []
+
+    async def job(priority_class, name):
+        async with scheduler.slot(priority_class):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    blocker = asyncio.ensure_future(job(ANALYTICS, "running"))
+    await asyncio.sleep(0)
+    queued = [
+        asyncio.ensure_future(job(SUPERVISION, "supervision")),
+        asyncio.ensure_future(job(ANALYTICS, "analytics")),
+        asyncio.ensure_future(job(INTERACTIVE, "interactive")),
+    ]
+    await asyncio.gather(blocker, *queued)
+
+    assert order == ["running", "interactive", "supervision", "analytics"]
+    stats = scheduler.stats()
+    assert stats["in_flight"] == 0
+    assert stats["classes"][ANALYTICS]["max_waiting"] == 1
+    assert stats["classes"][INTERACTIVE]["started"] == 1
+
+
+async def test_scheduler_caps_classes_and_sheds_stale_jobs() -> None:
+    scheduler = LLMScheduler(max_in_flight=4, class_limits={SUPERVISION: 1}, max_wait_seconds={SUPERVISION: 0.01})
+
+    async def supervise():
+        with priority(SUPERVISION):
+            async with scheduler.slot():
+                await asyncio.sleep(0.05)
+
+    results = await asyncio.gather(supervise(), supervise(), return_exceptions=True)
+
+    assert results[0] is None
+    assert isinstance(results[1], JobShedError)
+    assert scheduler.stats()["classes"][SUPERVISION]["shed"] == 1
+    assert scheduler.stats()["in_flight"] == 0
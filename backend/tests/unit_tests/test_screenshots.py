@@ -0,0 +1,56 @@
+import base64
+
+import pytest
+
+from src.agent import screenshots
+from src.agent.screenshots import Screenshot
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(64))
+
+
+def test_screenshot_passes_base64_through() -> None:
+    data = base64.b64encode(PNG).decode("ascii")
+
+    screenshot = Screenshot.from_base64(data)
+    assert screenshot.data is data
+    assert screenshot.data_url() == f"data:image/png;base64,{data}"
+
+    assert Screenshot.from_base64(f"data:image/png;base64,{data}").data == data
+    assert Screenshot.from_bytes(PNG).data_url() == screenshot.data_url()
+
+    with pytest.raises(ValueError):
+        Screenshot.from_base64("not an image")
+    with pytest.raises(ValueError):
+        Screenshot.from_base64(base64.b64encode(b"plain text, no image").decode("ascii"))
+    # the whole text is validated, not only the start
+    with pytest.raises(ValueError):
+        Screenshot.from_base64(data[:40] + "!!!!" + data[44:])
+
+
+def test_large_screenshot_spills_to_a_temporary_file() -> None:
+    data = base64.b64encode(PNG).decode("ascii")
+
+    first = Screenshot.from_base64(data, spill_bytes=16)
+    second = Screenshot.from_base64(data, spill_bytes=16)
+    assert first.data is None and first.path is not None and first.path.exists()
+    assert first.path != second.path
+    assert first.data_url() == f"data:image/png;base64,{data}"
+
+    path = first.path
+    first.close()
+    second.close()
+    assert not path.exists()
+
+
+def test_spilled_screenshot_is_decoded_in_chunks(monkeypatch) -> None:
+    monkeypatch.setattr(screenshots, "SPILL_CHUNK_CHARS", 8)
+    data = base64.b64encode(PNG).decode("ascii")
+
+    screenshot = Screenshot.from_base64(f"data:image/png;base64,{data}", spill_bytes=16)
+    assert screenshot.path is not None and screenshot.path.read_bytes() == PNG
+    assert screenshot.size == len(data)
+    assert screenshot.base64_text() == data
+    screenshot.close()
+
+    with pytest.raises(ValueError):
+        Screenshot.from_base64(data[:-8] + "!!!!" + data[-4:], spill_bytes=16)
@@ -0,0 +1,54 @@
+from src.agent.semantic_index import SemanticDecisionIndex
+
+
+def test_semantic_index_finds_paraphrases() -> None:
+    index = SemanticDecisionIndex()
+    index.seed(
+        "mikey",
+        [
+            {"query": "watch reels because i am bored", "answer": {"allow": False, "time": 0, "reply": "no"}},
+            {"query": "answer a friend on insta", "answer": {"allow": True, "time": 5, "reply": "ok"}},
+        ],
+    )
+
+    match = index.nearest("mikey", "im bored wanna watch some reels")
+
+    assert match is not None
+    assert match.entry.query == "watch reels because i am bored"
+    assert match.similarity > 0.5
+    assert match.entry.context is None
+    assert index.nearest("donatello", "im bored") is None
+
+
+def test_semantic_index_stays_bounded() -> None:
+    index = SemanticDecisionIndex(max_entries_per_user=4, max_users=2)
+    for i in range(10):
+        index.add("mikey", f"request number {i}", {"allow": True, "time": 3, "reply": "ok"})
+    index.add("donatello", "hello", {"allow": False, "time": 0, "reply": "no"})
+    index.add("peter", "hello", {"allow": False, "time": 0, "reply": "no"})
+
+    assert index.stats()["evictions"] == 6
+    assert index.stats()["users"] == 2
+    assert not index.has_user("mikey")
+
+
+def test_semantic_index_never_reuses_other_numbers() -> None:
+    index = SemanticDecisionIndex()
+    context = (2, 1)
+    index.add("mikey", "just 5 more minutes", {"allow": True, "time": 5, "reply": "ok"}, context=context)
+    index.add("mikey", "tiktok for 10 minutes", {"allow": True, "time": 10, "reply": "ok"}, context=context)
+
+    # close enough for the threshold, only the numbers differ
+    for query in ("just 50 more minutes", "tiktok for 60 minutes"):
+        match = index.nearest("mikey", query)
+        assert match is not None
+        assert match.similarity >= 0.85, query
+        assert not match.reusable(query, context, threshold=0.85), query
+    match = index.nearest("mikey", "tiktok for ten minutes")
+    assert match is not None
+    assert not match.reusable("tiktok for ten minutes", context, 0.0)
+
+    match = index.nearest("mikey", "Just 5 more minutes!!")
+    assert match is not None
+    assert match.reusable("Just 5 more minutes!!", context, threshold=0.85)
+    assert not match.reusable("Just 5 more minutes!!", (3, 1), threshold=0.85)
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from src.agent.single_flight import SingleFlight
+
+
+async def test_single_flight_coalesces_concurrent_duplicates() -> None:
+    flights = SingleFlight()
+    calls = 0
+
+    async def request():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(
+        *[flights.run(("mikey", "5 more minutes"), request) for _ in range(4)],
+        flights.run(("mikey", "answer a friend"), request),
+    )
+
+    assert results[:4] == [results[0]] * 4
+    assert calls == 2
+    assert flights.stats()["coalesced"] == 3
+    assert flights.stats()["max_waiters"] == 4
+    assert flights.stats()["in_flight"] == 0
+
+    # finished flights are not reused
+    await flights.run(("mikey", "5 more minutes"), request)
+    assert calls == 3
+
+
+async def test_single_flight_survives_a_cancelled_leader() -> None:
+    flights = SingleFlight()
+
+    async def request():
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    leader = asyncio.ensure_future(flights.run("key", request))
+    follower = asyncio.ensure_future(flights.run("key", request))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == "ok"
+    with pytest.raises(asyncio.CancelledError):
+        await leader
@@ -0,0 +1,88 @@
+import asyncio
+from datetime import date, datetime
+from types import SimpleNamespace
+
+import pytest
+
+from src.agent import agent
+from src.agent.aggregates import DailyAggregate
+from src.agent.formats import BouncerAnswerFormat
+from src.agent.policy import PolicyInput
+from src.agent.routing import LARGE, RouteDecision, RoutingInput
+
+
+@pytest.fixture
+def logged(monkeypatch) -> list:
+    rows: list = []
+
+    async def record_decision(user_id, query, answer):
+        rows.append((user_id, query, answer))
+
+    request = SimpleNamespace(
+        user_id="mikey",
+        query="5 more minutes",
+        messages=[],
+        prompt_cache_key="key",
+        cache_key=agent.decision_cache.key("mikey", "5 more minutes", "chill", 30, 1, datetime.now()),
+        decision_context=(0, 0),
+        routing=RoutingInput(query="5 more minutes", usage_minutes=30, target_minutes=120),
+        policy_input=PolicyInput(
+            name="Mikey",
+            query="5 more minutes",
+            personality="chill",
+            time_factors=None,
+            today=DailyAggregate(day=date.today()),
+            usage_minutes=30,
+            target_minutes=120,
+        ),
+    )
+
+    async def prepare_app_permission(user_id, query, app_usage):
+        return request
+
+    monkeypatch.setattr(agent, "record_decision", record_decision)
+    monkeypatch.setattr(agent, "prepare_app_permission", prepare_app_permission)
+    monkeypatch.setattr(agent.model_router, "route", lambda routing: RouteDecision(LARGE, "gpt-5.1", "test"))
+    monkeypatch.setattr(agent.semantic_index, "add", lambda *args, **kwargs: None)
+    return rows
+
+
+async def settled() -> None:
+    while agent.permission_flights.stats()["in_flight"]:
+        await asyncio.sleep(0.01)
+
+
+async def test_stream_logs_once_when_the_client_disconnects(monkeypatch, logged) -> None:
+    async def stream_simple_query(messages, response_schema, prompt_cache_key=None, model=None, timeout=None):
+        for chunk in ['{"allow": true, "time": 5, ', '"reply": "Okay ', 'Mikey"}']:
+            yield "delta", chunk
+            await asyncio.sleep(0.02)
+        yield "final", BouncerAnswerFormat(allow=True, time=5, reply="Okay Mikey")
+
+    monkeypatch.setattr(agent, "stream_simple_query", stream_simple_query)
+
+    stream = agent.stream_app_permission("mikey", "5 more minutes", [])
+    assert (await stream.__anext__()).startswith("event: verdict")
+    # the client goes away after the verdict
+    await stream.aclose()
+
+    await settled()
+    assert len(logged) == 1
+    assert logged[0][2].reply == "Okay Mikey"
+
+
+async def test_stream_falls_back_after_the_overall_deadline(monkeypatch, logged) -> None:
+    async def stream_simple_query(messages, response_schema, prompt_cache_key=None, model=None, timeout=None):
+        # keeps trickling, never finishes
+        while True:
+            yield "delta", " "
+            await asyncio.sleep(0.01)
+
+    monkeypatch.setattr(agent, "stream_simple_query", stream_simple_query)
+    monkeypatch.setattr(agent.gatekeeper_calls, "deadline_seconds", 0.1)
+    monkeypatch.setattr(agent.gatekeeper_calls.breaker, "failure", lambda: None)
+
+    events = [event async for event in agent.stream_app_permission("mikey", "5 more minutes", [])]
+
+    assert [event.split("\n")[0] for event in events] == ["event: verdict", "event: reply", "event: done"]
+    assert len(logged) == 1
@@ -0,0 +1,28 @@
+import json
+
+from src.agent.streaming import IncrementalJSONObjectParser, sse_event
+
+
+def test_parser_emits_verdict_fields_before_the_reply_is_complete() -> None:
+    answer = '{"allow": true, "time": 10, "reply": "Sure \\"Mikey\\", 10 min \\u00e4 then\\nbreak"}'
+    parser = IncrementalJSONObjectParser()
+
+    events = []
+    # split into small chunks like streamed tokens, including inside escape sequences
+    for i in range(0, len(answer), 3):
+        events.extend(parser.feed(answer[i : i + 3]))
+
+    fields = [(key, value) for kind, key, value in events if kind == "field"]
+    assert fields[:2] == [("allow", True), ("time", 10)]
+
+    first_delta = next(i for i, event in enumerate(events) if event[0] == "string_delta")
+    assert first_delta > 1 and first_delta < len(events) - 2
+
+    reply = "".join(value for kind, key, value in events if kind == "string_delta" and key == "reply")
+    assert reply == json.loads(answer)["reply"]
+    assert parser.values == json.loads(answer)
+    assert parser.done
+
+
+def test_sse_event() -> None:
+    assert sse_event("verdict", {"allow": False, "time": 0}) == 'event: verdict\ndata: {"allow": false, "time": 0}\n\n'
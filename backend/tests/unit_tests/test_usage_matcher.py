@@ -0,0 +1,39 @@
+from dataclasses import dataclass
+
+from src.agent.usage_matcher import AppMatcher, UsageMatcherCache
+
+
+@dataclass
+class Usage:
+    packageName: str
+    totalMinutes: int
+
+
+def test_app_matcher_sums_minutes_per_app() -> None:
+    matcher = AppMatcher(["YouTube", "Instagram", "youtube music"])
+    usage = [
+        Usage("com.instagram.android", 20),
+        Usage("com.instagram.barcelona", 5),
+        Usage("com.google.android.youtube", 10),
+        Usage("com.google.android.apps.youtube music", 7),
+        Usage("com.android.chrome", 30),
+    ]
+
+    assert matcher.totals(usage) == {"instagram": 25, "youtube": 10, "youtube music": 7}
+    assert matcher.counters == {"hits": 0, "misses": 5}
+
+    # known packages are looked up, not matched again
+    matcher.totals(usage)
+    assert matcher.counters == {"hits": 5, "misses": 5}
+
+
+def test_usage_matcher_cache_rebuilds_on_app_change() -> None:
+    cache = UsageMatcherCache(max_users=1)
+
+    matcher = cache.get("mikey", ["instagram"])
+    assert cache.get("mikey", ["Instagram"]) is matcher
+    assert cache.get("mikey", ["instagram", "tiktok"]) is not matcher
+
+    cache.get("donatello", ["tiktok"])
+    assert cache.stats()["users"] == 1
+    assert cache.stats()["builds"] == 3 and cache.stats()["user_evictions"] == 1
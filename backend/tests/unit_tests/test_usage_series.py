@@ -0,0 +1,73 @@
+from datetime import date, datetime, timedelta
+
+from src.agent.usage_series import features_to_prompt, TOTAL, UsageSeriesStore
+
+
+def test_usage_series_rollups_from_cumulative_totals() -> None:
+    store = UsageSeriesStore()
+    start = datetime(2025, 11, 24, 9, 0)  # a Monday
+
+    store.ingest("mikey", {"instagram": 10}, start)
+    store.ingest("mikey", {"instagram": 25, "tiktok": 5}, start + timedelta(hours=2))
+    # same totals again (stored snapshot) add nothing
+    store.ingest("mikey", {"instagram": 25, "tiktok": 5}, start + timedelta(hours=2))
+
+    features = store.features("mikey", start + timedelta(hours=3))
+    assert features is not None
+    assert features[TOTAL]["today"] == 30
+    assert features["instagram"]["today"] == 25
+    assert features[TOTAL]["this_week"] == 30
+    # the 10 minutes of 9:00 are outside of the last 3 hours (10:00 - 12:59)
+    assert features[TOTAL]["last_3h"] == 20
+    assert features[TOTAL]["observed_days"] == 0
+
+    # totals restart at midnight
+    store.ingest("mikey", {"instagram": 4}, start + timedelta(days=1))
+    features = store.features("mikey", start + timedelta(days=1))
+    assert features is not None
+    assert features["instagram"]["today"] == 4
+    assert features["instagram"]["average_7d"] == 25
+    assert features[TOTAL]["this_week"] == 34
+
+
+def test_usage_series_daily_history_and_trend() -> None:
+    store = UsageSeriesStore()
+    today = date(2025, 11, 30)
+    history = [(today - timedelta(days=7 - i), 100.0 - 10 * i) for i in range(7)]
+    store.ingest_daily("mikey", history, today=today)
+    store.ingest("mikey", {"instagram": 20}, datetime(2025, 11, 30, 12, 0))
+
+    features = store.features("mikey", datetime(2025, 11, 30, 12, 0))
+    assert features is not None
+    total = features[TOTAL]
+    assert total["observed_days"] == 7
+    assert total["average_7d"] == 70
+    assert total["trend_7d"] == -10
+    # 2025-11-23 was a Sunday: last week holds its 100 minutes, this week the rest
+    assert total["last_week"] == 100
+    assert total["this_week"] == sum(minutes for _, minutes in history[1:]) + 20
+
+    prompt = features_to_prompt(store.features("mikey", datetime(2025, 11, 30, 12, 0)))
+    assert "today so far: 20 min, average of the last 7 days: 70 min (-71%)" in prompt
+    assert "10 min per day (less)" in prompt
+
+    assert features_to_prompt(store.features("donatello")) == "There is no usage history of the last days yet."
+
+
+def test_usage_series_first_snapshot_is_a_baseline_for_the_hours() -> None:
+    store = UsageSeriesStore()
+    evening = datetime(2025, 11, 26, 18, 0)
+
+    # first request of the day (or after a restart) with 2 hours used since midnight
+    store.ingest("mikey", {"instagram": 120}, evening)
+    features = store.features("mikey", evening)
+    assert features is not None
+    assert features[TOTAL]["today"] == 120
+    assert features[TOTAL]["this_week"] == 120
+    assert features[TOTAL]["last_3h"] == 0
+
+    store.ingest("mikey", {"instagram": 130}, evening + timedelta(minutes=30))
+    features = store.features("mikey", evening + timedelta(minutes=30))
+    assert features is not None
+    assert features[TOTAL]["today"] == 130
+    assert features["instagram"]["last_3h"] == 10
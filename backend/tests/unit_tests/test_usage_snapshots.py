@@ -0,0 +1,54 @@
+from dataclasses import dataclass
+from datetime import date
+
+from src.agent.usage_snapshots import UsageSnapshotStore
+
+
+@dataclass
+class Usage:
+    packageName: str
+    totalMinutes: int
+
+
+def minutes(update) -> dict:
+    return {item.packageName: item.totalMinutes for item in update.items}
+
+
+def test_usage_snapshot_full_delta_and_stored() -> None:
+    store = UsageSnapshotStore()
+    today = date(2025, 11, 23)
+
+    full = store.update("mikey", [Usage("com.instagram.android", 10), Usage("com.android.chrome", 5)], today=today)
+    assert not full.resync
+
+    delta = store.update("mikey", [Usage("com.instagram.android", 25)], base_version=full.version, today=today)
+    assert not delta.resync
+    assert delta.version != full.version
+    assert minutes(delta) == {"com.instagram.android": 25, "com.android.chrome": 5}
+
+    stored = store.update("mikey", None, today=today)
+    assert stored.version == delta.version
+    assert minutes(stored) == minutes(delta)
+    assert store.stats()["sent_share"] == 3 / 4
+
+
+def test_usage_snapshot_resync() -> None:
+    store = UsageSnapshotStore()
+    today = date(2025, 11, 23)
+    full = store.update("mikey", [Usage("com.instagram.android", 10)], today=today)
+
+    # unknown base version: merged as well as possible, but the next request has to send everything
+    stale = store.update("mikey", [Usage("com.android.chrome", 5)], base_version="unknown", today=today)
+    assert stale.resync
+    assert minutes(stale) == {"com.instagram.android": 10, "com.android.chrome": 5}
+
+    # the totals restart at midnight, yesterday's snapshot is not used
+    next_day = store.update(
+        "mikey", [Usage("com.android.chrome", 1)], base_version=stale.version, today=date(2025, 11, 24)
+    )
+    assert next_day.resync
+    assert minutes(next_day) == {"com.android.chrome": 1}
+
+    assert store.update("donatello", None, today=today).resync
+    assert store.update("donatello", None, today=today).items == []
+    assert full.version != stale.version
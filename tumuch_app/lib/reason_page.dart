@@ -326,20 +326,21 @@ class _ReasonPageState extends State<ReasonPage> {
 
     // Usage from native side
     final usageRaw = await UsageService.getUsageSummary();
-    final usage = _stripIconsFromUsage(usageRaw);
+    // only the packages that changed since the last request
+    final upload = UsageSync.prepare(_stripIconsFromUsage(usageRaw));
 
     // Load user_id from storage
     final prefs = await AppPrefs.getInstance();
     final userId = await prefs.getString(userIdKey);
 
     final uri = Uri.parse('$API_BASE/echo');
-    debugPrint('Usage summary (text): $usage');
-    debugPrint('Usage summary (text, JSON): ${jsonEncode(usage)}');
+    debugPrint('Usage summary (text, JSON): ${jsonEncode(upload.usage)}');
 
     final payload = {
       'user_id': userId,
       'text': '[${widget.appName}] $text',
-      'usage': usage,
+      'usage': upload.usage,
+      if (upload.version != null) 'usage_version': upload.version,
     };
 
     try {
@@ -349,6 +350,7 @@ class _ReasonPageState extends State<ReasonPage> {
         headers: headers,
         body: jsonEncode(payload),
       );
+      UsageSync.complete(upload, resp.headers);
 
       if (resp.statusCode == 200) {
         final data = jsonDecode(resp.body) as Map<String, dynamic>;
@@ -420,7 +422,7 @@ class _ReasonPageState extends State<ReasonPage> {
 
     // Usage from native side
     final usageRaw = await UsageService.getUsageSummary();
-    final usage = _stripIconsFromUsage(usageRaw);
+    final upload = UsageSync.prepare(_stripIconsFromUsage(usageRaw));
 
     // Load user_id from storage
     final prefs = await AppPrefs.getInstance();
@@ -440,8 +442,12 @@ class _ReasonPageState extends State<ReasonPage> {
             contentType: MediaType('audio', 'm4a'),
           ),
         )
-        // usage as JSON string – same key as /text payload
-        ..fields['usage'] = jsonEncode(usage);
+        // usage as JSON string – same keys as /text payload
+        ..fields['usage'] = jsonEncode(upload.usage);
+
+      if (upload.version != null) {
+        request.fields['usage_version'] = upload.version!;
+      }
 
       // Add user_id as a field in the form body, like /text has in its JSON
       if (userId != null) {
@@ -454,6 +460,7 @@ class _ReasonPageState extends State<ReasonPage> {
 
       final streamed = await request.send();
       final resp = await http.Response.fromStream(streamed);
+      UsageSync.complete(upload, resp.headers);
 
       if (resp.statusCode == 200) {
         final data = jsonDecode(resp.body) as Map<String, dynamic>;
@@ -1,6 +1,8 @@
 // lib/usage_service.dart
 import 'dart:convert';
 import 'package:flutter/services.dart';
+import 'package:http/http.dart' as http;
+import 'app_configs.dart';
 import 'app_storage.dart';
 
 
@@ -61,15 +63,86 @@ class UsageService {
       final decoded = jsonDecode(raw);
       if (decoded is! List) return [];
 
-      return decoded
+      final history = decoded
           .whereType<Map>()
           .map((m) => m.map((k, v) => MapEntry(k.toString(), v)))
           .cast<Map<String, dynamic>>()
           .toList();
+
+      // the backend uses the past days for the usage trend, no need to wait
+      uploadDailyUsageHistory(history);
+      return history;
     } catch (_) {
       return [];
     }
   }
+
+  /// Send the daily history to the backend (/usage_history).
+  static Future<void> uploadDailyUsageHistory(
+      List<Map<String, dynamic>> history) async {
+    try {
+      final userId = await loadUserId();
+      if (userId == null || history.isEmpty) return;
+
+      await http.post(
+        Uri.parse('$API_BASE/usage_history'),
+        headers: await buildDefaultHeaders(),
+        body: jsonEncode({'user_id': userId, 'history': history}),
+      );
+    } catch (_) {}
+  }
+}
+
+/// Usage entries for one request and the snapshot version they are based on.
+class UsageUpload {
+  final List<dynamic> usage;
+
+  /// null -> `usage` is the full list
+  final String? version;
+
+  /// packageName -> totalTimeForeground of the full list at this moment
+  final Map<String, dynamic> current;
+
+  UsageUpload(this.usage, this.version, this.current);
+}
+
+/// Delta uploads of the usage list (see backend/src/agent/usage_snapshots.py):
+/// the backend keeps the last list, so we only send the packages whose
+/// totalTimeForeground changed since the version it gave us.
+class UsageSync {
+  static String? _version;
+  static Map<String, dynamic> _sent = {};
+
+  static UsageUpload prepare(List<dynamic> usage) {
+    final current = <String, dynamic>{};
+    final changed = <dynamic>[];
+
+    for (final entry in usage) {
+      if (entry is! Map) continue;
+      final name = entry['packageName']?.toString();
+      if (name == null) continue;
+
+      current[name] = entry['totalTimeForeground'];
+      if (_version == null || _sent[name] != entry['totalTimeForeground']) {
+        changed.add(entry);
+      }
+    }
+
+    return UsageUpload(changed, _version, current);
+  }
+
+  /// Remember what the backend has now (X-Usage-Version), or start over
+  /// with a full list when it asks for it (X-Usage-Resync) or did not answer.
+  static void complete(UsageUpload upload, Map<String, String> headers) {
+    final version = headers['x-usage-version'];
+    if (version == null || headers['x-usage-resync'] == '1') {
+      _version = null;
+      _sent = {};
+      return;
+    }
+    _version = version;
+    _sent = upload.current;
+  }
 }
 
 class _DayUsage {